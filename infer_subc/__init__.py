@@ -21,6 +21,8 @@
 
 """Top-level package for infer_subc."""
 
+import numpy as np
+
 __author__ = "Andy Henrie"
 __email__ = "ergonyc@gmail.com"
 # Do not edit this string manually, always use bumpversion
@@ -30,3 +32,50 @@ __version__ = "0.0.1"
 
 def get_module_version():
     return __version__
+
+
+# floating point type of the intermediate images (see set_float_dtype)
+_float_dtype = np.dtype(np.float64)
+
+
+def set_float_dtype(dtype):
+    """
+    Set the floating point precision used package-wide for intermediate images: the core/img.py helpers
+    (normalization, aggregation, log transforms, filters), and through them the organelle `infer_*` functions
+    and the workflows, and the stats helpers.
+
+    np.float32 halves the memory of every float image.  Compared to the np.float64 default, smoothed and
+    filtered intensities agree to ~1e-5 (relative).  Values within float32 rounding of a cutoff (thresholds, or
+    the internal cutoff of the vesselness filter) can flip, so filter responses and segmentations differ at
+    isolated voxels (typically < 0.01% of them).
+
+    Params:
+        dtype: np.float64 (default) or np.float32
+    """
+    global _float_dtype
+    dtype = np.dtype(dtype)
+    if dtype not in (np.dtype(np.float32), np.dtype(np.float64)):
+        raise ValueError(f"unsupported float dtype {dtype}: use np.float32 or np.float64")
+    _float_dtype = dtype
+
+
+def get_float_dtype() -> np.dtype:
+    """
+    Floating point type of the intermediate images, see set_float_dtype()
+    """
+    return _float_dtype
+
+
+def get_float_dtype_for(dtype) -> np.dtype:
+    """
+    Floating point type of an image computed from an image of type `dtype`: the package float type (see
+    set_float_dtype), except that float images less precise than that keep their type
+
+    Params:
+        dtype: dtype of the input image
+    """
+    dtype = np.dtype(dtype)
+    float_dtype = get_float_dtype()
+    if dtype.kind == "f" and dtype.itemsize <= float_dtype.itemsize:
+        return dtype
+    return float_dtype
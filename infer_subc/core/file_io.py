@@ -12,7 +12,8 @@ from aicsimageio import AICSImage
 from tifffile import imwrite, imread
 import os
 
-from infer_subc.utils._aicsimage_reader import reader_function, export_ome_tiff
+from infer_subc.utils._aicsimage_reader import reader_function, export_ome_tiff, _get_full_image_data, _get_layer_meta
+from infer_subc.core.zarr_store import SegmentationStore, is_zarr_path, read_zarr_array
 
 
 # TODO:  
@@ -41,12 +42,155 @@ def read_tiff_image(image_name):
     """
     return tiff image with tifffile.imread.  Using the `reader_function` (vial read_ome_image) and AICSimage is too slow
         prsumably handling the OME meta data is what is so slow.
+    `image_name` can also be the path of a segmentation in a zarr SegmentationStore (see find_segmentation_tiff_files)
     """
+    if is_zarr_path(image_name):
+        return read_zarr_array(image_name)
     image = imread(
         image_name,
     )
     return image
 
+class _LazyRawMetadata(dict):
+    """
+    meta["metadata"] of a LazyImage: the same keys as read_ome_image's, but "raw_image_metadata" and "ome_types"
+    are only parsed when first read (a missing "ome_types" means the image has no OME meta data, as with
+    read_ome_image)
+    """
+
+    def __init__(self, image: AICSImage):
+        super().__init__(aicsimage=image)
+
+    def __missing__(self, key):
+        if key == "raw_image_metadata":
+            self[key] = self["aicsimage"].metadata
+        elif key == "ome_types":
+            try:
+                self[key] = self["aicsimage"].ome_metadata
+            except Exception:
+                raise KeyError(key)
+        else:
+            raise KeyError(key)
+        return self[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class LazyImage:
+    """
+    Lazy handle on a raw image file (.czi, .ome.tif...), read through a dask-backed AICSImage.
+
+    Opening the file only reads its header: the shape, scale and channel names are known without decoding
+    any pixel.  Pixels are read on demand, and only those requested: `image[ch]` reads one channel,
+    `image[ch, z]` one plane, `image.get_channels([1, 3])` two channels...  The layout is the same as the
+    data returned by read_ome_image (the squeezed image, i.e. CZYX for a multi-channel stack), so the handle
+    can be passed instead of the array to functions which select channels or planes by indexing (e.g.
+    select_channel_from_raw, hence the organelle inference functions).  np.asarray(image) reads everything.
+    """
+
+    def __init__(self, image_name: Union[Path, str]):
+        self._file_name = image_name
+        self._image = AICSImage(image_name)
+        if len(self._image.scenes) > 1:
+            print(f"{image_name} contains {len(self._image.scenes)} scenes: only the first one is read")
+        self._xdata = _get_full_image_data(self._image, in_memory=False)
+        self._meta: Union[Dict[str, Any], None] = None
+
+    @property
+    def file_name(self) -> Union[Path, str]:
+        return self._file_name
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self._xdata.shape
+
+    @property
+    def ndim(self) -> int:
+        return self._xdata.ndim
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._xdata.dtype
+
+    @property
+    def dims(self) -> str:
+        """
+        dimension names, e.g. "CZYX"
+        """
+        return "".join(self._xdata.dims)
+
+    @property
+    def scale(self) -> Union[Tuple[float, ...], None]:
+        """
+        physical size of the voxels along the spatial dimensions (e.g. Z, Y, X), as in the meta data `scale`
+        """
+        return self.meta.get("scale")
+
+    @property
+    def channel_names(self) -> List[str]:
+        return [str(c) for c in self._image.channel_names]
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        """
+        meta data dictionary, as returned by read_ome_image.  The raw (e.g. OME) meta data is only parsed when
+        meta["metadata"]["raw_image_metadata"] or meta["metadata"]["ome_types"] is first read
+        """
+        if self._meta is None:
+            self._meta = _get_layer_meta(self._file_name, self._xdata, self._image)
+            self._meta["file_name"] = self._file_name
+            self._meta["metadata"] = _LazyRawMetadata(self._image)
+        return self._meta
+
+    def to_dask(self):
+        """
+        the image as a (lazy) dask array
+        """
+        return self._xdata.data
+
+    def get_channels(
+        self, channels: Union[int, List[int], Tuple[int, ...]], z_range: Union[Tuple[int, int], None] = None
+    ) -> np.ndarray:
+        """
+        read some channels (and optionally a range of Z slices) of a multi-channel image
+
+        Parameters
+        ------------
+        channels:
+            channel index, or list of channel indices
+        z_range:
+            (first, last + 1) Z slices to read (default: all)
+
+        Returns
+        -------------
+            np.ndarray of the channel (ZYX), or of the channels (CZYX)
+        """
+        if self.dims[0] != "C":
+            raise ValueError(f"{self._file_name} has no channel dimension ({self.dims})")
+        key = (channels if isinstance(channels, (int, np.integer)) else list(channels),)
+        if z_range is not None:
+            if "Z" not in self.dims:
+                raise ValueError(f"{self._file_name} has no Z dimension ({self.dims})")
+            key = key + (slice(*z_range),)
+        return self[key]
+
+    def __getitem__(self, key) -> np.ndarray:
+        return np.asarray(self._xdata.data[key])
+
+    def __array__(self, dtype=None) -> np.ndarray:
+        return np.asarray(self._xdata.data, dtype=dtype)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __repr__(self) -> str:
+        return f"LazyImage({self._file_name}, dims={self.dims}, shape={self.shape}, dtype={self.dtype})"
+
+
 ### USED ###
 def export_tiff(
     data_in: np.ndarray,
@@ -82,19 +226,12 @@ def export_tiff(
     #     # data_in = data_in[np.newaxis, np.newaxis, :, :]
     #     physical_pixel_sizes[0] = [physical_pixel_sizes[0][1:]]
 
-    dtype = data_in.dtype
-    if dtype == "bool" or dtype == np.uint8:
-        data_in = data_in.astype(np.uint16)
-        data_in[data_in > 0] = 1
-        dtype = data_in.dtype
-        # print(f"changed `bool` -> {dtype}")
-    # else:
-        # print(f"export as {dtype}")
+    data_in = _format_export_data(data_in)
 
     ret = imwrite(
             out_name,
             data_in,
-            dtype=dtype,
+            dtype=data_in.dtype,
             # metadata={
             #     "axes": dimension_order,
             #     # "physical_pixel_sizes": physical_pixel_sizes,
@@ -106,6 +243,16 @@ def export_tiff(
     return ret
 
 
+def _format_export_data(data_in: np.ndarray) -> np.ndarray:
+    """
+    exported masks (bool or uint8) are written as 0/1 uint16, like the labels
+    """
+    if data_in.dtype == "bool" or data_in.dtype == np.uint8:
+        data_in = data_in.astype(np.uint16)
+        data_in[data_in > 0] = 1
+    return data_in
+
+
 ### USED ###
 def list_image_files(data_folder: Path, file_type: str, postfix: Union[str, None] = None) -> List:
     """
@@ -171,9 +318,10 @@ def import_inferred_organelle(name: str, meta_dict: Dict, out_data_path: Path, f
     meta_dict:
         dictionary of meta-data (ome) from original file
     out_data_path:
-        Path object of directory where tiffs are read from
+        Path object of directory where tiffs are read from, or of a zarr SegmentationStore (".zarr")
     file_type: 
-        The type of file you want to import as a string (ex - ".tif", ".tiff", ".czi", etc.)
+        The type of file you want to import as a string (ex - ".tif", ".tiff", ".czi", etc.).  Not used with a
+        SegmentationStore
 
     Returns
     -------------
@@ -185,6 +333,16 @@ def import_inferred_organelle(name: str, meta_dict: Dict, out_data_path: Path, f
 
     if name is None:
         pass
+    elif is_zarr_path(out_data_path):
+        store = SegmentationStore(out_data_path, mode="r")
+        if store.contains(img_name.stem, name):
+            organelle_obj = store.read(img_name.stem, name)
+            print(f"loaded  inferred {len(organelle_obj.shape)}D `{name}`  from {out_data_path} ")
+            return organelle_obj
+        else:
+            organelle_path = store.array_path(img_name.stem, name)
+            print(f"`{name}` object not found: {organelle_path}")
+            raise FileNotFoundError(f"`{name}` object not found: {organelle_path}")
     else:
         organelle_fname = f"{img_name.stem}-{name}{file_type}"
 
@@ -203,7 +361,7 @@ def import_inferred_organelle(name: str, meta_dict: Dict, out_data_path: Path, f
 ### USED ###
 def export_inferred_organelle(img_out: np.ndarray, name: str, meta_dict: Dict, out_data_path: Path) -> str:
     """
-    write inferred organelle to ome.tif file
+    write inferred organelle to ome.tif file, or to a zarr SegmentationStore if `out_data_path` is one (".zarr")
 
     Parameters
     ------------
@@ -214,11 +372,11 @@ def export_inferred_organelle(img_out: np.ndarray, name: str, meta_dict: Dict, o
     meta_dict:
         dictionary of meta-data (ome) only using original file name here, but could add metadata
     out_data_path:
-        Path object where tiffs are written to
+        Path object where tiffs are written to, or of the zarr SegmentationStore the organelle is written to
 
     Returns
     -------------
-    exported file name
+    exported file name (path of the array in a SegmentationStore)
 
     """
     # get some top-level info about the RAW data
@@ -231,6 +389,18 @@ def export_inferred_organelle(img_out: np.ndarray, name: str, meta_dict: Dict, o
     img_name = Path(meta_dict["file_name"])  #
     # add params to metadata
 
+    if is_zarr_path(out_data_path):
+        store = SegmentationStore(out_data_path)
+        out_file_n = store.write(
+            img_name.stem,
+            name,
+            _format_export_data(img_out),
+            scale=meta_dict.get("scale"),
+            provenance={"source": img_name.name},
+        )
+        print(f"saved {name} of {img_name.stem} to {out_data_path}")
+        return str(out_file_n)
+
     if not Path.exists(out_data_path):
         Path.mkdir(out_data_path)
         print(f"making {out_data_path}")
@@ -0,0 +1,440 @@
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
+import numpy as np
+
+from skimage.filters import threshold_otsu, threshold_multiotsu
+
+from infer_subc import get_float_dtype, get_float_dtype_for
+
+# Global thresholds evaluated from one intensity histogram of the image.  The histogram is built chunk by chunk
+#   along the first (Z) axis, so apart from the histogram itself the memory used is that of a few planes, and
+#   any array that can be sliced (np.ndarray, memory-mapped or dask array...) can be thresholded.
+#   Bins are the same as skimage.exposure.histogram: one bin per value for integer images, `nbins` bins over
+#   (min, max) for float images.  So otsu, multi-otsu and triangle are identical to the skimage functions, and
+#   the median (refined with a second pass over the voxels of its bin) is identical to np.percentile(image, 50).
+#   Li's method is iterated on the histogram, which is exact for integer images (as skimage does it) and
+#   accurate to a fraction of a bin for float images.
+#   With `log_scale` the histogram is taken of the log_transform() of the image (computed chunk by chunk) and
+#   the thresholds are transformed back, like threshold_otsu_log() & co.  Li's method on a log scaled integer
+#   image is iterated on the transformed value of every integer, so it is the same as skimage's on the log
+#   transformed image (up to rounding: the means are summed per value instead of per voxel).
+
+DEFAULT_NBINS = 256
+DEFAULT_Z_CHUNK = 8  # planes (along the first axis) per chunk
+
+HISTOGRAM_METHODS = {
+    "otsu": "otsu",
+    "mult_otsu": "multiotsu",
+    "multiotsu": "multiotsu",
+    "tri": "triangle",
+    "triangle": "triangle",
+    "med": "median",
+    "median": "median",
+    "ave": "ave",
+    "ave_tri_med": "ave",
+    "li": "li",
+    "cross_entropy": "li",
+    "crossentropy": "li",
+}
+
+Transform = Union[Callable[[np.ndarray], np.ndarray], None]
+
+
+def image_histogram(
+    image: np.ndarray, nbins: int = DEFAULT_NBINS, log_scale: bool = False, z_chunk: int = DEFAULT_Z_CHUNK
+) -> Tuple[np.ndarray, np.ndarray, Union[dict, None]]:
+    """
+    intensity histogram of an image, built chunk by chunk along the first axis
+
+    Parameters
+    ------------
+    image:
+        image (or any array that can be sliced along its first axis)
+    nbins:
+        number of bins for float images (integer images get one bin per value)
+    log_scale:
+        histogram of the log transformed image (see log_transform)
+    z_chunk:
+        number of planes read at a time
+
+    Returns
+    -------------
+        tuple of the counts, the bin centers and the log_transform dictionary (None if not `log_scale`)
+    """
+    counts, bin_centers, _, _, log_params, _ = _build_histogram(image, nbins, log_scale, z_chunk)
+    return counts, bin_centers, log_params
+
+
+def threshold_from_histogram(
+    counts: np.ndarray, bin_centers: np.ndarray, method: str = "otsu", classes: int = 3
+) -> Union[float, np.ndarray]:
+    """
+    evaluate a global threshold from a histogram
+
+    Parameters
+    ------------
+    counts:
+        histogram counts
+    bin_centers:
+        histogram bin centers
+    method:
+        "otsu", "multiotsu", "triangle", "li", "median" or "ave" (average of triangle and median) or one of their
+        apply_threshold aliases.  The median is only accurate to the bin here (see histogram_thresholds)
+    classes:
+        number of classes for "multiotsu"
+
+    Returns
+    -------------
+        threshold (np.ndarray of `classes - 1` thresholds for "multiotsu")
+    """
+    method = _get_method(method)
+    if method == "median":
+        return _histogram_median(counts, bin_centers)
+    if method == "ave":
+        return (_threshold_triangle(counts, bin_centers) + _histogram_median(counts, bin_centers)) / 2
+    return _evaluate(counts, bin_centers, method, classes)
+
+
+def histogram_thresholds(
+    image: np.ndarray,
+    methods: Union[List[str], Tuple[str, ...]] = ("otsu",),
+    log_scale: bool = False,
+    nbins: int = DEFAULT_NBINS,
+    z_chunk: int = DEFAULT_Z_CHUNK,
+    classes: int = 3,
+) -> Dict[str, Any]:
+    """
+    evaluate several global thresholds of an image from a single histogram
+
+    Parameters
+    ------------
+    image:
+        image (or any array that can be sliced along its first axis)
+    methods:
+        threshold methods, see threshold_from_histogram.  The median is exact (a second pass reads the voxels
+        of the median bin only)
+    log_scale:
+        find the thresholds in log space (see log_transform), returned in image intensities
+    nbins:
+        number of bins for float images
+    z_chunk:
+        number of planes read at a time
+    classes:
+        number of classes for "multiotsu"
+
+    Returns
+    -------------
+        dict of thresholds by method (as given in `methods`)
+    """
+    counts, bin_centers, bin_edges, transform, log_params, constant = _build_histogram(
+        image, nbins, log_scale, z_chunk
+    )
+
+    median = None
+    thresholds = dict()
+    for method in methods:
+        name = _get_method(method)
+        if name in ("median", "ave") and median is None and constant is None:
+            median = _exact_median(image, counts, bin_centers, bin_edges, transform, z_chunk)
+
+        if constant is not None and name != "multiotsu":
+            # the image has a single value, which the skimage functions return as threshold
+            threshold = constant
+        elif name == "median":
+            threshold = median
+        elif name == "ave":
+            threshold = (_threshold_triangle(counts, bin_centers) + median) / 2
+        elif name == "li" and log_params is not None and image.dtype.kind in "iu":
+            threshold = _threshold_li(*_transformed_value_histogram(image, transform, z_chunk))
+        else:
+            threshold = _evaluate(counts, bin_centers, name, classes)
+
+        if log_params is not None:
+            # same arithmetic as inverse_log_transform
+            threshold = np.exp(threshold * (log_params["log_max"] - log_params["log_min"]) + log_params["log_min"])
+        thresholds[method] = threshold
+    return thresholds
+
+
+def histogram_threshold(
+    image: np.ndarray,
+    method: str = "otsu",
+    log_scale: bool = False,
+    nbins: int = DEFAULT_NBINS,
+    z_chunk: int = DEFAULT_Z_CHUNK,
+    classes: int = 3,
+) -> Union[float, np.ndarray]:
+    """
+    global threshold of an image from its histogram, see histogram_thresholds
+
+    Parameters
+    ------------
+    image:
+        image (or any array that can be sliced along its first axis)
+    method:
+        threshold method, see threshold_from_histogram
+    log_scale:
+        find the threshold in log space (see log_transform)
+    nbins:
+        number of bins for float images
+    z_chunk:
+        number of planes read at a time
+    classes:
+        number of classes for "multiotsu"
+
+    Returns
+    -------------
+        threshold (np.ndarray of thresholds for "multiotsu")
+    """
+    return histogram_thresholds(image, [method], log_scale, nbins, z_chunk, classes)[method]
+
+
+def _get_method(method: str) -> str:
+    if method not in HISTOGRAM_METHODS:
+        raise ValueError(f"unknown histogram threshold method {method}: use one of {sorted(HISTOGRAM_METHODS)}")
+    return HISTOGRAM_METHODS[method]
+
+
+def _iter_chunks(image: np.ndarray, z_chunk: int, transform: Transform = None) -> Iterator[np.ndarray]:
+    if z_chunk < 1:
+        raise ValueError("z_chunk must be at least 1")
+    for z in range(0, image.shape[0], z_chunk):
+        chunk = np.asarray(image[z : z + z_chunk])
+        yield chunk if transform is None else transform(chunk)
+
+
+def _extrema(image: np.ndarray, z_chunk: int, transform: Transform = None) -> Tuple[Any, Any]:
+    minima, maxima = list(), list()
+    for chunk in _iter_chunks(image, z_chunk, transform):
+        minima.append(chunk.min())
+        maxima.append(chunk.max())
+    return min(minima), max(maxima)
+
+
+def _log_transform(image: np.ndarray, z_chunk: int) -> Tuple[Transform, Any, Any, dict]:
+    """
+    chunk-wise version of log_transform: the function mapping a chunk of `image` to its log_transform values,
+    the extrema of the transformed image and the log_transform dictionary
+    """
+    orig_min, orig_max = _extrema(image, z_chunk)
+    float_dtype = get_float_dtype_for(image.dtype)
+    # same arithmetic as log_transform, which adds 1/2 bit noise to give the log a bottom
+    noise_min = orig_min + (orig_max - orig_min) / 256.0 + np.finfo(float_dtype).eps
+
+    def log_chunk(chunk: np.ndarray) -> np.ndarray:
+        limage = chunk.astype(float_dtype)
+        limage[limage < noise_min] = noise_min
+        return np.log(limage, out=limage)
+
+    log_min, log_max = _extrema(image, z_chunk, log_chunk)
+    log_params = {"noise_min": noise_min, "log_min": log_min, "log_max": log_max}
+
+    # then stretch() to [0, 1]
+    stretch_dtype = get_float_dtype()
+    minval, maxval = np.array([log_min, log_max], dtype=stretch_dtype)
+
+    def stretch_chunk(chunk: np.ndarray) -> np.ndarray:
+        image = np.asarray(log_chunk(chunk), stretch_dtype)
+        if minval == maxval:
+            if minval < 0:
+                return np.zeros_like(image)
+            elif minval > 1:
+                return np.ones_like(image)
+            return image
+        return (image - minval) / (maxval - minval)
+
+    if minval == maxval:
+        out_min = out_max = stretch_chunk(np.asarray(image[:1]).ravel()[:1])[0]
+    else:
+        out_min, out_max = stretch_dtype.type(0), stretch_dtype.type(1)
+    return stretch_chunk, out_min, out_max, log_params
+
+
+def _build_histogram(
+    image: np.ndarray, nbins: int, log_scale: bool, z_chunk: int
+) -> Tuple[np.ndarray, np.ndarray, Union[np.ndarray, None], Transform, Union[dict, None], Any]:
+    """
+    Returns
+        counts, bin centers, bin edges (None for integer images: one bin per value), the chunk transform, the
+        log_transform dictionary, and the value of the image if it is constant (else None)
+    """
+    if image.dtype.kind not in "iuf":
+        raise ValueError(f"cannot threshold an image of type {image.dtype}")
+
+    transform, log_params = None, None
+    if log_scale:
+        transform, vmin, vmax, log_params = _log_transform(image, z_chunk)
+    else:
+        vmin, vmax = _extrema(image, z_chunk)
+
+    constant = vmin if vmin == vmax else None
+
+    if not log_scale and image.dtype.kind in "iu":
+        vmin, vmax = int(vmin), int(vmax)
+        counts = np.zeros(vmax - vmin + 1, dtype=np.intp)
+        for chunk in _iter_chunks(image, z_chunk):
+            counts += np.bincount((chunk.astype(np.int64) - vmin).ravel(), minlength=counts.size)
+        return counts, np.arange(vmin, vmax + 1), None, None, None, constant
+
+    bin_edges = None
+    counts = np.zeros(nbins, dtype=np.intp)
+    for chunk in _iter_chunks(image, z_chunk, transform):
+        chunk_counts, bin_edges = np.histogram(chunk, bins=nbins, range=(vmin, vmax))
+        counts += chunk_counts
+    bin_centers = (bin_edges[:-1] + bin_edges[1:]) / 2.0
+    return counts, bin_centers, bin_edges, transform, log_params, constant
+
+
+def _transformed_value_histogram(
+    image: np.ndarray, transform: Transform, z_chunk: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    counts and (sorted, distinct) values of the transformed integer image, from the counts of every integer
+    """
+    vmin, vmax = (int(v) for v in _extrema(image, z_chunk))
+    counts = np.zeros(vmax - vmin + 1, dtype=np.intp)
+    for chunk in _iter_chunks(image, z_chunk):
+        counts += np.bincount((chunk.astype(np.int64) - vmin).ravel(), minlength=counts.size)
+    present = np.flatnonzero(counts)
+    # values under the noise floor of the log transform all map to the same value
+    values, index = np.unique(transform(present + vmin), return_inverse=True)
+    return np.bincount(index, weights=counts[present]).astype(np.intp), values
+
+
+def _evaluate(counts: np.ndarray, bin_centers: np.ndarray, method: str, classes: int) -> Union[float, np.ndarray]:
+    if method == "otsu":
+        if np.count_nonzero(counts) == 1:
+            return bin_centers[np.flatnonzero(counts)[0]]
+        return threshold_otsu(hist=(counts, bin_centers))
+    if method == "multiotsu":
+        # skimage thresholds an image from its normalized histogram
+        return threshold_multiotsu(hist=(counts / np.sum(counts), bin_centers), classes=classes)
+    if method == "triangle":
+        return _threshold_triangle(counts, bin_centers)
+    if method == "li":
+        return _threshold_li(counts, bin_centers)
+    raise ValueError(f"{method} needs the image")
+
+
+def _threshold_triangle(counts: np.ndarray, bin_centers: np.ndarray) -> float:
+    """
+    skimage.filters.threshold_triangle, from the histogram
+    """
+    hist = counts
+    nbins = len(hist)
+
+    # Find peak, lowest and highest gray levels.
+    arg_peak_height = np.argmax(hist)
+    peak_height = hist[arg_peak_height]
+    arg_low_level, arg_high_level = np.flatnonzero(hist)[[0, -1]]
+
+    if arg_low_level == arg_high_level:
+        # Image has constant intensity.
+        return bin_centers[arg_low_level]
+
+    # Flip is True if left tail is shorter.
+    flip = arg_peak_height - arg_low_level < arg_high_level - arg_peak_height
+    if flip:
+        hist = hist[::-1]
+        arg_low_level = nbins - arg_high_level - 1
+        arg_peak_height = nbins - arg_peak_height - 1
+
+    # Set up the coordinate system.
+    width = arg_peak_height - arg_low_level
+    x1 = np.arange(width)
+    y1 = hist[x1 + arg_low_level]
+
+    # Normalize.
+    norm = np.sqrt(peak_height**2 + width**2)
+    peak_height = peak_height / norm
+    width = width / norm
+
+    # Maximize the length.
+    length = peak_height * x1 - width * y1
+    arg_level = np.argmax(length) + arg_low_level
+
+    if flip:
+        arg_level = nbins - arg_level - 1
+
+    return bin_centers[arg_level]
+
+
+def _threshold_li(counts: np.ndarray, bin_centers: np.ndarray) -> float:
+    """
+    Li's minimum cross entropy threshold iterated on the histogram, as skimage.filters.threshold_li does for
+    integer images
+    """
+    nonzero = np.flatnonzero(counts)
+    if len(nonzero) == 1:
+        return bin_centers[nonzero[0]]
+    counts, bin_centers = counts[nonzero[0] : nonzero[-1] + 1], bin_centers[nonzero[0] : nonzero[-1] + 1]
+
+    # Li's algorithm requires positive values (because of log(mean))
+    image_min = bin_centers[0]
+    bin_centers = bin_centers - image_min
+    if bin_centers.dtype.kind in "iu":
+        tolerance = 0.5
+    else:
+        tolerance = np.min(np.diff(bin_centers)) / 2
+
+    t_next = np.sum(counts * bin_centers) / np.sum(counts)
+    t_curr = -2 * tolerance
+    hist = counts.astype("float32", copy=False)
+    while abs(t_next - t_curr) > tolerance:
+        t_curr = t_next
+        foreground = bin_centers > t_curr
+        background = ~foreground
+
+        mean_fore = np.average(bin_centers[foreground], weights=hist[foreground])
+        mean_back = np.average(bin_centers[background], weights=hist[background])
+
+        if mean_back == 0:
+            break
+
+        t_next = (mean_back - mean_fore) / (np.log(mean_back) - np.log(mean_fore))
+
+    return t_next + image_min
+
+
+def _histogram_median(counts: np.ndarray, bin_centers: np.ndarray) -> float:
+    """
+    median to the resolution of the histogram: mean of the centers of the bins of the two middle values
+    """
+    n = np.sum(counts)
+    cumulative = np.cumsum(counts)
+    lower, upper = np.searchsorted(cumulative, [(n - 1) // 2, n // 2], side="right")
+    return (bin_centers[lower] + bin_centers[upper]) / 2
+
+
+def _exact_median(
+    image: np.ndarray,
+    counts: np.ndarray,
+    bin_centers: np.ndarray,
+    bin_edges: Union[np.ndarray, None],
+    transform: Transform,
+    z_chunk: int,
+) -> float:
+    """
+    np.percentile(image, 50) (of the transformed image): the histogram tells which bins hold the two middle
+    values, and only the voxels of those bins are read again and sorted
+    """
+    n = np.sum(counts)
+    cumulative = np.cumsum(counts)
+    lower_rank, upper_rank = (n - 1) // 2, n // 2
+    first, last = np.searchsorted(cumulative, [lower_rank, upper_rank], side="right")
+    below = cumulative[first - 1] if first > 0 else 0
+
+    candidates = list()
+    for chunk in _iter_chunks(image, z_chunk, transform):
+        if bin_edges is None:
+            inside = (chunk >= bin_centers[first]) & (chunk <= bin_centers[last])
+        else:
+            # same bin membership as np.histogram (the last bin is closed)
+            inside = chunk >= bin_edges[first]
+            if last < len(counts) - 1:
+                inside &= chunk < bin_edges[last + 1]
+        candidates.append(chunk[inside])
+    candidates = np.sort(np.concatenate(candidates))
+
+    middle = [lower_rank - below] if lower_rank == upper_rank else [lower_rank - below, upper_rank - below]
+    # np.percentile interpolates between the two middle values exactly as it does on the whole image
+    return np.percentile(candidates[middle], 50)
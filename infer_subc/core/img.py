@@ -1,17 +1,167 @@
-from typing import Tuple, List, Union, Any
+from typing import Tuple, List, Union, Any, Callable
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
 from skimage.filters import threshold_triangle, threshold_otsu, threshold_li, threshold_multiotsu, threshold_sauvola
 from skimage.morphology import white_tophat, ball, disk, black_tophat, label
 from skimage.segmentation import clear_border, watershed
 
 from scipy.ndimage import median_filter, extrema, distance_transform_edt, sum, minimum_filter, maximum_filter
+from scipy.ndimage import gaussian_filter, gaussian_laplace, find_objects, generate_binary_structure
+from scipy.ndimage import label as ndi_label
+from skimage.morphology import remove_small_objects
 
 from aicssegmentation.core.utils import size_filter, hole_filling
-from aicssegmentation.core.vessel import vesselness2D
-from aicssegmentation.core.MO_threshold import MO
+from aicssegmentation.core.vessel import vesselness2D, compute_vesselness2D, compute_vesselness3D
+from aicssegmentation.core.hessian import absolute_3d_hessian_eigenvalues
 from aicssegmentation.core.vessel import filament_2d_wrapper, filament_3d_wrapper
 from aicssegmentation.core.pre_processing_utils import image_smoothing_gaussian_slice_by_slice
 from aicssegmentation.core.seg_dot import dot_2d_slice_by_slice_wrapper, dot_3d_wrapper
+from infer_subc import get_float_dtype, get_float_dtype_for
+from infer_subc.core.label_reductions import label_index, label_sum
+from infer_subc.core.histogram_threshold import histogram_threshold, histogram_thresholds
+from infer_subc.core.response_cache import get_response_cache
+
+# number of threads used by the slice-by-slice functions when they are not given `max_workers`. 1 = serial
+_slice_max_workers = 1
+
+
+def set_slice_max_workers(max_workers: int):
+    """
+    set the number of threads the slice-by-slice functions use by default (see map_slices)
+
+    Parameters
+    ------------
+    max_workers:
+        number of threads, e.g. os.cpu_count().  1 (the initial value) runs the slices one after another
+    """
+    global _slice_max_workers
+    if max_workers is None or max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+    _slice_max_workers = max_workers
+
+
+def get_slice_max_workers() -> int:
+    """
+    number of threads the slice-by-slice functions use by default, see set_slice_max_workers()
+    """
+    return _slice_max_workers
+
+
+def map_slices(
+    kernel: Callable[..., np.ndarray],
+    img: np.ndarray,
+    *args,
+    out: Union[np.ndarray, None] = None,
+    dtype: Union[type, None] = None,
+    max_workers: Union[int, None] = None,
+    use_processes: bool = False,
+    **kwargs,
+) -> np.ndarray:
+    """
+    apply a 2D kernel to every Z slice of a 3D image, on a pool of workers, writing into a preallocated output
+
+    Parameters
+    ------------
+    kernel:
+        function called as kernel(img[zz], *args, **kwargs) and returning the 2D result of slice zz
+    img:
+        a 3d image
+    out:
+        preallocated output array with the shape of `img`, default: a new array of type `dtype`
+    dtype:
+        dtype of the new output array, default is the dtype of `img`
+    max_workers:
+        number of workers; 1 runs the slices one after another in the calling thread.  Default (None) is the
+        package setting, see set_slice_max_workers()
+    use_processes:
+        use a pool of processes instead of threads (the kernel, its arguments and the slices must be picklable).
+        Threads are best for the scipy/skimage filters, which release the GIL
+
+    Returns
+    -------------
+        np.ndarray (`out`)
+    """
+    if max_workers is None:
+        max_workers = _slice_max_workers
+    if out is None:
+        out = np.empty(img.shape, dtype=dtype if dtype is not None else img.dtype)
+
+    if kwargs:
+        kernel = partial(kernel, **kwargs)
+
+    if max_workers == 1 or img.shape[0] < 2:
+        for zz in range(img.shape[0]):
+            out[zz, :, :] = kernel(img[zz, :, :], *args)
+        return out
+
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max_workers=max_workers) as executor:
+        futures = [executor.submit(kernel, img[zz, :, :], *args) for zz in range(img.shape[0])]
+        for zz, future in enumerate(futures):
+            out[zz, :, :] = future.result()
+    return out
+
+
+# 2D kernels of the slice-by-slice functions, for map_slices
+def _dot_response_slice(plane: np.ndarray, log_sigma: float) -> np.ndarray:
+    # same response as aicssegmentation's dot_2d_slice_by_slice_wrapper on one slice
+    return (-1 * (log_sigma**2) * gaussian_laplace(plane, log_sigma)).astype(plane.dtype, copy=False)
+
+
+def _filament_response_slice(plane: np.ndarray, mip: np.ndarray, sigma: float) -> np.ndarray:
+    # same response as aicssegmentation's filament_2d_wrapper on one slice of a 3D image
+    tmp = np.concatenate((plane, mip), axis=1)
+    width = plane.shape[1] - 3
+    eigenvalues = absolute_3d_hessian_eigenvalues(tmp, sigma=sigma, scale=True, whiteonblack=True)
+    responce = compute_vesselness2D(eigenvalues[1], tau=1)
+    res = np.zeros(plane.shape, dtype=plane.dtype)
+    res[:, :width] = responce[:, :width]
+    return res
+
+
+def _vesselness_slice(plane: np.ndarray, mip: np.ndarray, sigma: float, tau: float) -> np.ndarray:
+    response = np.zeros(plane.shape)
+    tmp = np.concatenate((plane, mip), axis=1)
+    tmp = vesselness2D(tmp, sigmas=[sigma], tau=tau, whiteonblack=True)
+    response[:, : plane.shape[1] - 3] = tmp[:, : plane.shape[1] - 3]
+    return response
+
+
+def _size_filter_slice(plane: np.ndarray, min_size: int, connectivity: int) -> np.ndarray:
+    return remove_small_objects(plane > 0, min_size=min_size, connectivity=connectivity)
+
+
+def _fill_and_filter(bw: np.ndarray, hole_min: int, hole_max: int, min_size: int, connectivity: int) -> np.ndarray:
+    """
+    aicssegmentation's `hole_filling` (without fill_2d) followed by `remove_small_objects`, fused: the background
+    is labeled once to find the holes with a size in [hole_min, hole_max], and the filled foreground is labeled
+    once to find the objects smaller than min_size.  Works on images of any dimension
+    """
+    bw = bw > 0
+    if hole_max > 0:
+        # holes are background components, always 1-connected
+        holes = np.empty(bw.shape, dtype=np.int32)
+        ndi_label(~bw, generate_binary_structure(bw.ndim, 1), output=holes)
+        hole_sizes = np.bincount(holes.ravel())
+        fill = (hole_sizes >= hole_min) & (hole_sizes <= hole_max)
+        fill[0] = False
+        bw |= fill[holes]
+        del holes
+
+    if min_size == 0:
+        return bw
+    objects = np.empty(bw.shape, dtype=np.int32)
+    ndi_label(bw, generate_binary_structure(bw.ndim, connectivity), output=objects)
+    keep = np.bincount(objects.ravel()) >= min_size
+    keep[0] = False
+    return keep[objects]
+
+
+def _fill_and_filter_slice(
+    plane: np.ndarray, hole_min: int, hole_max: int, min_size: int, connectivity: int
+) -> np.ndarray:
+    return _fill_and_filter(plane, hole_min, hole_max, min_size, connectivity)
 
 
 def stack_layers(*layers) -> np.ndarray:
@@ -47,8 +197,8 @@ def log_transform(image: np.ndarray) -> Tuple[np.ndarray, dict]:
     #
     # We add 1/2 bit noise to an 8 bit image to give the log a bottom
     #
-    limage = image.copy()
-    noise_min = orig_min + (orig_max - orig_min) / 256.0 + np.finfo(image.dtype).eps
+    limage = image.astype(get_float_dtype_for(image.dtype))
+    noise_min = orig_min + (orig_max - orig_min) / 256.0 + np.finfo(limage.dtype).eps
     limage[limage < noise_min] = noise_min
     d = {"noise_min": noise_min}
     limage = np.log(limage)
@@ -90,7 +240,7 @@ def stretch(image: np.ndarray, mask: Union[np.ndarray, None] = None) -> np.ndarr
         stretched (normalized to [0,1]) image (np.ndarray)
 
     """
-    image = np.array(image, float)
+    image = np.array(image, get_float_dtype())
     if np.product(image.shape) == 0:
         return image
     if mask is None:
@@ -151,7 +301,12 @@ def threshold_li_log(image_in: np.ndarray) -> np.ndarray:
         boolean np.ndarray
 
     """
-    image, d = log_transform(image_in.copy())
+    if image_in.dtype.kind in "iu":
+        # iterated on the log of every integer value, without a log transformed copy (see histogram_threshold)
+        return histogram_threshold(image_in, "li", log_scale=True)
+
+    # on floats, the histogram is only accurate to the bin: Li is iterated on a (log transformed) copy
+    image, d = log_transform(image_in)
     threshold = threshold_li(image)
     threshold = inverse_log_transform(threshold, d)
     return threshold
@@ -172,10 +327,8 @@ def threshold_otsu_log(image_in):
     -------------
         boolean np.ndarray
     """
-    image, d = log_transform(image_in.copy())
-    threshold = threshold_otsu(image)
-    threshold = inverse_log_transform(threshold, d)
-    return threshold
+    # histogram of the log transformed image, built plane by plane without a log transformed copy
+    return histogram_threshold(image_in, "otsu", log_scale=True)
 
 
 def threshold_multiotsu_log(image_in):
@@ -190,17 +343,23 @@ def threshold_multiotsu_log(image_in):
     -------------
         boolean np.ndarray
     """
-    image, d = log_transform(image_in.copy())
-    thresholds = threshold_multiotsu(image)
-    thresholds = inverse_log_transform(thresholds, d)
-    return thresholds
+    return histogram_threshold(image_in, "multiotsu", log_scale=True)
 
 ### USED ###
 def masked_object_thresh(
-    structure_img_smooth: np.ndarray, global_method: str, cutoff_size: int, local_adjust: float
+    structure_img_smooth: np.ndarray,
+    global_method: str,
+    cutoff_size: int,
+    local_adjust: float,
+    extra_criteria: bool = True,
 ) -> np.ndarray:
     """
-    wrapper for applying Masked Object Thresholding with just two parameters via `MO` from `aicssegmentation`
+    Masked Object Thresholding, with the same semantics as `MO` from `aicssegmentation` (without dilation): a global
+    threshold gives the objects, objects smaller than `cutoff_size` are removed, then each object is thresholded
+    with its own (local) otsu threshold.
+
+    The image is labeled once, the global thresholds come from a single histogram (see histogram_threshold) and
+    each object is only read and thresholded within its bounding box, instead of one full-volume pass per object
 
     Parameters
     ------------
@@ -214,21 +373,34 @@ def masked_object_thresh(
         Masked Object threshold `size_min`
     local_adjust:
         Masked Object threshold `local_adjust`
+    extra_criteria:
+        discard the objects whose local otsu threshold is not above 1/3 of the global otsu threshold
 
     Returns
     -------------
         np.ndimage
 
     """
-    struct_obj = MO(
-        structure_img_smooth,
-        object_minArea=cutoff_size,
-        global_thresh_method=global_method,
-        extra_criteria=True,
-        local_adjust=local_adjust,
-        return_object=False,
-        dilate=False,  # WARNING: dilate=True causes a bug if there is only one Z
-    )
+    methods = [global_method, "otsu"] if extra_criteria else [global_method]
+    global_thresholds = histogram_thresholds(structure_img_smooth, methods)
+
+    # low level: global threshold, without the small objects
+    objects = label(structure_img_smooth > global_thresholds[global_method], connectivity=1)
+    object_sizes = np.bincount(objects.ravel())
+
+    # high level: local otsu threshold of each object
+    local_cutoff = 0.333 * global_thresholds["otsu"] if extra_criteria else None
+    struct_obj = np.zeros(structure_img_smooth.shape, dtype=bool)
+    for index, bbox in enumerate(find_objects(objects)):
+        if bbox is None or object_sizes[index + 1] < cutoff_size:
+            continue
+        single_obj = objects[bbox] == index + 1
+        img_obj = structure_img_smooth[bbox]
+        local_otsu = threshold_otsu(img_obj[single_obj])
+        if local_cutoff is not None and not local_otsu > local_cutoff:
+            continue
+        struct_obj[bbox] |= np.logical_and(img_obj > local_otsu * local_adjust, single_obj)
+
     return struct_obj
 
 
@@ -295,7 +467,9 @@ def label_bool_as_uint16(in_obj: np.ndarray) -> np.ndarray:
     return (in_obj > 0).astype(np.uint16)
 
 
-def median_filter_slice_by_slice(struct_img: np.ndarray, size: int) -> np.ndarray:
+def median_filter_slice_by_slice(
+    struct_img: np.ndarray, size: int, max_workers: Union[int, None] = None
+) -> np.ndarray:
     """
     wrapper for applying 2D median filter slice by slice on a 3D image
 
@@ -306,19 +480,16 @@ def median_filter_slice_by_slice(struct_img: np.ndarray, size: int) -> np.ndarra
 
     size:
         the linear "size" which will be squared for
+    max_workers:
+        number of threads filtering slices in parallel, default is the package setting (see map_slices)
 
     Returns
     -------------
         np.ndimage
 
     """
-    structure_img_denoise = np.zeros_like(struct_img)
-
     # this might be faster:  scipy.signal.medfilt2d()
-    for zz in range(struct_img.shape[0]):
-        structure_img_denoise[zz, :, :] = median_filter(struct_img[zz, :, :], size=size)
-
-    return structure_img_denoise
+    return map_slices(median_filter, struct_img, size=size, max_workers=max_workers)
 
 ### USED ###
 def min_max_intensity_normalization(struct_img: np.ndarray) -> np.ndarray:
@@ -335,8 +506,8 @@ def min_max_intensity_normalization(struct_img: np.ndarray) -> np.ndarray:
     """
     strech_min = struct_img.min()
     strech_max = struct_img.max()
-    # do we need to convert to float?
-    # #.astype(np.double)
+    # convert to float first so that the arithmetic runs in the package float type
+    struct_img = struct_img.astype(get_float_dtype_for(struct_img.dtype), copy=False)
     struct_img = (struct_img - strech_min + 1e-8) / (strech_max - strech_min + 1e-8)
 
     return struct_img
@@ -378,10 +549,10 @@ def weighted_aggregate(img_in: np.ndarray, *weights: int) -> np.ndarray:
 
     """
 
-    img_out = np.zeros_like(img_in[0]).astype(np.double)
+    img_out = np.zeros(img_in[0].shape, dtype=get_float_dtype())
     for ch, w in enumerate(weights):
         if w > 0:
-            img_out += (w * 1.0) * img_in[ch]
+            img_out += img_in[ch] * img_out.dtype.type(w)
 
     return img_out
 
@@ -450,22 +621,15 @@ def apply_threshold(
         thresholded boolean np.ndarray
     """
 
-    if method == "tri" or method == "triangle":
-        threshold_val = threshold_triangle(img_in)
-    elif method == "med" or method == "median":
-        threshold_val = np.percentile(img_in, 50)
-    elif method == "ave" or method == "ave_tri_med":
-        global_tri = threshold_triangle(img_in)
-        global_median = np.percentile(img_in, 50)
-        threshold_val = (global_tri + global_median) / 2
+    # the global methods but li are evaluated from a single histogram of the image (same values as skimage)
+    if method in ("tri", "triangle", "med", "median", "ave", "ave_tri_med", "mult_otsu", "multiotsu"):
+        threshold_val = histogram_threshold(img_in, method)
     elif method == "li" or method == "cross_entropy" or method == "crossentropy":
         threshold_val = threshold_li(img_in)
     elif method == "sauvola":
         threshold_val = threshold_sauvola(img_in)
-    elif method == "mult_otsu" or method == "multiotsu":
-        threshold_val = threshold_multiotsu(img_in)
     else:  # default to "otsu"
-        threshold_val = threshold_otsu(img_in)
+        threshold_val = histogram_threshold(img_in, "otsu")
 
     threshold = threshold_val * thresh_factor
 
@@ -511,7 +675,9 @@ def apply_log_li_threshold(
 
 
 # NOTE this is identical to veselnessSliceBySlice from aicssegmentation.core.vessel
-def vesselness_slice_by_slice(nd_array: np.ndarray, sigma: float, cutoff: float = -1, tau: float = 0.75):
+def vesselness_slice_by_slice(
+    nd_array: np.ndarray, sigma: float, cutoff: float = -1, tau: float = 0.75, max_workers: Union[int, None] = None
+):
     """
     wrapper for applying multi-scale 2D filament filter on 3D images in a
     slice by slice fashion,  Note that it only performs at a single scale....     NOTE: The paramater
@@ -530,6 +696,8 @@ def vesselness_slice_by_slice(nd_array: np.ndarray, sigma: float, cutoff: float
         parameter that controls response uniformity. The value has to be
         between 0.5 and 1. Lower tau means more intense output response.
         Default is 0.5
+    max_workers:
+        number of threads filtering slices in parallel, default is the package setting (see map_slices)
     """
 
     # # this hack is to accomodate the workflow widgets
@@ -537,11 +705,9 @@ def vesselness_slice_by_slice(nd_array: np.ndarray, sigma: float, cutoff: float
     #     sigmas = [sigmas]
 
     mip = np.amax(nd_array, axis=0)
-    response = np.zeros(nd_array.shape)
-    for zz in range(nd_array.shape[0]):
-        tmp = np.concatenate((nd_array[zz, :, :], mip), axis=1)
-        tmp = vesselness2D(tmp, sigmas=[sigma], tau=tau, whiteonblack=True)
-        response[zz, :, : nd_array.shape[2] - 3] = tmp[:, : nd_array.shape[2] - 3]
+    response = map_slices(
+        _vesselness_slice, nd_array, mip, sigma=sigma, tau=tau, dtype=get_float_dtype(), max_workers=max_workers
+    )
 
     if cutoff < 0:
         return response
@@ -590,7 +756,12 @@ def select_z_from_raw(img_in: np.ndarray, z_slice: Union[int, Tuple[int]]) -> np
 
 ### USED ###
 def scale_and_smooth(
-    img_in: np.ndarray, median_size: int = 1, gauss_sigma: float = 1.34, slice_by_slice: bool = True
+    img_in: np.ndarray,
+    median_size: int = 1,
+    gauss_sigma: float = 1.34,
+    slice_by_slice: bool = True,
+    scale: Union[Tuple[float, ...], None] = None,
+    max_workers: Union[int, None] = None,
 ) -> np.ndarray:
     """
     helper to perform min-max scaling, and median+gaussian smoothign all at once
@@ -603,7 +774,13 @@ def scale_and_smooth(
     gauss_sigma: float
         sigma for gaussian smoothing of  signal
     slice_by_slice:
-        NOT IMPLIMENTED.  toggles whether to do 3D operations or slice by slice in Z
+        toggles whether to do 3D operations or slice by slice in Z, default is True (slice by slice)
+    scale:
+        physical pixel sizes (Z, Y, X) e.g. meta_dict['scale'], used in 3D so that the filters have the same
+        physical width along every axis (`median_size` and `gauss_sigma` are in X pixels).  Default None
+        assumes isotropic voxels
+    max_workers:
+        number of threads filtering slices in parallel, default is the package setting (see map_slices)
 
     Returns
     -------------
@@ -611,17 +788,90 @@ def scale_and_smooth(
 
     """
     img = min_max_intensity_normalization(img_in.copy())  # is this copy nescesa
+    return median_gaussian_smoothing(img, median_size, gauss_sigma, slice_by_slice, scale, max_workers, in_place=True)
+
+
+def median_gaussian_smoothing(
+    img: np.ndarray,
+    median_size: int,
+    gauss_sigma: float,
+    slice_by_slice: bool = True,
+    scale: Union[Tuple[float, ...], None] = None,
+    max_workers: Union[int, None] = None,
+    in_place: bool = False,
+) -> np.ndarray:
+    """
+    median (if `median_size` > 1) then gaussian smoothing, either slice by slice in Z or with single 3D filters
 
-    # TODO:  make non-slice-by-slice work
-    slice_by_slice = True
+    Parameters
+    ------------
+    img: np.ndarray
+        a 3d image
+    median_size: int
+        width of median filter, in X pixels
+    gauss_sigma: float
+        sigma for gaussian smoothing, in X pixels
+    slice_by_slice:
+        toggles whether to do 3D operations or slice by slice in Z
+    scale:
+        physical pixel sizes (Z, Y, X) scaling the 3D filters per axis, see get_anisotropic_sizes()
+    max_workers:
+        number of threads filtering slices in parallel, default is the package setting (see map_slices)
+    in_place:
+        allow the result to be written into `img`
+
+    Returns
+    -------------
+        np.ndimage
+
+    """
     if slice_by_slice:
         if median_size > 1:
-            img = median_filter_slice_by_slice(img, size=median_size)
-        img = image_smoothing_gaussian_slice_by_slice(img, sigma=gauss_sigma)
-    else:
-        print(" PLEASE CHOOOSE 'slice-by-slice', 3D is not yet implimented")
+            img = median_filter_slice_by_slice(img, size=median_size, max_workers=max_workers)
+            in_place = True
+        # same as aicssegmentation's image_smoothing_gaussian_slice_by_slice
+        return map_slices(
+            gaussian_filter,
+            img,
+            out=img if in_place else None,
+            sigma=gauss_sigma,
+            mode="nearest",
+            truncate=3.0,
+            max_workers=max_workers,
+        )
+
+    if median_size > 1:
+        sizes = [max(1, int(round(size))) for size in get_anisotropic_sizes(median_size, scale, img.ndim)]
+        img = median_filter(img, size=sizes)
+        in_place = True
+    sigmas = get_anisotropic_sizes(gauss_sigma, scale, img.ndim)
+    return gaussian_filter(img, sigma=sigmas, mode="nearest", truncate=3.0, output=img if in_place else None)
+
+
+def get_anisotropic_sizes(
+    size: float, scale: Union[Tuple[float, ...], None], ndim: int = 3
+) -> Tuple[float, ...]:
+    """
+    per axis filter size (in pixels) with the same physical width along every axis as `size` X pixels
+
+    Parameters
+    ------------
+    size:
+        filter size (e.g. gaussian sigma or median width) in X pixels
+    scale:
+        physical pixel sizes, one per axis with X last (e.g. meta_dict['scale']).  None, or sizes that don't
+        match `ndim` or aren't positive, are treated as isotropic
+    ndim:
+        number of image dimensions
 
-    return img
+    Returns
+    -------------
+        tuple of `ndim` sizes
+
+    """
+    if scale is None or len(scale) != ndim or min(scale) <= 0:
+        return (float(size),) * ndim
+    return tuple([float(size) * scale[-1] / s for s in scale])
 
 
 # DEPRICATED
@@ -766,11 +1016,12 @@ def get_max_label(
 
     """
     if target_labels is None:
-        all_labels = np.unique(labels_in)[1:]
+        # label_index returns int64, keep returning a label of the labels' dtype
+        all_labels = label_index(labels_in).astype(labels_in.dtype, copy=False)
     else:
         all_labels = np.unique(target_labels)[1:]
 
-    total_signal = [raw_signal[labels_in == label].sum() for label in all_labels]
+    total_signal = label_sum(raw_signal, labels_in, all_labels)
     # combine NU and "labels" to make a CELLMASK
     keep_label = all_labels[np.argmax(total_signal)]
 
@@ -778,9 +1029,16 @@ def get_max_label(
 
 ### USED ###
 def fill_and_filter_linear_size(
-    img: np.ndarray, hole_min: int, hole_max: int, min_size: int, method: str = "slice_by_slice", connectivity: int = 1
+    img: np.ndarray,
+    hole_min: int,
+    hole_max: int,
+    min_size: int,
+    method: str = "slice_by_slice",
+    connectivity: int = 1,
+    max_workers: Union[int, None] = None,
 ) -> np.ndarray:
-    """wraper to aiscsegmentation `hole_filling` and `size_filter` with size argument in linear units
+    """hole filling and size filtering (same result as aiscsegmentation `hole_filling` then `size_filter`) with size
+    arguments in linear units.  Both are done in one pass: the background and the foreground are each labeled once
 
     Parameters
     ------------
@@ -796,6 +1054,9 @@ def fill_and_filter_linear_size(
         either "3D" or "slice_by_slice", default is "slice_by_slice"
     connnectivity: int
         the connectivity to use when computing object size
+    max_workers:
+        number of threads filtering slices in parallel with method "slice_by_slice", default is the package
+        setting (see map_slices)
     Returns
     -------------
         a binary image after hole filling and filtering small objects; np.ndarray
@@ -804,19 +1065,29 @@ def fill_and_filter_linear_size(
         return img
 
     if method == "3D":
-        if hole_max > 0:
-            img = hole_filling(img, hole_min=hole_min**3, hole_max=hole_max**3, fill_2d=False)
-        return size_filter(img, min_size=min_size**3, method="3D", connectivity=connectivity)
+        return _fill_and_filter(img, hole_min**3, hole_max**3, min_size**3, connectivity)
     elif method == "slice_by_slice":
-        if hole_max > 0:
-            img = hole_filling(img, hole_min=hole_min**2, hole_max=hole_max**2, fill_2d=True)
-        return size_filter(img, min_size=min_size**2, method="slice_by_slice", connectivity=connectivity)
+        # hole filling and size filtering are both 2D: run them together on each slice
+        return map_slices(
+            _fill_and_filter_slice,
+            img,
+            hole_min**2,
+            hole_max**2,
+            min_size**2,
+            connectivity,
+            dtype=bool,
+            max_workers=max_workers,
+        )
     else:
         print(f"undefined method: {method}")
 
 
 def size_filter_linear_size(
-    img: np.ndarray, min_size: int, method: str = "slice_by_slice", connectivity: int = 1
+    img: np.ndarray,
+    min_size: int,
+    method: str = "slice_by_slice",
+    connectivity: int = 1,
+    max_workers: Union[int, None] = None,
 ) -> np.ndarray:
     """size filter wraper to aiscsegmentation `size_filter` with size argument in linear units
 
@@ -830,6 +1101,9 @@ def size_filter_linear_size(
         either "3D" or "slice_by_slice", default is "slice_by_slice"
     connnectivity: int
         the connectivity to use when computing object size
+    max_workers:
+        number of threads filtering slices in parallel with method "slice_by_slice", default is the package
+        setting (see map_slices)
     Returns
     -------------
         np.ndarray
@@ -841,7 +1115,9 @@ def size_filter_linear_size(
     if method == "3D":
         return size_filter(img, min_size=min_size**3, method="3D", connectivity=connectivity)
     elif method == "slice_by_slice":
-        return size_filter(img, min_size=min_size**2, method="slice_by_slice", connectivity=connectivity)
+        return map_slices(
+            _size_filter_slice, img, min_size**2, connectivity, dtype=bool, max_workers=max_workers
+        )
     else:
         raise NotImplementedError(f"unsupported method {method}")
 
@@ -868,7 +1144,7 @@ def hole_filling_linear_size(img: np.ndarray, hole_min: int, hole_max: int, fill
         return hole_filling(img, hole_min=hole_min**3, hole_max=hole_max**3, fill_2d=False)
 
 ### USED ###
-def apply_mask(img_in: np.ndarray, mask: np.ndarray) -> np.ndarray:
+def apply_mask(img_in: np.ndarray, mask: np.ndarray, out: Union[np.ndarray, None] = None) -> np.ndarray:
     """mask the image
 
     Parameters
@@ -877,15 +1153,24 @@ def apply_mask(img_in: np.ndarray, mask: np.ndarray) -> np.ndarray:
         the image to filter on
     mask:
         the mask to apply
+    out:
+        optional array (same shape as img_in) the masked image is written to.  Pass img_in itself to mask it in
+        place.  By default a new array is returned
 
     Returns
     -----------
     img_out:
-        a new (copied) array with mask applied
+        a new (copied) array with mask applied, or `out`
     """
     assert img_in.shape == mask.shape
 
-    img_out = img_in.copy()
+    if out is None:
+        img_out = img_in.copy()
+    else:
+        img_out = out
+        if img_out is not img_in:
+            np.copyto(img_out, img_in)
+
     if mask.dtype == "bool":
         img_out[~mask] = 0
     else:
@@ -894,6 +1179,29 @@ def apply_mask(img_in: np.ndarray, mask: np.ndarray) -> np.ndarray:
     return img_out
 
 
+def masked_sum(img_in: np.ndarray, mask: np.ndarray, axis: Union[int, Tuple[int, ...], None] = None) -> np.ndarray:
+    """sum of the image under the mask (e.g. a masked projection), without building a masked copy of the image.
+    Same result as `apply_mask(img_in, mask).sum(axis=axis)`
+
+    Parameters
+    ------------
+    img_in:
+        the image to sum
+    mask:
+        the mask to apply
+    axis:
+        axis or axes to sum along (default: all)
+
+    Returns
+    -----------
+        np.ndarray (or scalar) of the masked sums
+    """
+    assert img_in.shape == mask.shape
+
+    inside = mask if mask.dtype == "bool" else mask >= 1
+    return np.sum(img_in, axis=axis, where=inside)
+
+
 def enhance_speckles(image: np.ndarray, radius: int, volumetric: bool = False) -> np.ndarray:
     """enhance "spreckles" small dots
 
@@ -964,7 +1272,8 @@ def filament_filter_3(in_img: np.ndarray,
                        filament_cutoff_2: float,
                        filament_scale_3: float, 
                        filament_cutoff_3: float,
-                       method: str
+                       method: str,
+                       max_workers: Union[int, None] = None,
                        ) -> np.ndarray:
     """filament filter helper function for 3 levels (scale+cut). filter pairs are run if scale is > 0.
 
@@ -986,6 +1295,9 @@ def filament_filter_3(in_img: np.ndarray,
         cutoff for thresholding float
     method:
         either "3D" or "slice_by_slice", default is "slice_by_slice"
+    max_workers:
+        number of threads filtering slices in parallel with method "slice_by_slice", default is the package
+        setting (see map_slices)
 
     Returns
     -----------
@@ -997,14 +1309,69 @@ def filament_filter_3(in_img: np.ndarray,
     cuts = [filament_cutoff_1, filament_cutoff_2, filament_cutoff_3]
     f_param = [[sc, ct] for sc, ct in zip(scales, cuts) if sc > 0]
 
+    cache = get_response_cache()
+    digest = cache.digest(in_img) if cache.enabled else None
+    seg = np.zeros(in_img.shape, dtype=bool)
+    for sc, ct in f_param:
+        seg |= filament_response(in_img, sc, method, max_workers, digest=digest) > ct
+    return seg
+
+
+def filament_response(
+    in_img: np.ndarray,
+    filament_scale: float,
+    method: str = "slice_by_slice",
+    max_workers: Union[int, None] = None,
+    digest: Union[str, None] = None,
+) -> np.ndarray:
+    """vesselness response of the filament filter at one scale, before the cutoff is applied (see filament_filter_3).
+    When the package's response cache is enabled (see infer_subc.core.response_cache, e.g. during sweep_infer),
+    responses are kept in it, so thresholding the same image at other cutoffs does not filter it again.
+
+    Parameters
+    ------------
+    in_img:
+        the image to filter on np.ndarray
+    filament_scale:
+        scale or size of the "filter" float
+    method:
+        either "3D" or "slice_by_slice", default is "slice_by_slice"
+    max_workers:
+        number of threads filtering slices in parallel with method "slice_by_slice", default is the package
+        setting (see map_slices)
+    digest:
+        digest of in_img (see ResponseCache.digest) when it is already known
+
+    Returns
+    -----------
+    result:
+        np.ndarray response, read-only when it comes from the cache
+
+    """
     if method == "3D":
-        seg = filament_3d_wrapper(in_img, f_param)
+        if in_img.ndim != 3:
+            raise ValueError("image has to be 3D")
+
+        def compute():
+            eigenvalues = absolute_3d_hessian_eigenvalues(in_img, sigma=filament_scale, scale=True, whiteonblack=True)
+            return compute_vesselness3D(eigenvalues[1], eigenvalues[2], tau=1)
+
+    elif method == "slice_by_slice" and in_img.ndim == 3:
+
+        def compute():
+            mip = np.amax(in_img, axis=0)
+            return map_slices(_filament_response_slice, in_img, mip, filament_scale, max_workers=max_workers)
+
     elif method == "slice_by_slice":
-        seg = filament_2d_wrapper(in_img, f_param)
+
+        def compute():
+            eigenvalues = absolute_3d_hessian_eigenvalues(in_img, sigma=filament_scale, scale=True, whiteonblack=True)
+            return compute_vesselness2D(eigenvalues[1], tau=1)
+
     else:
-        print(f"undefined method: {method}")
+        raise ValueError(f"undefined method: {method}")
 
-    return seg
+    return get_response_cache().get_or_compute(in_img, ("filament", method, filament_scale), compute, digest)
 
 
 def filament_filter(in_img: np.ndarray, filament_scale: float, filament_cut: float) -> np.ndarray:
@@ -1079,7 +1446,8 @@ def dot_filter_3(
     dot_cutoff_2: float,
     dot_scale_3: float,
     dot_cutoff_3: float,
-    method: str = "slice_by_slice"
+    method: str = "slice_by_slice",
+    max_workers: Union[int, None] = None,
 ) -> np.ndarray:
     """spot filter helper function for 3 levels (scale+cut). filter pairs are run if scale is > 0.
 
@@ -1101,6 +1469,9 @@ def dot_filter_3(
         cutoff for thresholding float
     method:
         either "3D" or "slice_by_slice", default is "slice_by_slice"
+    max_workers:
+        number of threads filtering slices in parallel with method "slice_by_slice", default is the package
+        setting (see map_slices)
 
     Returns
     -------------
@@ -1111,14 +1482,59 @@ def dot_filter_3(
     cuts = [dot_cutoff_1, dot_cutoff_2, dot_cutoff_3]
     s_param = [[sc, ct] for sc, ct in zip(scales, cuts) if sc > 0]
 
+    cache = get_response_cache()
+    digest = cache.digest(in_img) if cache.enabled else None
+    seg = np.zeros(in_img.shape, dtype=bool)
+    for sc, ct in s_param:
+        seg |= dot_response(in_img, sc, method, max_workers, digest=digest) > ct
+    return seg
+
+
+def dot_response(
+    in_img: np.ndarray,
+    dot_scale: float,
+    method: str = "slice_by_slice",
+    max_workers: Union[int, None] = None,
+    digest: Union[str, None] = None,
+) -> np.ndarray:
+    """scale-normalized LoG response of the spot filter at one scale, before the cutoff is applied (see dot_filter_3).
+    When the package's response cache is enabled (see infer_subc.core.response_cache, e.g. during sweep_infer),
+    responses are kept in it, so thresholding the same image at other cutoffs does not filter it again.
+
+    Parameters
+    ------------
+    in_img:
+        a 3d  np.ndarray image of the inferred organelle
+    dot_scale:
+        scale or size of the "filter" float
+    method:
+        either "3D" or "slice_by_slice", default is "slice_by_slice"
+    max_workers:
+        number of threads filtering slices in parallel with method "slice_by_slice", default is the package
+        setting (see map_slices)
+    digest:
+        digest of in_img (see ResponseCache.digest) when it is already known
+
+    Returns
+    -------------
+        np.ndarray response, read-only when it comes from the cache
+
+    """
     if method == "3D":
-        seg = dot_3d_wrapper(in_img, s_param)
+
+        def compute():
+            return -1 * (dot_scale**2) * gaussian_laplace(in_img, dot_scale)
+
     elif method == "slice_by_slice":
-        seg = dot_2d_slice_by_slice_wrapper(in_img, s_param)
+
+        def compute():
+            return map_slices(_dot_response_slice, in_img, dot_scale, max_workers=max_workers)
+
     else:
-        print(f"undefined method: {method}")
+        raise ValueError(f"undefined method: {method}")
+
+    return get_response_cache().get_or_compute(in_img, ("dot", method, dot_scale), compute, digest)
 
-    return seg
 
 # centrosome routines
 
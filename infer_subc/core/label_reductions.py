@@ -0,0 +1,231 @@
+from typing import Dict, List, Tuple, Union
+import numpy as np
+
+from scipy.ndimage import find_objects
+
+# Per-label reductions of an image over a label image, computed in a single pass over the voxels with
+#   np.bincount (or an unbuffered ufunc for the maximum) instead of one full-volume `labels == label`
+#   comparison per label.  Every function takes an optional `index` listing the labels to report, in that
+#   order (default: all the labels present in `labels`, in increasing order, background 0 excluded).
+#   Labels of `index` absent from `labels` get a count and sum of 0, and a mean and max of 0.
+
+
+def _flat_labels(labels: np.ndarray) -> np.ndarray:
+    """
+    labels as a flat array np.bincount accepts (bool and unsigned labels are cast to intp)
+    """
+    labels = np.asarray(labels)
+    if labels.dtype.kind not in "biu":
+        raise ValueError(f"labels must be an integer or bool image, not {labels.dtype}")
+    flat = labels.ravel()
+    if flat.dtype.kind != "i":
+        flat = flat.astype(np.intp)
+    return flat
+
+
+def _counts(flat_labels: np.ndarray, index: Union[np.ndarray, None], weights: Union[np.ndarray, None] = None):
+    minlength = int(np.max(index)) + 1 if index is not None and len(index) > 0 else 0
+    return np.bincount(flat_labels, weights=weights, minlength=minlength)
+
+
+def _index_from_counts(counts: np.ndarray) -> np.ndarray:
+    index = np.flatnonzero(counts)
+    return index[index > 0]
+
+
+def label_index(labels: np.ndarray) -> np.ndarray:
+    """
+    labels present in a label image, without the background (same as `np.unique(labels)[1:]` when there is
+    background, but without sorting the image)
+
+    Parameters
+    ------------
+    labels:
+        label image
+
+    Returns
+    -------------
+        np.ndarray of the label values, in increasing order
+    """
+    return _index_from_counts(_counts(_flat_labels(labels), None))
+
+
+def label_count(labels: np.ndarray, index: Union[List[int], np.ndarray, None] = None) -> np.ndarray:
+    """
+    number of voxels of each label
+
+    Parameters
+    ------------
+    labels:
+        label image
+    index:
+        labels to count (default: all labels but 0)
+
+    Returns
+    -------------
+        np.ndarray of the voxel counts, in the order of `index`
+    """
+    return label_statistics(None, labels, index, ("count",))["count"]
+
+
+def label_sum(
+    image: np.ndarray, labels: np.ndarray, index: Union[List[int], np.ndarray, None] = None
+) -> np.ndarray:
+    """
+    total intensity of each label (accumulated in float64)
+
+    Parameters
+    ------------
+    image:
+        intensity image, same shape as labels
+    labels:
+        label image
+    index:
+        labels to sum over (default: all labels but 0)
+
+    Returns
+    -------------
+        np.ndarray of the sums, in the order of `index`
+    """
+    return label_statistics(image, labels, index, ("sum",))["sum"]
+
+
+def label_mean(
+    image: np.ndarray, labels: np.ndarray, index: Union[List[int], np.ndarray, None] = None
+) -> np.ndarray:
+    """
+    mean intensity of each label
+
+    Parameters
+    ------------
+    image:
+        intensity image, same shape as labels
+    labels:
+        label image
+    index:
+        labels to average over (default: all labels but 0)
+
+    Returns
+    -------------
+        np.ndarray of the means, in the order of `index`
+    """
+    return label_statistics(image, labels, index, ("mean",))["mean"]
+
+
+def label_max(
+    image: np.ndarray, labels: np.ndarray, index: Union[List[int], np.ndarray, None] = None
+) -> np.ndarray:
+    """
+    maximum intensity of each label
+
+    Parameters
+    ------------
+    image:
+        intensity image, same shape as labels
+    labels:
+        label image
+    index:
+        labels to reduce (default: all labels but 0)
+
+    Returns
+    -------------
+        np.ndarray of the maxima (dtype of `image`), in the order of `index`
+    """
+    return label_statistics(image, labels, index, ("max",))["max"]
+
+
+def label_bbox(
+    labels: np.ndarray, index: Union[List[int], np.ndarray, None] = None
+) -> List[Union[Tuple[slice, ...], None]]:
+    """
+    bounding box of each label, as the tuple of slices cropping it out of the image (scipy.ndimage.find_objects)
+
+    Parameters
+    ------------
+    labels:
+        label image
+    index:
+        labels to locate (default: all labels but 0)
+
+    Returns
+    -------------
+        list of tuples of slices (None for the labels of `index` absent from `labels`), in the order of `index`
+    """
+    labels = np.asarray(labels)
+    if index is None:
+        index = label_index(labels)
+    objects = list()
+    if labels.size > 0:  # find_objects fails on empty images
+        objects = find_objects(labels.astype(np.intp, copy=False) if labels.dtype.kind != "i" else labels)
+    return [objects[i - 1] if 0 < i <= len(objects) else None for i in np.asarray(index, dtype=np.intp)]
+
+
+def label_statistics(
+    image: Union[np.ndarray, None],
+    labels: np.ndarray,
+    index: Union[List[int], np.ndarray, None] = None,
+    statistics: Tuple[str, ...] = ("count", "sum", "mean", "max"),
+) -> Dict[str, np.ndarray]:
+    """
+    compute several per-label reductions together, reading the label image only once
+
+    Parameters
+    ------------
+    image:
+        intensity image, same shape as labels (may be None if only "count" is asked for)
+    labels:
+        label image
+    index:
+        labels to reduce (default: all labels but 0)
+    statistics:
+        reductions to compute, among "count", "sum", "mean" and "max"
+
+    Returns
+    -------------
+        dict of np.ndarray by statistic name, each in the order of `index`
+    """
+    unknown = set(statistics) - {"count", "sum", "mean", "max"}
+    if len(unknown) > 0:
+        raise ValueError(f"unknown label statistics: {sorted(unknown)}")
+
+    flat_labels = _flat_labels(labels)
+    if index is not None:
+        index = np.asarray(index, dtype=np.intp).ravel()
+    if image is not None:
+        image = np.asarray(image)
+        if image.shape != np.shape(labels):
+            raise ValueError(f"image shape {image.shape} does not match labels shape {np.shape(labels)}")
+    elif set(statistics) != {"count"}:
+        raise ValueError("an image is needed for intensity statistics")
+
+    # voxel counts are needed for the default index, the means and to tell absent labels from the others
+    counts = None
+    if index is None or set(statistics) & {"count", "mean", "max"}:
+        counts = _counts(flat_labels, index)
+    if index is None:
+        index = _index_from_counts(counts)
+
+    results = dict()
+    if "count" in statistics:
+        results["count"] = counts[index]
+    if "sum" in statistics or "mean" in statistics:
+        sums = _counts(flat_labels, index, weights=image.ravel())[index]
+        if "sum" in statistics:
+            results["sum"] = sums
+        if "mean" in statistics:
+            results["mean"] = sums / np.maximum(counts[index], 1)
+    if "max" in statistics:
+        if image.dtype.kind == "b":
+            image = image.view(np.uint8)
+        maxima = np.full(counts.shape, _lowest(image.dtype), dtype=image.dtype)
+        np.maximum.at(maxima, flat_labels, image.ravel())
+        maxima = maxima[index]
+        maxima[counts[index] == 0] = 0
+        results["max"] = maxima
+    return results
+
+
+def _lowest(dtype: np.dtype):
+    if dtype.kind == "f":
+        return -np.inf
+    return np.iinfo(dtype).min
@@ -0,0 +1,194 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, Tuple, Union
+import hashlib
+import threading
+import numpy as np
+
+# In-memory cache of filter responses (e.g. the LoG response of dot_filter_3 or the vesselness response of
+#   filament_filter_3 at one scale).  Thresholding a response is cheap compared to computing it, so when the
+#   same image is filtered again with other cutoffs, or with only one of its scales changed (parameter sweeps,
+#   re-running a widget), the responses already computed are reused.
+#   Responses are keyed on a digest of the image content, so a new array with the same pixels hits the cache
+#   and an array modified in place does not.  They are kept read-only, and the least recently used ones are
+#   dropped once the cache holds more than `max_bytes`.
+#   The package's cache is off by default: hashing every filtered image and holding its responses only pays
+#   off when the same image is filtered repeatedly.  sweep_infer enables it for the duration of a sweep (see
+#   response_cache_enabled), interactive tools can enable it with set_response_cache_max_bytes.
+
+DEFAULT_RESPONSE_CACHE_MAX_BYTES = 2**30  # 1GB, size of the cache when it is enabled
+
+
+class ResponseCache:
+    """
+    Bounded, thread-safe, least-recently-used cache of filter responses, by (image digest, response key)
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_RESPONSE_CACHE_MAX_BYTES):
+        self._lock = threading.Lock()
+        self._responses: "OrderedDict[Tuple[str, Hashable], np.ndarray]" = OrderedDict()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self.max_bytes = max_bytes
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, max_bytes: int):
+        if max_bytes is None or max_bytes < 0:
+            raise ValueError("max_bytes must be 0 (no caching) or more")
+        with self._lock:
+            self._max_bytes = max_bytes
+            self._evict()
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_bytes > 0
+
+    @property
+    def nbytes(self) -> int:
+        """
+        size of the cached responses
+        """
+        return self._nbytes
+
+    def info(self) -> Dict[str, int]:
+        """
+        cache statistics: number of hits and misses, number and total size of the cached responses
+        """
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "responses": len(self._responses),
+                "nbytes": self._nbytes,
+                "max_bytes": self._max_bytes,
+            }
+
+    def clear(self):
+        """
+        drop every cached response (the statistics are reset too)
+        """
+        with self._lock:
+            self._responses.clear()
+            self._nbytes = 0
+            self._hits = 0
+            self._misses = 0
+
+    @staticmethod
+    def digest(image: np.ndarray) -> str:
+        """
+        digest of an image's content (dtype, shape and pixel values)
+        """
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(f"{image.dtype.str}{image.shape}".encode())
+        hasher.update(np.ascontiguousarray(image).reshape(-1).view(np.uint8))
+        return hasher.hexdigest()
+
+    def get_or_compute(
+        self,
+        image: np.ndarray,
+        key: Hashable,
+        compute: Callable[[], np.ndarray],
+        digest: Union[str, None] = None,
+    ) -> np.ndarray:
+        """
+        cached response `key` of `image`, computed (and cached) with `compute()` if it is not cached yet
+
+        Parameters
+        ------------
+        image:
+            filtered image
+        key:
+            hashable description of the response (filter, parameters...), e.g. ("dot", "3D", 1.5)
+        compute:
+            function computing the response of `image`
+        digest:
+            digest of `image` if it is already known (see digest()), to avoid hashing the image again when
+            several responses of the same image are looked up
+
+        Returns
+        -------------
+            read-only np.ndarray response
+        """
+        if not self.enabled:
+            return compute()
+
+        full_key = (digest if digest is not None else self.digest(image), key)
+        with self._lock:
+            response = self._responses.get(full_key)
+            if response is not None:
+                self._responses.move_to_end(full_key)
+                self._hits += 1
+                return response
+            self._misses += 1
+
+        # computed outside of the lock, so other threads can use the cache in the meantime
+        response = compute()
+        response.setflags(write=False)
+        with self._lock:
+            if response.nbytes <= self._max_bytes and full_key not in self._responses:
+                self._responses[full_key] = response
+                self._nbytes += response.nbytes
+                self._evict()
+        return response
+
+    def _evict(self):
+        while self._nbytes > self._max_bytes and len(self._responses) > 0:
+            _, response = self._responses.popitem(last=False)
+            self._nbytes -= response.nbytes
+
+
+_response_cache = ResponseCache(max_bytes=0)
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    the package's filter response cache, used by dot_filter_3 and filament_filter_3
+    """
+    return _response_cache
+
+
+def set_response_cache_max_bytes(max_bytes: int):
+    """
+    set the size of the package's filter response cache
+
+    Parameters
+    ------------
+    max_bytes:
+        maximum total size of the cached responses, 0 (the default) disables the cache
+    """
+    _response_cache.max_bytes = max_bytes
+
+
+@contextmanager
+def response_cache_enabled(max_bytes: int = DEFAULT_RESPONSE_CACHE_MAX_BYTES):
+    """
+    enable the package's filter response cache within a `with` block, e.g. while the same image is filtered
+    with many parameters.  A cache already larger than `max_bytes` is left as it is.  The previous size is
+    restored at the end of the block, which releases the responses cached if the cache was off
+
+    Parameters
+    ------------
+    max_bytes:
+        maximum total size of the cached responses within the block (default: 1GB)
+    """
+    previous_max_bytes = _response_cache.max_bytes
+    if max_bytes > previous_max_bytes:
+        _response_cache.max_bytes = max_bytes
+    try:
+        yield _response_cache
+    finally:
+        _response_cache.max_bytes = previous_max_bytes
+        if previous_max_bytes == 0:
+            _response_cache.clear()
+
+
+def clear_response_cache():
+    """
+    drop every response of the package's filter response cache, e.g. to release its memory
+    """
+    _response_cache.clear()
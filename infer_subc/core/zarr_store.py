@@ -0,0 +1,249 @@
+import numpy as np
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union
+
+from infer_subc import get_module_version
+
+try:  # optional dependency (pip install infer-subc[zarr]): segmentations are otherwise only written as tiff files
+    import zarr
+    from numcodecs import Blosc
+
+    if int(zarr.__version__.split(".")[0]) >= 3:  # the v2 API used below (create_dataset, .zarray) is gone in zarr 3
+        zarr = None
+except ImportError:
+    zarr = None
+    Blosc = None
+
+# Segmentations (organelles, masks and intermediates) kept in a Zarr directory store instead of one tiff file
+#   per image and organelle.  The store has one group per raw image (named after the raw file stem) holding
+#   one array per organelle or mask:
+#       <store>.zarr/<raw image stem>/<name>
+#   Arrays are chunked by plane (and by DEFAULT_CHUNK_YX tiles in YX) and compressed, so a single plane or
+#   region can be read without decoding the whole segmentation, and different arrays can be written in
+#   parallel (e.g. by the processes of a BatchWorkflow).  Each array carries its voxel `scale` (ZYX) and
+#   a `provenance` dictionary (infer_subc version, creation time, source file...) in its attributes.
+#   Stores are written in the Zarr v2 format with the zarr-python 2 API (zarr >=2.11, <3, see the `zarr` extra).
+
+ZARR_EXTENSION = ".zarr"
+DEFAULT_CHUNK_YX = (512, 512)
+
+
+def is_zarr_available() -> bool:
+    """
+    True if the optional zarr dependency is installed
+    """
+    return zarr is not None
+
+
+def is_zarr_path(path: Union[Path, str, None]) -> bool:
+    """
+    True if `path` is a Zarr store, group or array (a `.zarr` path, or a directory with Zarr metadata)
+
+    Parameters
+    ------------
+    path:
+        path to test
+
+    Returns
+    -------------
+        bool
+    """
+    if path is None:
+        return False
+    path = Path(path)
+    if path.suffix == ZARR_EXTENSION:
+        return True
+    return (path / ".zgroup").exists() or (path / ".zarray").exists()
+
+
+def read_zarr_array(path: Union[Path, str]) -> np.ndarray:
+    """
+    read a whole Zarr array, e.g. the path of a segmentation in a SegmentationStore
+
+    Parameters
+    ------------
+    path:
+        directory of the Zarr array
+
+    Returns
+    -------------
+        np.ndarray
+    """
+    _check_zarr()
+    return zarr.open_array(str(path), mode="r")[...]
+
+
+class SegmentationStore:
+    """
+    Zarr directory store of segmentations, with one group per raw image and one array per organelle or mask.
+    The store is opened for every access, so a SegmentationStore can be sent to other processes, and several
+    processes can write to the same store as long as they write different arrays.
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, str],
+        mode: str = "a",
+        chunk_yx: Tuple[int, int] = DEFAULT_CHUNK_YX,
+        compressor: Any = None,
+    ):
+        """
+        Parameters
+        ------------
+        path:
+            directory of the store (conventionally with a `.zarr` extension).  Created unless `mode` is "r"
+        mode:
+            "r" (read only) or "a" (read and write)
+        chunk_yx:
+            YX size of the chunks the arrays are written with (every plane is chunked separately)
+        compressor:
+            numcodecs compressor of the arrays written, default is blosc zstd with bit shuffling
+        """
+        _check_zarr()
+        if path is None:
+            raise ValueError("path cannot be None")
+        if mode not in ("r", "a"):
+            raise ValueError(f"mode must be 'r' or 'a', not {mode}")
+
+        self._path = Path(path)
+        self._mode = mode
+        self._chunk_yx = tuple(chunk_yx)
+        self._compressor = compressor
+        if mode == "r":
+            if not self._path.exists():
+                raise FileNotFoundError(f"no segmentation store at {self._path}")
+        else:
+            zarr.open_group(str(self._path), mode="a")
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def images(self) -> List[str]:
+        """
+        names of the raw images with segmentations in the store
+        """
+        return sorted(self._open().group_keys())
+
+    def names(self, image_name: str) -> List[str]:
+        """
+        names of the segmentations of a raw image
+        """
+        root = self._open()
+        if image_name not in root:
+            return list()
+        return sorted(root[image_name].array_keys())
+
+    def contains(self, image_name: str, name: str) -> bool:
+        return self.array_path(image_name, name).joinpath(".zarray").exists()
+
+    def array_path(self, image_name: str, name: str) -> Path:
+        """
+        directory of the array of segmentation `name` of a raw image (whether it exists or not)
+        """
+        return self._path / image_name / name
+
+    def write(
+        self,
+        image_name: str,
+        name: str,
+        data: np.ndarray,
+        scale: Union[Tuple[float, ...], None] = None,
+        provenance: Union[Dict[str, Any], None] = None,
+    ) -> Path:
+        """
+        write (or overwrite) a segmentation of a raw image
+
+        Parameters
+        ------------
+        image_name:
+            name of the raw image (e.g. the stem of its file name)
+        name:
+            name of the segmentation, e.g. "lyso" or "masks"
+        data:
+            segmentation
+        scale:
+            voxel size (e.g. ZYX), saved in the `scale` attribute
+        provenance:
+            extra information saved in the `provenance` attribute (with the infer_subc version and creation time)
+
+        Returns
+        -------------
+            Path of the array
+        """
+        if self._mode == "r":
+            raise ValueError(f"{self._path} is opened read only")
+
+        data = np.asarray(data)
+        group = self._open().require_group(image_name)
+        array = group.create_dataset(
+            name,
+            data=data,
+            chunks=self._get_chunks(data.shape),
+            compressor=self._compressor if self._compressor is not None else _default_compressor(),
+            overwrite=True,
+        )
+        array.attrs.update(
+            {
+                "scale": list(scale) if scale is not None else None,
+                "provenance": {
+                    "infer_subc_version": str(get_module_version()),
+                    "created": datetime.now().isoformat(timespec="seconds"),
+                    **(provenance or dict()),
+                },
+            }
+        )
+        return self.array_path(image_name, name)
+
+    def read(self, image_name: str, name: str, region: Any = Ellipsis) -> np.ndarray:
+        """
+        read a segmentation of a raw image, or a region of it (only the chunks covering the region are decoded)
+
+        Parameters
+        ------------
+        image_name:
+            name of the raw image
+        name:
+            name of the segmentation
+        region:
+            index or tuple of slices of the region to read, e.g. (slice(3, 5),) for planes 3 and 4.
+            Default: the whole array
+
+        Returns
+        -------------
+            np.ndarray
+        """
+        return self.get_array(image_name, name)[region]
+
+    def get_array(self, image_name: str, name: str):
+        """
+        the (lazy) zarr.Array of a segmentation
+        """
+        if not self.contains(image_name, name):
+            raise FileNotFoundError(f"`{name}` of {image_name} not found in {self._path}")
+        return zarr.open_array(str(self.array_path(image_name, name)), mode="r")
+
+    def attrs(self, image_name: str, name: str) -> Dict[str, Any]:
+        """
+        attributes (scale, provenance) of a segmentation
+        """
+        return self.get_array(image_name, name).attrs.asdict()
+
+    def _open(self):
+        return zarr.open_group(str(self._path), mode=self._mode)
+
+    def _get_chunks(self, shape: Tuple[int, ...]) -> Union[Tuple[int, ...], bool]:
+        if len(shape) < 2:
+            return True
+        yx = tuple(min(size, chunk) for size, chunk in zip(shape[-2:], self._chunk_yx))
+        return (1,) * (len(shape) - 2) + yx
+
+
+def _default_compressor():
+    return Blosc(cname="zstd", clevel=3, shuffle=Blosc.BITSHUFFLE)
+
+
+def _check_zarr():
+    if zarr is None:
+        raise ImportError("zarr 2 is needed for segmentation stores: pip install 'zarr>=2.11,<3' numcodecs")
@@ -1,6 +1,7 @@
 import numpy as np
-from typing import Tuple
+from typing import Dict, Tuple, Union
 
+from scipy.ndimage import laplace
 from aicssegmentation.core.pre_processing_utils import image_smoothing_gaussian_slice_by_slice
 
 
@@ -22,10 +23,22 @@ from infer_subc.core.img import (
     apply_log_li_threshold,
     choose_agg_signal_zmax,
     select_z_from_raw,
+    masked_sum,
 )
+from infer_subc.core.histogram_threshold import histogram_threshold
 
+# metrics of the streaming Z selection (see z_plane_metrics)
+Z_METRICS = ("signal", "laplacian", "brenner")
 
-def get_optimal_Z_image(img_data: np.ndarray, nuc_ch: int, ch_to_agg: Tuple[int]) -> np.ndarray:
+
+def get_optimal_Z_image(
+    img_data: np.ndarray,
+    nuc_ch: int,
+    ch_to_agg: Tuple[int],
+    method: str = "segment",
+    metric: str = "signal",
+    downsample: int = 1,
+) -> np.ndarray:
     """
     Procedure to infer _best_ Zslice from linearly unmixed input
 
@@ -37,14 +50,21 @@ def get_optimal_Z_image(img_data: np.ndarray, nuc_ch: int, ch_to_agg: Tuple[int]
         channel with nuclei signal
     ch_to_agg:
         tuple of channels to aggregate for selecting Z
+    method:
+        "segment" (default) or "stream", see find_optimal_Z
+    metric:
+        per-plane metric maximized by the "stream" method, see z_plane_metrics
+    downsample:
+        step of the XY grid the "stream" method reads the planes on
 
     Returns
     -------------
     image np.ndarray with single selected Z-slice   (Channels, 1, X, Y)
 
     """
-    optimal_Z = find_optimal_Z(img_data, nuc_ch, ch_to_agg)
-    return select_z_from_raw(img_data, optimal_Z)
+    optimal_Z = find_optimal_Z(img_data, nuc_ch, ch_to_agg, method=method, metric=metric, downsample=downsample)
+    # only the selected plane is read from a lazy (e.g. dask) image
+    return np.asarray(select_z_from_raw(img_data, optimal_Z))
 
 
 def fixed_get_optimal_Z_image(img_data: np.ndarray) -> np.ndarray:
@@ -64,7 +84,14 @@ def fixed_find_optimal_Z(img_data: np.ndarray) -> int:
     return find_optimal_Z(img_data, nuc_ch, ch_to_agg)
 
 
-def find_optimal_Z(raw_img: np.ndarray, nuc_ch: int, ch_to_agg: Tuple[int]) -> int:
+def find_optimal_Z(
+    raw_img: np.ndarray,
+    nuc_ch: int,
+    ch_to_agg: Tuple[int],
+    method: str = "segment",
+    metric: str = "signal",
+    downsample: int = 1,
+) -> int:
     """
     Procedure to infer _best_ Zslice  from linearly unmixed input.
 
@@ -79,11 +106,29 @@ def find_optimal_Z(raw_img: np.ndarray, nuc_ch: int, ch_to_agg: Tuple[int]) -> i
     ch_to_agg:
         tuple of channels to aggregate for selecting Z
 
+    method:
+        "segment" (default): segment the nuclei (normalization, median and gaussian smoothing and log-li
+        threshold of the whole stack) and pick the plane with the most aggregated signal outside of the nuclei.
+        "stream": pick the plane maximizing `metric`, computed one plane at a time from `raw_img` without
+        filtering the stack (see find_optimal_Z_streaming)
+
+    metric:
+        per-plane metric maximized by the "stream" method, see z_plane_metrics
+
+    downsample:
+        step of the XY grid the "stream" method reads the planes on
+
     Returns:
     -------------
     opt_z:
         the "0ptimal" z-slice which has the most signal intensity for downstream 2D segmentation
     """
+    if method == "stream":
+        optimal_Z = find_optimal_Z_streaming(raw_img, nuc_ch, ch_to_agg, metric=metric, downsample=downsample)
+        print(f"choosing _optimal_ z-slice::: {optimal_Z}")
+        return optimal_Z
+    if method != "segment":
+        raise ValueError(f"undefined method: {method}")
 
     # median filter in 2D / convert to float 0-1.   get rid of the "residual"
 
@@ -106,3 +151,131 @@ def find_optimal_Z(raw_img: np.ndarray, nuc_ch: int, ch_to_agg: Tuple[int]) -> i
     optimal_Z = choose_agg_signal_zmax(raw_img, ch_to_agg, mask=struct_obj)
     print(f"choosing _optimal_ z-slice::: {optimal_Z}")
     return optimal_Z
+
+
+def find_optimal_Z_streaming(
+    raw_img: np.ndarray, nuc_ch: int, ch_to_agg: Tuple[int], metric: str = "signal", downsample: int = 1
+) -> int:
+    """
+    Procedure to infer _best_ Zslice from linearly unmixed input, reading one plane at a time: the Z-slice
+    maximizing one of the per-plane metrics of z_plane_metrics.
+
+    Parameters
+    ------------
+    raw_img:
+        a ch,z,x,y - image containing florescent signal (or a lazy array, e.g. dask, which is then read plane
+        by plane)
+    nuc_ch:
+        channel with nuclei signal
+    ch_to_agg:
+        tuple of channels to aggregate for selecting Z
+    metric:
+        "signal" (default), "laplacian" or "brenner", see z_plane_metrics
+    downsample:
+        step of the XY grid the planes are read on
+
+    Returns:
+    -------------
+    opt_z:
+        index of the selected z-slice
+    """
+    if metric not in Z_METRICS:
+        raise ValueError(f"undefined metric: {metric}, use one of {Z_METRICS}")
+    metrics = z_plane_metrics(raw_img, nuc_ch, ch_to_agg, downsample=downsample, metrics=(metric,))
+    return int(metrics[metric].argmax())
+
+
+def z_plane_metrics(
+    raw_img: np.ndarray,
+    nuc_ch: Union[int, None],
+    ch_to_agg: Tuple[int],
+    downsample: int = 1,
+    metrics: Tuple[str, ...] = Z_METRICS,
+    thresh_factor: float = 0.9,
+    thresh_min: float = 0.1,
+    thresh_max: float = 1.0,
+) -> Dict[str, np.ndarray]:
+    """
+    signal and focus metrics of every Z-slice of the aggregated channels, computed one plane at a time.  Only a
+    plane of each channel is in memory at once, so `raw_img` may be a lazy array (dask, memory-mapped...).
+
+    The metrics are:
+        "signal": sum of the aggregated signal outside of the nuclei, like find_optimal_Z.  The nuclei are the
+        voxels of `nuc_ch` above a log-li threshold taken from the histogram of the raw channel (scaled by
+        `thresh_factor` and clipped to [`thresh_min`, `thresh_max`] of the channel's intensity range), instead
+        of a segmentation of the smoothed stack
+        "laplacian": variance of the laplacian of the aggregated plane
+        "brenner": Brenner gradient of the aggregated plane (sum of the squared differences between pixels two
+        apart, along Y and X)
+
+    Parameters
+    ------------
+    raw_img:
+        a ch,z,x,y - image containing florescent signal
+    nuc_ch:
+        channel with nuclei signal (None: the "signal" is not masked)
+    ch_to_agg:
+        tuple of channels to aggregate
+    downsample:
+        step of the XY grid the planes are read on (1: every pixel)
+    metrics:
+        metrics to compute
+    thresh_factor:
+        scaling of the nuclei threshold
+    thresh_min:
+        minimum of the nuclei threshold, as a fraction of the nuclei channel intensity range
+    thresh_max:
+        maximum of the nuclei threshold, as a fraction of the nuclei channel intensity range
+
+    Returns
+    -------------
+        dict of np.ndarray of the metric of each Z-slice, by metric name
+    """
+    unknown = set(metrics) - set(Z_METRICS)
+    if len(unknown) > 0:
+        raise ValueError(f"undefined metrics: {sorted(unknown)}, use {Z_METRICS}")
+    if downsample is None or downsample < 1:
+        raise ValueError("downsample must be at least 1")
+
+    n_z = raw_img.shape[1]
+
+    nuclei_threshold = None
+    if "signal" in metrics and nuc_ch is not None:
+        nuclei = raw_img[nuc_ch, :, ::downsample, ::downsample]
+        nuclei_threshold = _nuclei_threshold(nuclei, thresh_factor, thresh_min, thresh_max)
+
+    results = {name: np.zeros(n_z) for name in metrics}
+    for z in range(n_z):
+        plane = np.array(raw_img[ch_to_agg[0], z, ::downsample, ::downsample], dtype=np.double)
+        for ch in ch_to_agg[1:]:
+            plane += np.asarray(raw_img[ch, z, ::downsample, ::downsample])
+
+        if "signal" in metrics:
+            if nuclei_threshold is None:
+                results["signal"][z] = plane.sum()
+            else:
+                outside = np.asarray(raw_img[nuc_ch, z, ::downsample, ::downsample]) <= nuclei_threshold
+                results["signal"][z] = masked_sum(plane, outside)
+        if "laplacian" in metrics:
+            results["laplacian"][z] = laplace(plane).var()
+        if "brenner" in metrics:
+            results["brenner"][z] = np.square(plane[2:, :] - plane[:-2, :]).sum()
+            results["brenner"][z] += np.square(plane[:, 2:] - plane[:, :-2]).sum()
+    return results
+
+
+def _nuclei_threshold(nuclei: np.ndarray, thresh_factor: float, thresh_min: float, thresh_max: float) -> float:
+    """
+    log-li threshold of the nuclei channel (read plane by plane), with the thresh_min / thresh_max of
+    apply_log_li_threshold given relative to the intensity range of the channel
+    """
+    lowest, highest = np.inf, -np.inf
+    for z in range(nuclei.shape[0]):
+        nuclei_plane = np.asarray(nuclei[z])
+        lowest, highest = min(lowest, nuclei_plane.min()), max(highest, nuclei_plane.max())
+    if lowest == highest:
+        return lowest
+
+    threshold = histogram_threshold(nuclei, "li", log_scale=True, z_chunk=1) * thresh_factor
+    threshold = max(threshold, lowest + thresh_min * (highest - lowest))
+    return min(threshold, lowest + thresh_max * (highest - lowest))
@@ -18,6 +18,7 @@ from infer_subc.core.img import (
     get_max_label,
     get_interior_labels,
 )
+from infer_subc.core.label_reductions import label_index, label_sum
 
 
 def raw_cellmask_fromaggr(img_in: np.ndarray, scale_min_max: bool = True) -> np.ndarray:
@@ -471,10 +472,10 @@ def select_highest_intensity_cell(raw_image: np.ndarray,
     normed_composite = normed_signal.sum(axis=0)
 
     # list of cell IDs to measure intensity of
-    all_labels = np.unique(cell_labels)[1:]
+    all_labels = label_index(cell_labels)
 
     # measure total intensity in each cell from the ID list
-    total_signal = [normed_composite[cell_labels == label].sum() for label in all_labels]
+    total_signal = label_sum(normed_composite, cell_labels, all_labels)
 
     # select the cell with the highest total intensity
     keep_label = all_labels[np.argmax(total_signal)]
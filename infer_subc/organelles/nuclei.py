@@ -410,7 +410,8 @@ def mask_cytoplasm_nuclei(cellmask: np.ndarray,
         size of small objects to be removed from the final nucleus segmentation image
     """
 
-    good_cyto = apply_mask(cyto_seg, cellmask).astype(bool)
+    good_cyto = cyto_seg.astype(bool)
+    apply_mask(good_cyto, cellmask, out=good_cyto)
 
     good_cyto_inverse = 1 - good_cyto
 
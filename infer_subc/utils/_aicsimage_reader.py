@@ -68,6 +68,21 @@ def _get_full_image_data(
 
 # Function to get Metadata to provide with data
 def _get_meta(path: "PathLike", data: xr.DataArray, img: AICSImage) -> Dict[str, Any]:
+    meta = _get_layer_meta(path, data, img)
+
+    # Apply all other metadata
+    img_meta = {"aicsimage": img, "raw_image_metadata": img.metadata}
+    try:
+        img_meta["ome_types"] = img.ome_metadata
+    except Exception:
+        pass
+
+    meta["metadata"] = img_meta
+    return meta
+
+
+# Layer names, channel axis and scale, without the (slow to parse) raw and ome metadata
+def _get_layer_meta(path: "PathLike", data: xr.DataArray, img: AICSImage) -> Dict[str, Any]:
     meta: Dict[str, Any] = {}
     if DimensionNames.Channel in data.dims:
         # Construct basic metadata
@@ -115,14 +130,6 @@ def _get_meta(path: "PathLike", data: xr.DataArray, img: AICSImage) -> Dict[str,
     if len(scale) > 0:
         meta["scale"] = tuple(scale)
 
-    # Apply all other metadata
-    img_meta = {"aicsimage": img, "raw_image_metadata": img.metadata}
-    try:
-        img_meta["ome_types"] = img.ome_metadata
-    except Exception:
-        pass
-
-    meta["metadata"] = img_meta
     return meta
 
 
@@ -2,6 +2,7 @@ from typing import Union, Dict, List
 from pathlib import Path
 
 from infer_subc.core.file_io import list_image_files, export_tiff, read_tiff_image
+from infer_subc.core.zarr_store import SegmentationStore, is_zarr_path
 from infer_subc.core.img import label_uint16
 
 
@@ -79,7 +80,8 @@ def find_segmentation_tiff_files(prototype:Union[Path,str],
     name_list:List[str]
         a list of file name endings related to what segmentation is that file
     seg_path:Union[Path,str]
-        the path (as a string) to the matching segmentation files.
+        the path (as a string) to the matching segmentation files, or to a zarr SegmentationStore (".zarr").
+        The paths returned for a store are those of its arrays, which read_tiff_image reads as well
     suffix:Union[str, None]=None
         any additional text that exists between the file root and the name_list ending
         Ex) Prototype = "C:/Users/Shannon/Documents/Python_Scripts/Infer-subc/raw/a48hrs-Ctrl_9_Unmixing.czi"
@@ -87,6 +89,7 @@ def find_segmentation_tiff_files(prototype:Union[Path,str],
             result of .stem = "a48hrs-Ctrl_9_Unmixing"
             organelle/cell area type = "cell"
             suffix = "-20230426_test_"
+        Not used with a SegmentationStore, where the segmentations are only named after the name_list
     
     Returns:
     ----------
@@ -108,6 +111,16 @@ def find_segmentation_tiff_files(prototype:Union[Path,str],
         return out_files
 
     # segmentations
+    if is_zarr_path(seg_path):
+        store = SegmentationStore(seg_path, mode="r")
+        for org_n in name_list:
+            if store.contains(prototype.stem, org_n):
+                out_files[org_n] = store.array_path(prototype.stem, org_n)
+            else:
+                print(f"{org_n} not found in {seg_path}")
+                out_files[org_n] = None
+        return out_files
+
     for org_n in name_list:
         org_name = Path(seg_path) / f"{prototype.stem}{suffix}{org_n}.tiff"
         if org_name.exists(): 
@@ -15,7 +15,8 @@ import centrosome.cpmorphology
 import centrosome.propagate
 import centrosome.zernike
 
-from infer_subc.core.img import apply_mask
+from infer_subc import get_float_dtype
+from infer_subc.core.img import apply_mask, masked_sum
 
 
 
@@ -95,10 +96,8 @@ def get_org_morphology_3D(segmentation_img: np.ndarray,
     ## MASK THE ORGANELLE OBJECTS THAT WILL BE MEASURED
     ###################################################
     # in case we sent a boolean mask (e.g. cyto, nucleus, cellmask)
-    input_labels = _assert_uint16_labels(segmentation_img)
-
     # mask
-    input_labels = apply_mask(input_labels, mask)
+    input_labels = _masked_uint16_labels(segmentation_img, mask)
 
     ##########################################
     ## CREATE LIST OF REGIONPROPS MEASUREMENTS
@@ -260,6 +259,15 @@ def _assert_uint16_labels(inp: np.ndarray) -> np.ndarray:
         return label(inp > 0).astype(np.uint16)
     return inp
 
+
+def _masked_uint16_labels(inp: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """
+    _assert_uint16_labels() of the input, with the mask applied.  Labels made from a boolean input are a new
+    array and are masked in place; the input itself is never modified
+    """
+    labels = _assert_uint16_labels(inp)
+    return apply_mask(labels, mask, out=labels if labels is not inp else None)
+
 ### USED ###
 def get_region_morphology_3D(region_seg: np.ndarray, 
                               region_name: str,
@@ -318,9 +326,7 @@ def get_region_morphology_3D(region_seg: np.ndarray,
     ## MASK THE REGION OBJECTS THAT WILL BE MEASURED
     ###################################################
     # in case we sent a boolean mask (e.g. cyto, nucleus, cellmask)
-    input_labels = _assert_uint16_labels(region_seg)
-
-    input_labels = apply_mask(input_labels, mask)
+    input_labels = _masked_uint16_labels(region_seg, mask)
 
     ##########################################
     ## CREATE LIST OF REGIONPROPS MEASUREMENTS
@@ -481,7 +487,7 @@ def get_contact_metrics_3D(a: np.ndarray,
 
     a_int_b = np.logical_and(a > 0, b > 0)
 
-    labels = label(apply_mask(a_int_b, mask)).astype("int")
+    labels = label(apply_mask(a_int_b, mask, out=a_int_b)).astype("int")
 
     ##########################################
     ## CREATE LIST OF REGIONPROPS MEASUREMENTS
@@ -659,7 +665,7 @@ def create_masked_sum_projection(img_in:np.ndarray, mask:Union[np.ndarray, None]
     """
     img_out = img_in.astype(bool) if to_bool else img_in
     if mask is not None:
-        img_out = apply_mask(img_out, mask)
+        return masked_sum(img_out, mask, axis=0)
     
     return img_out.sum(axis=0)
 
@@ -761,8 +767,9 @@ def get_XY_distribution(
     """
 
     mask_proj = create_masked_sum_projection(mask)
-    center_proj = create_masked_sum_projection(centering_obj,mask.astype(bool))
-    obj_proj = create_masked_sum_projection(obj,mask.astype(bool))
+    bool_mask = mask.astype(bool)
+    center_proj = create_masked_sum_projection(centering_obj,bool_mask)
+    obj_proj = create_masked_sum_projection(obj,bool_mask)
  
 
     XY_metrics, dist_bin_mask, dist_wedge_mask = get_concentric_distribution(mask_proj=mask_proj, 
@@ -920,13 +927,13 @@ def get_normalized_distance_and_mask(labels: np.ndarray,
 
         good_mask = cl > 0
 
-    i_center = np.zeros(cl.shape)
+    i_center = np.zeros(cl.shape, dtype=get_float_dtype())
     i_center[good_mask] = i[cl[good_mask] - 1]
 
-    j_center = np.zeros(cl.shape)
+    j_center = np.zeros(cl.shape, dtype=get_float_dtype())
     j_center[good_mask] = j[cl[good_mask] - 1]
 
-    normalized_distance = np.zeros(labels.shape)
+    normalized_distance = np.zeros(labels.shape, dtype=get_float_dtype())
     total_distance = d_from_center + d_to_edge
     normalized_distance[good_mask] = d_from_center[good_mask] / (total_distance[good_mask] + 0.001)
     
@@ -1641,7 +1648,7 @@ def create_masked_depth_projection(img_in:np.ndarray, mask:Union[np.ndarray, Non
     """
     img_out = img_in.astype(bool) if to_bool else img_in
     if mask is not None:
-        img_out = apply_mask(img_out, mask)
+        return masked_sum(img_out, mask, axis=(1,2))
     
     return img_out.sum(axis=(1,2))
 
@@ -1678,8 +1685,9 @@ def get_Z_distribution(
 
     # flattened
     mask_proj = create_masked_depth_projection(mask)
-    obj_proj = create_masked_depth_projection(obj, mask.astype(bool))
-    center_proj = create_masked_depth_projection(center_obj, mask.astype(bool)) if center_obj is not None else None
+    bool_mask = mask.astype(bool)
+    obj_proj = create_masked_depth_projection(obj, bool_mask)
+    center_proj = create_masked_depth_projection(center_obj, bool_mask) if center_obj is not None else None
 
     Zdist_tab = pd.DataFrame({'object':obj_name,
                             'Z_n_slices':mask.shape[0],
@@ -1877,10 +1885,8 @@ def get_summary_stats_2D(input_labels, intensity_img, mask):
     """collect volumentric stats"""
 
     # in case we sent a boolean mask (e.g. cyto, nucleus, cellmask)
-    input_labels = _assert_uint16_labels(input_labels)
-
     # mask
-    input_labels = apply_mask(input_labels, mask)
+    input_labels = _masked_uint16_labels(input_labels, mask)
 
     properties = ["label"]
     # add intensity:
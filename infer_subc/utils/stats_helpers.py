@@ -12,7 +12,7 @@ from infer_subc.utils.stats import (get_contact_metrics_3D,
                     get_Z_distribution, 
                     get_region_morphology_3D)
 from infer_subc.utils.batch import list_image_files, find_segmentation_tiff_files
-from infer_subc.core.file_io import read_czi_image, read_tiff_image
+from infer_subc.core.file_io import read_czi_image, read_tiff_image, LazyImage
 
 
 ### USED ### 
@@ -337,8 +337,9 @@ def batch_process_quantification(out_file_name: str,
         count = count + 1
         filez = find_segmentation_tiff_files(img_f, segs_to_collect, seg_path, seg_suffix)
 
-        # read in raw file and metadata
-        img_data, meta_dict = read_czi_image(filez["raw"])
+        # open raw file and metadata; only the channels measured are read
+        img_data = LazyImage(filez["raw"])
+        meta_dict = img_data.meta
 
         # create intensities from raw file as list based on the channel order provided
         intensities = [img_data[ch] for ch in organelle_channels]
@@ -1,6 +1,13 @@
 from .segmenter_function import SegmenterFunction, FunctionParameter, WidgetType
 from .workflow_step import WorkflowStep, WorkflowStepCategory
 from .workflow import Workflow
+from .chunked_workflow import ChunkedWorkflow
 from .batch_workflow import BatchWorkflow
 from .workflow_definition import WorkflowDefinition
 from .workflow_engine import WorkflowEngine
+from .workflow_planner import WorkflowPlanner
+from .step_cache import StepCache
+from .instrumentation import StepRecord, StepRecorder, summarize_step_records
+from .batch_manifest import BatchManifest
+from .work_queue import FileWorkQueue
+from .parameter_sweep import SweepStage, sweep_infer, make_grid
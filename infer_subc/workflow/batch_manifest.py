@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Tuple, Union
+from infer_subc import get_module_version, get_float_dtype
+from infer_subc.exceptions import ArgumentNullError
+from infer_subc.workflow.workflow_definition import WorkflowDefinition
+
+MANIFEST_FILE_NAME = "batch_manifest.json"
+MANIFEST_VERSION = 1
+
+
+class BatchManifest:
+    """
+    Record of the (input file X workflow) pairs a BatchWorkflow has completed, kept in `output_dir`.
+
+    For each output file the manifest stores the size, modification time and hash of the input file, a hash
+    of the workflow definition (functions, parameters, channel index and infer_subc version) and the size
+    and checksum of the output.  A pair is up to date when all of these still match, so an interrupted
+    batch can be re-run and only the failed, missing or stale pairs are executed again.
+
+    The manifest is re-written (atomically) after every completed pair.
+    """
+
+    def __init__(self, output_dir: Union[str, Path]):
+        if output_dir is None:
+            raise ArgumentNullError("output_dir")
+
+        self._path = Path(output_dir) / MANIFEST_FILE_NAME
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+        self._file_hashes: Dict[Tuple[str, int, int], str] = dict()  # (path, size, mtime) -> hash
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def entries(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Manifest entries by output file name
+        """
+        return self._entries
+
+    @staticmethod
+    def hash_workflow_definition(
+        workflow_definition: WorkflowDefinition, channel_index: int, float_dtype: Union[np.dtype, None] = None
+    ) -> str:
+        """
+        Hash of everything in a workflow definition that determines its output.  `float_dtype` is the float
+        precision the workflow runs with (default: the current package setting, see infer_subc.set_float_dtype)
+        """
+        float_dtype = np.dtype(float_dtype if float_dtype is not None else get_float_dtype())
+        steps = [
+            {
+                "module": step.function.module,
+                "function": step.function.function,
+                "parent": step.parent,
+                "parameters": step.parameter_values,
+            }
+            for step in workflow_definition.steps
+        ]
+        payload = {
+            "steps": steps,
+            "channel_index": channel_index,
+            "version": get_module_version(),
+            "float_dtype": str(float_dtype),
+        }
+        payload = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+    def is_up_to_date(self, input_path: Path, output_path: Path, workflow_hash: str) -> bool:
+        """
+        Check whether `output_path` was produced from the current `input_path` by the current workflow
+
+        Params:
+            input_path (Path): input image file
+            output_path (Path): output file of the pair
+            workflow_hash (str): see hash_workflow_definition()
+
+        Returns
+            (bool): True if the pair does not need to be executed again
+        """
+        entry = self._entries.get(output_path.name)
+        if entry is None or entry["workflow_hash"] != workflow_hash:
+            return False
+        if entry["input"]["path"] != str(input_path):
+            return False
+
+        return self._file_matches(input_path, entry["input"]) and self._file_matches(output_path, entry["output"])
+
+    def record(self, input_path: Path, output_path: Path, workflow_hash: str):
+        """
+        Record a completed pair and save the manifest
+        """
+        self.add(output_path.name, self.make_entry(input_path, output_path, workflow_hash))
+
+    def make_entry(self, input_path: Path, output_path: Path, workflow_hash: str) -> Dict[str, Any]:
+        """
+        Build the manifest entry of a completed pair (without adding it)
+        """
+        return {
+            "input": self._describe_file(input_path),
+            "workflow_hash": workflow_hash,
+            "output": self._describe_file(output_path),
+            "completed": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def add(self, output_name: str, entry: Dict[str, Any]):
+        """
+        Add an entry (e.g. made in another process) and save the manifest
+        """
+        self._entries[output_name] = entry
+        self._save()
+
+    def discard(self, output_name: str):
+        """
+        Forget a pair, e.g. because it failed.  Its output is then never considered up to date
+        """
+        if self._entries.pop(output_name, None) is not None:
+            self._save()
+
+    def _describe_file(self, path: Path) -> Dict[str, Any]:
+        stat = path.stat()
+        return {
+            "path": str(path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": self._hash_file(path, stat.st_size, stat.st_mtime_ns),
+        }
+
+    def _file_matches(self, path: Path, recorded: Dict[str, Any]) -> bool:
+        try:
+            stat = path.stat()
+        except OSError:
+            return False
+        if stat.st_size != recorded["size"]:
+            return False
+        if stat.st_mtime_ns == recorded["mtime"]:
+            return True
+        # touched since it was recorded: compare the content
+        return self._hash_file(path, stat.st_size, stat.st_mtime_ns) == recorded["hash"]
+
+    def _hash_file(self, path: Path, size: int, mtime: int) -> str:
+        key = (str(path), size, mtime)
+        if key not in self._file_hashes:
+            hasher = hashlib.blake2b(digest_size=20)
+            with open(path, "rb") as reader:
+                for chunk in iter(lambda: reader.read(2**23), b""):
+                    hasher.update(chunk)
+            self._file_hashes[key] = hasher.hexdigest()
+        return self._file_hashes[key]
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not self._path.exists():
+            return dict()
+        try:
+            with open(self._path) as reader:
+                obj = json.load(reader)
+        except ValueError:
+            # unreadable manifest: everything is executed again
+            return dict()
+        if obj.get("version") != MANIFEST_VERSION:
+            return dict()
+        return obj["pairs"]
+
+    def _save(self):
+        # write to a temporary file first so an interrupted job never leaves a truncated manifest
+        tmp_path = self._path.with_name(f"{self._path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as writer:
+            json.dump({"version": MANIFEST_VERSION, "pairs": self._entries}, writer, indent=1, sort_keys=True)
+        os.replace(tmp_path, self._path)
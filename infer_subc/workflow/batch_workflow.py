@@ -1,10 +1,14 @@
+import hashlib
+import time
 import numpy as np
 
 from tifffile import imwrite #, tiffcomment, imread
 
 
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Union
+from typing import Any, Deque, Dict, List, NamedTuple, Tuple, Union
 # from aicsimageio import AICSImage
 # from aicsimageio.writers import OmeTiffWriter
 from pathlib import Path
@@ -14,14 +18,24 @@ from pathlib import Path
 # from aicssegmentation.exceptions import ArgumentNullError
 from infer_subc.utils.filesystem import FileSystemUtilities
 from infer_subc.exceptions import ArgumentNullError
+from infer_subc import set_float_dtype
 from infer_subc.workflow.workflow import Workflow
+from infer_subc.workflow.chunked_workflow import ChunkedWorkflow
 from infer_subc.workflow.workflow_definition import WorkflowDefinition
+from infer_subc.workflow.workflow_planner import WorkflowPlanner
+from infer_subc.workflow.step_cache import StepCache, DEFAULT_CACHE_MAX_BYTES
+from infer_subc.workflow.instrumentation import StepRecord, StepRecorder
+from infer_subc.workflow.batch_manifest import BatchManifest
+from infer_subc.workflow.work_queue import FileWorkQueue, DEFAULT_HEARTBEAT_TIMEOUT
 
 # from infer_subc.core.file_io import reader_function
 from infer_subc.core.file_io import reader_function
+from infer_subc.core.zarr_store import SegmentationStore
 
 PathLike = Union[str, Path]
 SUPPORTED_FILE_EXTENSIONS = ["tiff", "tif", "czi"]
+OUTPUT_FORMATS = ("tiff", "zarr")
+SEGMENTATION_STORE_NAME = "segmentations.zarr"
 
 
 # TODO: fix channel index.
@@ -30,6 +44,29 @@ class BatchWorkflow:
     Represents a batch of workflows to process.
     This class provides the functionality to run batches of workflows using multiple image inputs from a input directory
     according to the steps defined in its WorkflowDefinition.
+    Files are processed one after another unless `max_workers` > 1, in which case execute_all() sends them
+    to a pool of worker processes.  With `merge_steps`, the steps of all workflows are merged by a
+    WorkflowPlanner so that steps shared by several workflows only run once per file.  With `cache_dir`,
+    step results are kept in a StepCache so that re-running a batch only recomputes the steps that changed.
+    With `instrument`, every step is measured by a StepRecorder: the records are written as JSONL next to the
+    log file and a per workflow summary table is added to the log.
+    With `resume`, completed (file X workflow) pairs are recorded in a BatchManifest in `output_dir`, and the
+    pairs whose output is still up to date are skipped when the batch is run again.
+    With `pipelined` (when files are not sent to a process pool), the next file is read by a reader thread
+    and the outputs are saved by a writer thread, so that file I/O overlaps with the segmentation.  Results
+    may then be logged after the next file has started.
+    With `distributed`, any number of BatchWorkflows (e.g. one per cluster node) can run on the same input_dir
+    and output_dir: each input file is claimed through a FileWorkQueue on the shared output_dir, every worker
+    logs to its own file and the last worker to finish merges the logs into output_dir.  After processing
+    the files it claimed, a worker waits for the files claimed by other workers to be done, and processes
+    those whose worker crashed (stopped sending heartbeats) itself.
+    With `chunk_size`, input files are read lazily and the workflows run as ChunkedWorkflows on YX chunks of
+    that size, so that images larger than memory can be segmented.
+    With `float_dtype` (e.g. np.float32), the package float precision (see infer_subc.set_float_dtype) is set
+    to it in every process running the batch.
+    With `output_format` "zarr", the segmentations are written to a compressed and chunked SegmentationStore
+    (output_dir/segmentations.zarr, one group per input file and one array per segmentation name, with the
+    scale and provenance in the array attributes) instead of one tiff file per input file and segmentation.
     """
 
     def __init__(
@@ -39,6 +76,18 @@ class BatchWorkflow:
         output_dir: Union[str, Path],
         segmentation_names: List[str],  # JAH: add segmentation name for export
         channel_index: int = -1,  # JAH: change so all negative indices return ALL the channels/zslices
+        max_workers: int = 1,
+        merge_steps: bool = False,
+        cache_dir: Union[str, Path, None] = None,
+        cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+        instrument: bool = False,
+        resume: bool = False,
+        pipelined: bool = False,
+        distributed: bool = False,
+        heartbeat_timeout: float = DEFAULT_HEARTBEAT_TIMEOUT,
+        chunk_size: Union[Tuple[int, int], None] = None,
+        float_dtype: Union[np.dtype, None] = None,
+        output_format: str = "tiff",
     ):
         if workflow_definitions is None:
             raise ArgumentNullError("workflow_definitions")
@@ -48,8 +97,17 @@ class BatchWorkflow:
             raise ArgumentNullError("input_dir")
         if output_dir is None:
             raise ArgumentNullError("output_dir")
-
-        self._workflow_definitions = workflow_definitions
+        if resume and distributed:
+            raise ValueError("resume and distributed can't be combined: the work queue already skips completed files")
+        if chunk_size is not None and cache_dir is not None:
+            raise ValueError("cache_dir and chunk_size can't be combined: chunked workflows don't cache steps")
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}, not {output_format}")
+        if resume and output_format == "zarr":
+            raise ValueError("resume and the zarr output_format can't be combined: the manifest tracks output files")
+
+        # compile up front so a bad workflow definition fails before any file is processed
+        self._workflow_definitions = [wfd.compile() for wfd in workflow_definitions]
         self._input_dir = Path(input_dir)
         self._segmentation_names = segmentation_names
 
@@ -58,14 +116,54 @@ class BatchWorkflow:
 
         self._output_dir = Path(output_dir)
         self._channel_index = channel_index
+        self._max_workers = max_workers
+        self._planner = WorkflowPlanner(workflow_definitions) if merge_steps else None
+        self._cache = StepCache(cache_dir, cache_max_bytes) if cache_dir is not None else None
         self._processed_files: int = 0
         self._failed_files: int = 0
+        self._skipped_files: int = 0
+        self._remote_files: int = 0
         self._log_path: Path = self._output_dir / f"log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        self._log_buffer: Union[List[str], None] = None  # set in worker processes to collect log lines
 
         # Create the output directory at output_dir if it does not exist already
         if not self._output_dir.exists():
             FileSystemUtilities.create_directory(self._output_dir)
 
+        # the store is created here, so the worker processes only add arrays to it
+        self._store: Union[SegmentationStore, None] = None
+        if output_format == "zarr":
+            self._store = SegmentationStore(self._output_dir / SEGMENTATION_STORE_NAME)
+        self._input_scales: Dict[str, Any] = dict()  # input file stem -> scale, saved with the zarr outputs
+
+        self._queue: Union[FileWorkQueue, None] = None
+        self._pairs_left: Dict[Path, int] = dict()  # claimed files -> pairs left before the file is done
+        self._pairs_failed: Dict[Path, int] = dict()  # claimed files -> pairs that failed
+        self._remote_pending: List[Path] = list()  # files claimed by other workers and not done yet
+        if distributed:
+            self._queue = FileWorkQueue(self._get_queue_dir(), heartbeat_timeout=heartbeat_timeout)
+            self._merged_log_path = self._log_path
+            self._log_path = self._queue.worker_log_path
+
+        self._recorder: Union[StepRecorder, None] = None
+        if instrument:
+            self._recorder = StepRecorder(self._log_path.with_name(f"{self._log_path.stem}_steps.jsonl"))
+
+        self._manifest: Union[BatchManifest, None] = None
+        self._manifest_buffer: Union[List[Tuple[str, Dict[str, Any]]], None] = None  # set in worker processes
+        if resume:
+            self._manifest = BatchManifest(self._output_dir)
+            self._workflow_hashes = [
+                BatchManifest.hash_workflow_definition(wfd, channel_index, float_dtype)
+                for wfd in self._workflow_definitions
+            ]
+
+        self._pipelined = pipelined
+        self._chunk_size = chunk_size
+        self._float_dtype = float_dtype
+        self._writer: Union[ThreadPoolExecutor, None] = None  # set while running pipelined
+        self._pending_writes: Deque[Tuple[Future, Path, str, int, Path]] = deque()
+
         self._input_files = self._get_input_files(self._input_dir, SUPPORTED_FILE_EXTENSIONS)
         self._execute_generator = self._execute_generator_func()
 
@@ -81,6 +179,20 @@ class BatchWorkflow:
     def failed_files(self) -> int:
         return self._failed_files
 
+    @property
+    def remote_files(self) -> int:
+        """
+        Number of file X workflow pairs processed by other workers (distributed mode)
+        """
+        return self._remote_files
+
+    @property
+    def skipped_files(self) -> int:
+        """
+        Number of file X workflow pairs skipped because their output was up to date (resume mode)
+        """
+        return self._skipped_files
+
     @property
     def input_dir(self) -> Path:
         return self._input_dir
@@ -93,6 +205,17 @@ class BatchWorkflow:
     def segmentation_names(self) -> List[str]:
         return self._segmentation_names
 
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    @property
+    def recorder(self) -> Union[StepRecorder, None]:
+        """
+        StepRecorder holding the step measurements if the batch is instrumented, else None
+        """
+        return self._recorder
+
     def is_done(self) -> bool:
         """
         Indicates whether all files / steps have been executed
@@ -112,11 +235,21 @@ class BatchWorkflow:
 
         print("Starting batch workflow...")
         print(f"Found {self.total_files} files X workflows to process.")
+        if self._planner is not None:
+            print(f"Merged {self._planner.total_steps} workflow steps into {self._planner.merged_steps} per file.")
+
+        # files are only sent to the process pool if execute_next() has not been used yet
+        if self._max_workers > 1 and self._processed_files == 0:
+            self._execute_all_parallel()
 
         while not self.is_done():
             self.execute_next()
 
         self.write_log_file_summary()
+        if self._recorder is not None:
+            self._write_to_log_file(f"\nStep timings:\n{self._recorder.summary().to_string()}")
+        if self._queue is not None:
+            self._merge_worker_logs()
 
         print(f"Batch workflow complete. Check {self._log_path} for output log and summary.")
 
@@ -125,66 +258,415 @@ class BatchWorkflow:
             print("No files left to process")
             return
 
-        next(self._execute_generator)
+        # the generator can finish without yielding when the last files were claimed by other workers
+        next(self._execute_generator, None)
+
+    def _execute_all_parallel(self):
+        """
+        Execute every file in a process pool of `max_workers` processes.
+
+        Each worker process receives (a pickled copy of) this batch once, then runs all workflows for one file at
+        a time and sends back its log lines, step records, manifest updates and counts.  Results are consumed in
+        input file order so the log file matches a serial run.
+        """
+        with ProcessPoolExecutor(max_workers=self._max_workers, initializer=_init_worker, initargs=(self,)) as executor:
+            for report in executor.map(_execute_file_in_worker, self._input_files):
+                for line in report.log_lines:
+                    self._write_to_log_file(line)
+                if self._recorder is not None:
+                    self._recorder.add(report.records)
+                for output_name, entry in report.manifest_updates:
+                    self._update_manifest(output_name, entry)
+                self._processed_files += report.processed
+                self._failed_files += report.failed
+                self._skipped_files += report.skipped
+                self._remote_files += report.remote
+                self._remote_pending.extend(report.pending_files)
+
+        # files held by other workers are waited for (and reclaimed if their worker crashed) in this process
+        for _ in self._wait_for_remote_files():
+            pass
 
     def _execute_generator_func(self):
-        for f in self._input_files:
-            msg = f"\nprocessing::: {f.name} :"
+        if not self._pipelined:
+            for f in self._input_files:
+                if self._claim_input_file(f):
+                    yield from self._execute_file_generator(f)
+            yield from self._wait_for_remote_files()
+            return
+
+        # a reader thread decodes the next file while the current one is segmented, and a writer thread saves
+        #   the results.  Only one file is read ahead, and at most one file's results wait to be written
+        claimed_files = (f for f in self._input_files if self._claim_input_file(f))
+        with ThreadPoolExecutor(max_workers=1) as reader, ThreadPoolExecutor(max_workers=1) as writer:
+            self._writer = writer
+            f = next(claimed_files, None)
+            next_image = reader.submit(self._prefetch_input, f) if f is not None else None
+            while f is not None:
+                image = next_image
+                next_f = next(claimed_files, None)
+                next_image = reader.submit(self._prefetch_input, next_f) if next_f is not None else None
+                yield from self._execute_file_generator(f, image)
+                del image
+                f = next_f
+
+            while len(self._pending_writes) > 0:
+                self._finish_oldest_write()
+                yield
+            self._writer = None
+
+        yield from self._wait_for_remote_files()
+
+    def _claim_input_file(self, f: Path) -> bool:
+        """
+        In distributed mode, claim an input file in the work queue.  Files done by other workers are counted
+        as processed by them, files held by other workers are waited for (see _wait_for_remote_files).
+        A file marked as done whose outputs are missing (e.g. deleted since) is processed again
+
+        Returns
+            (bool): True if this worker must process the file
+        """
+        if self._queue is None:
+            return True
+        if self._queue.is_done(f.name) and not self._outputs_exist(f):
+            self._queue.reopen(f.name)
+        if self._queue.claim(f.name):
+            self._pairs_left[f] = len(self._workflow_definitions)
+            self._pairs_failed[f] = 0
+            return True
+
+        if self._queue.is_done(f.name):
+            self._write_to_log_file(f"\nSKIPPED: {f.name} was processed by another worker")
+            self._remote_files += len(self._workflow_definitions)
+            self._processed_files += len(self._workflow_definitions)
+        else:
+            self._remote_pending.append(f)
+        return False
+
+    def _wait_for_remote_files(self):
+        """
+        In distributed mode, poll the files held by other workers until they are done.  A file whose lock went
+        stale (its worker crashed) is claimed and processed by this worker.  Yields while waiting
+        """
+        if len(self._remote_pending) > 0:
+            self._write_to_log_file(f"\nWAITING for {len(self._remote_pending)} files held by other workers")
+        while len(self._remote_pending) > 0:
+            pending = self._remote_pending
+            self._remote_pending = list()
+            for f in pending:
+                if self._claim_input_file(f):
+                    self._write_to_log_file(f"\nRECLAIMED: {f.name}, its worker stopped sending heartbeats")
+                    yield from self._execute_file_generator(f)
+            if len(self._remote_pending) > 0:
+                time.sleep(self._queue.poll_interval)
+                yield
+
+    def _outputs_exist(self, f: Path) -> bool:
+        if self._store is not None:
+            return all([self._store.contains(f.stem, seg_nm) for seg_nm in self._segmentation_names])
+        return all([output_path.exists() for output_path in self._get_output_paths(f)])
+
+    def _abandon_file(self, f: Path):
+        """
+        Stop processing a file whose lock was taken over by another worker (this worker was taken for crashed),
+        and wait for the other worker to finish it.  Its pairs already processed here are no longer counted
+        """
+        while len(self._pending_writes) > 0:
+            self._finish_oldest_write()
+        if f not in self._pairs_left:
+            return
+        self._processed_files -= len(self._workflow_definitions) - self._pairs_left.pop(f)
+        self._failed_files -= self._pairs_failed.pop(f)
+        self._queue.release(f.name)
+        msg = f"ABANDONED: {f.name}, its lock was taken over by another worker"
+        print(msg)
+        self._write_to_log_file(msg)
+        self._remote_pending.append(f)
+
+    def _on_pair_processed(self, f: Path, failed: bool = False):
+        """
+        Count a processed (file X workflow) pair.  In distributed mode, the file is marked as done in the work
+        queue once all its pairs are processed (outputs written).  A file with failed pairs is released
+        instead, so that the next distributed run tries it again
+        """
+        self._processed_files += 1
+        if f not in self._pairs_left:
+            return
+        self._pairs_left[f] -= 1
+        self._pairs_failed[f] += int(failed)
+        if self._pairs_left[f] > 0:
+            return
+        if self._pairs_failed[f] > 0:
+            if not self._queue.owns(f.name):
+                self._abandon_file(f)
+                return
+            self._queue.release(f.name)
+            msg = f"RELEASED: {f.name} is not marked as done, {self._pairs_failed[f]} of its workflows failed"
+            print(msg)
             self._write_to_log_file(msg)
-            for wf, seg_nm in zip(self._workflow_definitions, self._segmentation_names):
-                try:
-                    # read and format image in the way we expect
-                    # read_image = AICSImage(f)
-                    # image_from_path = self._format_image_to_3d(read_image)
-                    image_from_path = self._format_image_to_3d(f)
-
-                    # Run workflow on image
-                    msg = f": {seg_nm} :"
-                    self._write_to_log_file(msg)
-
-                    workflow = Workflow(wf, image_from_path)
+        elif not self._queue.complete(f.name):
+            self._abandon_file(f)
+            return
+        del self._pairs_left[f], self._pairs_failed[f]
+
+    def _merge_worker_logs(self):
+        """
+        Mark the log of this worker as finished, and merge the logs of all workers if every worker finished its
+        log (a worker only finishes once all files are processed, by itself or others).  Workers finishing
+        together merge one after the other (the "merge_logs" task is their mutex), so the last merge has all logs
+        """
+        self._queue.finish_worker()
+        if not self._queue.all_workers_finished():
+            return
+        while not self._queue.claim("merge_logs"):
+            time.sleep(1)
+        try:
+            self._queue.merge_worker_logs(self._merged_log_path)
+        finally:
+            self._queue.release("merge_logs")
+        print(f"Merged the logs of all workers in {self._merged_log_path}")
+
+    def _get_queue_dir(self) -> Path:
+        """
+        Work queue directory of this batch: one per set of workflows, so a changed batch starts a new queue
+        """
+        hashes = [
+            BatchManifest.hash_workflow_definition(wfd, self._channel_index) for wfd in self._workflow_definitions
+        ]
+        payload = "".join(hashes + list(self._segmentation_names))
+        return self._output_dir / f".queue_{hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()}"
+
+    def _execute_file_generator(self, f: Path, image_future: Union[Future, None] = None):
+        """
+        Run all the workflow definitions on a single input file, yielding after every workflow step.
+        The file is read once and the image is shared by all workflows.  In resume mode, the workflows whose
+        output is up to date are skipped (and the file is not read at all if they all are).
+        In pipelined mode the image comes from `image_future` (read ahead by the reader thread) and the
+        outputs are handed to the writer thread.
+        """
+        msg = f"\nprocessing::: {f.name} :"
+        self._write_to_log_file(msg)
+        if self._float_dtype is not None:
+            # also applies in the worker processes, which run this generator
+            set_float_dtype(self._float_dtype)
+        if self._recorder is not None:
+            self._recorder.file = f.name
+
+        output_paths = self._get_output_paths(f)
+        up_to_date = [self._is_up_to_date(f, output_path, i) for i, output_path in enumerate(output_paths)]
+
+        # read and format image in the way we expect.  The raw image is decoded once per file and shared
+        #   (read-only) by every workflow so that no workflow can alter the input of the next one
+        image_from_path = None
+        read_error = None
+        if not all(up_to_date):
+            try:
+                if image_future is not None:
+                    image_from_path = image_future.result()
+                if image_from_path is None:
+                    image_from_path = self._read_input(f)
+            except Exception as ex:
+                read_error = ex
+
+        merged_results = None
+        if self._planner is not None and image_from_path is not None:
+            merged_results = yield from self._execute_merged_generator(image_from_path)
+
+        for i, (wf, seg_nm) in enumerate(zip(self._workflow_definitions, self._segmentation_names)):
+            output_path = output_paths[i]
+            if f in self._pairs_left and not self._queue.owns(f.name):
+                self._abandon_file(f)
+                break
+            if up_to_date[i]:
+                msg = f"SKIPPED: {f}:{seg_nm}. {output_path.name} is up to date"
+                print(msg)
+                self._write_to_log_file(msg)
+                self._skipped_files += 1
+                self._on_pair_processed(f)
+                yield
+                continue
+
+            try:
+                if read_error is not None:
+                    raise read_error
+
+                # Run workflow on image
+                msg = f": {seg_nm} :"
+                self._write_to_log_file(msg)
+
+                if merged_results is not None:
+                    result = merged_results[i]
+                else:
+                    workflow = self._create_workflow(wf, image_from_path)
                     while not workflow.is_done():
                         workflow.execute_next()
                         result = workflow.get_most_recent_result()
                         # print(f"current result shape + type: {result.shape}, {result.dtype}")
                         yield
+                    result = workflow.get_most_recent_result()
 
-                    # Save output
-                    # output_path = self._output_dir / f"{f.stem}.segmentation.tiff"
-                    output_path = self._output_dir / f"{f.stem}-{seg_nm}.tiff"
+                # Save output
+                # output_path = self._output_dir / f"{f.stem}.segmentation.tiff"
+                result = self._format_output(result)
+                if self._writer is not None:
+                    future = self._writer.submit(self._write_output, output_path, result, f, wf.name)
+                    self._pending_writes.append((future, f, seg_nm, i, output_path))
+                else:
+                    self._write_output(output_path, result, f, wf.name)
+                    self._on_output_written(f, seg_nm, i, output_path)
+                del result
+
+            except Exception as ex:
+                self._on_pair_failed(f, seg_nm, output_path, ex)
+
+            # report the writes already done, and wait for the oldest ones if too many results are queued
+            while len(self._pending_writes) > 0 and self._pending_writes[0][0].done():
+                self._finish_oldest_write()
+            while len(self._pending_writes) > len(self._workflow_definitions):
+                self._finish_oldest_write()
+
+            yield
+
+        # release the raw image before moving on to the next file
+        del image_from_path, merged_results
+
+    def _get_output_paths(self, f: Path) -> List[Path]:
+        if self._store is not None:
+            return [self._store.array_path(f.stem, seg_nm) for seg_nm in self._segmentation_names]
+        return [self._output_dir / f"{f.stem}-{seg_nm}.tiff" for seg_nm in self._segmentation_names]
+
+    def _read_input(self, f: Path) -> np.ndarray:
+        image = self._format_image_to_3d(f)
+        if isinstance(image, np.ndarray):
+            image.setflags(write=False)
+        return image
 
-                    result = workflow.get_most_recent_result()
-                    result = self._format_output(result)
-
-                    ret = imwrite(
-                        output_path,
-                        result,
-                        dtype=result.dtype,
-                        # metadata={
-                        #     "axes": dimension_order,
-                        #     # "physical_pixel_sizes": physical_pixel_sizes,
-                        #     # "channel_names": channel_names,
-                        # },
-                    )
-                    # if len(result.shape) == 3:
-                    #     # TODO:  replace with. tifffile writer ...
-                    #     OmeTiffWriter.save(data=self._format_output(result), uri=output_path, dim_order="ZYX")
-                    # else:
-                    #     OmeTiffWriter.save(data=self._format_output(result), uri=output_path, dim_order="CZYX")
-
-                    msg = f"SUCCESS: {f}:{seg_nm}. >>>> {output_path.name}"
-                    print(msg)
-                    self._write_to_log_file(msg)
-
-                except Exception as ex:
-                    self._failed_files += 1
-                    msg = f"FAILED: {f}:{seg_nm}, ERROR: {ex}"
-                    print(msg)
-                    self._write_to_log_file(msg)
-                finally:
-                    self._processed_files += 1
+    def _prefetch_input(self, f: Path) -> Union[np.ndarray, None]:
+        """
+        Read an input file ahead of its processing (reader thread), unless all its outputs are up to date
+        """
+        output_paths = self._get_output_paths(f)
+        if all([self._is_up_to_date(f, output_path, i) for i, output_path in enumerate(output_paths)]):
+            return None
+        return self._read_input(f)
+
+    def _write_output(self, output_path: Path, result: np.ndarray, f: Path, workflow_name: str):
+        if self._store is not None:
+            self._store.write(
+                f.stem,
+                output_path.name,
+                result,
+                scale=self._input_scales.get(f.stem),
+                provenance={"source": f.name, "workflow": workflow_name},
+            )
+            return
+        imwrite(
+            output_path,
+            result,
+            dtype=result.dtype,
+            # metadata={
+            #     "axes": dimension_order,
+            #     # "physical_pixel_sizes": physical_pixel_sizes,
+            #     # "channel_names": channel_names,
+            # },
+        )
+        # if len(result.shape) == 3:
+        #     # TODO:  replace with. tifffile writer ...
+        #     OmeTiffWriter.save(data=self._format_output(result), uri=output_path, dim_order="ZYX")
+        # else:
+        #     OmeTiffWriter.save(data=self._format_output(result), uri=output_path, dim_order="CZYX")
+
+    def _finish_oldest_write(self):
+        """
+        Wait for the oldest queued output to be written (pipelined mode) and report it
+        """
+        future, f, seg_nm, i, output_path = self._pending_writes.popleft()
+        try:
+            future.result()
+            self._on_output_written(f, seg_nm, i, output_path)
+        except Exception as ex:
+            self._on_pair_failed(f, seg_nm, output_path, ex)
+
+    def _on_output_written(self, f: Path, seg_nm: str, workflow_index: int, output_path: Path):
+        msg = f"SUCCESS: {f}:{seg_nm}. >>>> {output_path.name}"
+        print(msg)
+        self._write_to_log_file(msg)
+        if self._manifest is not None:
+            entry = self._manifest.make_entry(f, output_path, self._workflow_hashes[workflow_index])
+            self._update_manifest(output_path.name, entry)
+        self._on_pair_processed(f)
+
+    def _on_pair_failed(self, f: Path, seg_nm: str, output_path: Path, ex: Exception):
+        self._failed_files += 1
+        msg = f"FAILED: {f}:{seg_nm}, ERROR: {ex}"
+        print(msg)
+        self._write_to_log_file(msg)
+        if self._manifest is not None:
+            self._update_manifest(output_path.name, None)
+        self._on_pair_processed(f, failed=True)
+
+    def _is_up_to_date(self, f: Path, output_path: Path, workflow_index: int) -> bool:
+        if self._manifest is None:
+            return False
+        return self._manifest.is_up_to_date(f, output_path, self._workflow_hashes[workflow_index])
+
+    def _update_manifest(self, output_name: str, entry: Union[Dict[str, Any], None]):
+        """
+        Add a completed pair to the manifest, or remove it if `entry` is None (failed pair).
+        Worker processes only collect the updates, which are saved by the main process.
+        """
+        if self._manifest_buffer is not None:
+            self._manifest_buffer.append((output_name, entry))
+        elif entry is None:
+            self._manifest.discard(output_name)
+        else:
+            self._manifest.add(output_name, entry)
 
+    def _execute_merged_generator(self, image: np.ndarray):
+        """
+        Run the merged steps of all workflows on `image`, yielding after every step.
+
+        Returns (through StopIteration) the final result of each workflow, or None if a step failed. The
+        workflows are then run one at a time so that the failure is reported for the right workflow(s).
+        """
+        workflow = self._create_workflow(
+            self._planner.workflow_definition, image, keep_results=self._planner.output_steps
+        )
+        try:
+            while not workflow.is_done():
+                workflow.execute_next()
                 yield
+        except Exception as ex:
+            msg = f"merged workflow failed ({ex}), running workflows one at a time"
+            print(msg)
+            self._write_to_log_file(msg)
+            return None
+
+        return self._planner.get_results(workflow)
+
+    def _create_workflow(
+        self, workflow_definition: WorkflowDefinition, image: np.ndarray, keep_results: Union[List[int], None] = None
+    ) -> Workflow:
+        """
+        Create the (memory-lean) Workflow running `workflow_definition` on an input file
+        """
+        if self._chunk_size is not None:
+            return ChunkedWorkflow(
+                workflow_definition,
+                image,
+                chunk_size=self._chunk_size,
+                release_intermediates=True,
+                keep_results=keep_results,
+                recorder=self._recorder,
+            )
+        return Workflow(
+            workflow_definition,
+            image,
+            release_intermediates=True,
+            keep_results=keep_results,
+            cache=self._cache,
+            recorder=self._recorder,
+        )
 
     def write_log_file_summary(self):
         """
@@ -196,12 +678,17 @@ class BatchWorkflow:
                 f"Using the Workflow: {self._workflow_definition.name}"
             )
         else:
-            files_processed = self._processed_files - self._failed_files
+            processed_here = self._processed_files - self._remote_files
+            files_processed = processed_here - self._failed_files
             wfs = ", ".join([wfd.name for wfd in self._workflow_definitions])
             report = (
-                f"{files_processed}/{self._processed_files} files were successfully processed \n "
+                f"{files_processed}/{processed_here} files were successfully processed \n "
                 f"Using the Workflows: {wfs}"
             )
+            if self._skipped_files > 0:
+                report += f"\n {self._skipped_files} up to date files were skipped"
+            if self._remote_files > 0:
+                report += f"\n {self._remote_files} files were processed by other workers"
         self._write_to_log_file(report)
 
     # def _format_image_to_3d(self, image: AICSImage) -> np.ndarray:
@@ -227,7 +714,9 @@ class BatchWorkflow:
 
         # return image.get_image_data("ZYX")
         # JAH: refactdor to use reader_function
-        data, meta, layer_type = reader_function(image_path)[0]
+        # chunked workflows read the data lazily (dask), otherwise the reader decides from the file size
+        in_memory = False if self._chunk_size is not None else None
+        data, meta, layer_type = reader_function(image_path, in_memory=in_memory)[0]
 
         if isinstance(image_path, str):
             image_path = Path(image_path)
@@ -236,6 +725,7 @@ class BatchWorkflow:
         channel_names = meta.pop("name")  # list of names for each layer
         meta["channel_names"] = channel_names
         meta["file_name"] = name
+        self._input_scales[name] = meta.get("scale")
         layer_attributes = {"name": name, "metadata": meta}
 
         # TODO:  dump metadata dictionary. json or pickle?
@@ -273,6 +763,9 @@ class BatchWorkflow:
         return image
 
     def _write_to_log_file(self, text: str):
+        if self._log_buffer is not None:
+            self._log_buffer.append(text)
+            return
         with open(self._log_path, "a") as writer:
             writer.write(f"{text}\n")
 
@@ -281,3 +774,73 @@ class BatchWorkflow:
         for ext in extensions:
             input_files.extend(input_dir.glob(f"*.{ext}"))
         return input_files
+
+    def __getstate__(self):
+        # generators can't be pickled, so worker processes get a copy without one
+        state = self.__dict__.copy()
+        state["_execute_generator"] = None
+        state["_writer"] = None
+        return state
+
+
+class _WorkerReport(NamedTuple):
+    log_lines: List[str]
+    records: List[StepRecord]  # empty if the batch is not instrumented
+    manifest_updates: List[Tuple[str, Dict[str, Any]]]  # empty if the batch is not resumable
+    processed: int
+    failed: int
+    skipped: int
+    remote: int
+    pending_files: List[Path]  # files held by other workers, waited for by the main process
+
+
+# batch workflow of a worker process, see _init_worker
+_worker_batch: Union[BatchWorkflow, None] = None
+
+
+def _init_worker(batch: BatchWorkflow):
+    """
+    Keep the batch workflow sent to a worker process (once, when the process starts) for all its files
+
+    Params:
+        batch (BatchWorkflow): (pickled copy of) the batch workflow being executed
+    """
+    global _worker_batch
+    _worker_batch = batch
+
+
+def _execute_file_in_worker(f: Path) -> _WorkerReport:
+    """
+    Run all workflows of the worker's batch (see _init_worker) on the file `f` inside a worker process.
+
+    Params:
+        f (Path): input file to process
+
+    Returns
+        (_WorkerReport): log lines written, step records, manifest updates and number of processed,
+                         failed, skipped and remote file X workflow pairs
+    """
+    batch = _worker_batch
+    batch._log_buffer = list()
+    batch._manifest_buffer = list()
+    # records are sent back to the main process, which writes them to the jsonl file
+    batch._recorder = StepRecorder() if batch._recorder is not None else None
+    batch._processed_files = 0
+    batch._failed_files = 0
+    batch._skipped_files = 0
+    batch._remote_files = 0
+    batch._remote_pending = list()
+    if batch._claim_input_file(f):
+        for _ in batch._execute_file_generator(f):
+            pass
+    records = batch._recorder.records if batch._recorder is not None else []
+    return _WorkerReport(
+        batch._log_buffer,
+        records,
+        batch._manifest_buffer,
+        batch._processed_files,
+        batch._failed_files,
+        batch._skipped_files,
+        batch._remote_files,
+        batch._remote_pending,
+    )
@@ -0,0 +1,553 @@
+import logging
+import numpy as np
+import dask
+import dask.array as da
+
+from typing import Any, Callable, Dict, List, Tuple, Union
+from scipy.ndimage import find_objects, generate_binary_structure, label as ndi_label, maximum, minimum
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from skimage.filters import threshold_otsu
+from aicssegmentation.core.hessian import absolute_3d_hessian_eigenvalues
+from aicssegmentation.core.vessel import compute_vesselness2D, compute_vesselness3D
+from infer_subc import get_float_dtype_for
+from infer_subc.core.img import median_gaussian_smoothing, get_anisotropic_sizes
+from infer_subc.core.histogram_threshold import histogram_thresholds, threshold_from_histogram
+from infer_subc.workflow.workflow import Workflow
+from infer_subc.workflow.workflow_definition import WorkflowDefinition
+from infer_subc.workflow.workflow_step import WorkflowStep
+from infer_subc.workflow.instrumentation import StepRecorder
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = (1024, 1024)  # YX
+
+# a chunked implementation gets the step, its (dask) input images and its parameters, and returns the
+#   (lazy) result, or None when the step has to be run on the whole image after all
+ChunkedImplementation = Callable[[WorkflowStep, List[da.Array], Dict[str, Any]], Union[da.Array, None]]
+
+
+class ChunkedWorkflow(Workflow):
+    """
+    Workflow executed out-of-core on dask chunks of `chunk_size` pixels in YX (Z and the leading dimensions
+    are never split), so that images several times larger than memory can be segmented on a single node.
+
+    Each step is run according to its entry in CHUNKED_STEPS:
+      - element-wise and indexing steps are applied lazily to the dask arrays,
+      - local filters are run chunk by chunk with dask's map_overlap, with a halo sized from the step
+        parameters (gaussian sigma, median size, filter scales) so the stitched result has no seams and is
+        identical to the in-memory result,
+      - steps depending on global image values (min-max scaling, otsu threshold, the vesselness of the filament
+        filter) compute those values as explicit dask reductions first, then run chunk by chunk,
+      - hole filling and size filtering run chunk by chunk with a halo larger than the holes filled and the
+        objects removed,
+      - the masked object threshold labels its objects chunk by chunk (merging the labels across chunk faces)
+        and thresholds each object from a histogram reduced over the chunks.
+    Any other step needs the whole image: its inputs are computed and the step function runs in memory, so peak
+    memory is set by those steps.  Among the steps of the organelle configurations these are the labeling
+    steps (label_uint16...), topology_preserving_thinning, the watershed based steps of the masks workflows,
+    apply_threshold with a method other than otsu and masked_object_thresh on integer images.
+
+    Results are lazy until they are needed in memory: the final result and the `keep_results` are always
+    computed.  Steps are not cached, and recorded step times only cover building the lazy graph of the
+    chunked steps (their computation is accounted to the step that materializes them).
+    """
+
+    def __init__(
+        self,
+        workflow_definition: WorkflowDefinition,
+        input_image: Union[np.ndarray, da.Array],
+        chunk_size: Tuple[int, int] = DEFAULT_CHUNK_SIZE,
+        release_intermediates: bool = False,
+        keep_results: Union[List[int], None] = None,
+        recorder: Union[StepRecorder, None] = None,
+    ):
+        if chunk_size is None or len(chunk_size) != 2:
+            raise ValueError("chunk_size must be a (Y, X) tuple")
+
+        self._chunk_size = tuple(chunk_size)
+        super().__init__(
+            workflow_definition,
+            input_image,
+            release_intermediates=release_intermediates,
+            keep_results=keep_results,
+            recorder=recorder,
+        )
+        self._starting_image = self._as_chunked(input_image)
+
+    @property
+    def chunk_size(self) -> Tuple[int, int]:
+        return self._chunk_size
+
+    def _execute_step_cached(
+        self,
+        step_index: int,
+        image: List[Any],
+        parameters: Dict[str, Any],
+        input_keys: Union[List[str], None] = None,
+    ) -> Tuple[Any, bool]:
+        step = self._definition.steps[step_index]
+        result = self._execute_chunked(step, image, parameters or dict())
+        if step_index in self._keep_results:
+            result = _materialize(result)
+        return result, False
+
+    def _execute_chunked(self, step: WorkflowStep, image: List[Any], parameters: Dict[str, Any]) -> Any:
+        """
+        Run a step on chunked images
+
+        Returns
+            (da.Array): lazy step result (or whatever the step function returns if it is not an image)
+        """
+        images = [self._as_chunked(im) for im in image]
+        implementation = CHUNKED_STEPS.get(f"{step.function.module}.{step.function.function}")
+        if implementation is not None:
+            result = implementation(step, images, parameters)
+            if result is not None:
+                return result
+
+        log.info(f"Step #{step.step_number} ({step.function.function}) runs on the whole image")
+        result = step.execute([_materialize(im) for im in images], parameters)
+        return self._as_chunked(result)
+
+    def _as_chunked(self, image: Any) -> Any:
+        """
+        Wrap numpy arrays in dask arrays and align dask arrays to the workflow chunks.  Anything else (e.g.
+        a list of images or a scalar) is returned as is
+        """
+        if isinstance(image, np.ndarray):
+            return da.from_array(image, chunks=self._get_chunks(image.ndim))
+        if isinstance(image, da.Array):
+            return image.rechunk(self._get_chunks(image.ndim))
+        return image
+
+    def _get_chunks(self, ndim: int) -> Union[Tuple[int, ...], str]:
+        if ndim < 2:
+            return "auto"
+        return (-1,) * (ndim - 2) + self._chunk_size
+
+
+def _materialize(image: Any) -> Any:
+    if isinstance(image, da.Array):
+        return image.compute()
+    return image
+
+
+def _lazy_step(step: WorkflowStep, images: List[da.Array], parameters: Dict[str, Any]) -> da.Array:
+    """
+    Steps that work on dask arrays as they are (indexing, element-wise numpy functions)
+    """
+    return step.execute(images, parameters)
+
+
+def _local_step(halo: Callable[[Dict[str, Any]], int], dtype: Union[type, None] = None) -> ChunkedImplementation:
+    """
+    Build the implementation of a local filter, run chunk by chunk with a YX halo of `halo(parameters)` pixels
+
+    Params:
+        halo (Callable): radius (in pixels) of the filter footprint, from the step parameters
+        dtype (type): dtype of the step output (default: dtype of the first input)
+    """
+
+    def execute(step: WorkflowStep, images: List[da.Array], parameters: Dict[str, Any]) -> da.Array:
+        return _map_overlap(lambda *blocks: step.execute(list(blocks), parameters), images, halo(parameters), dtype)
+
+    return execute
+
+
+def _map_overlap(function: Callable, images: List[da.Array], halo: int, dtype: Union[type, None] = None) -> da.Array:
+    """
+    Run `function` on every chunk (extended by `halo` pixels in YX) of `images`.  boundary="none" leaves the
+    image edges unpadded, so the filters handle them exactly as they do on the whole image
+    """
+    ndim = images[0].ndim
+    dtype = np.dtype(dtype if dtype is not None else images[0].dtype)
+    meta = np.empty((0,) * ndim, dtype=dtype)
+    if halo == 0:
+        return da.map_blocks(function, *images, dtype=dtype, meta=meta)
+    depth = {ndim - 2: halo, ndim - 1: halo}
+    return da.map_overlap(function, *images, depth=depth, boundary="none", dtype=dtype, meta=meta)
+
+
+def _gaussian_halo(sigma: float, truncate: float) -> int:
+    # same radius as scipy.ndimage.gaussian_filter
+    return int(truncate * float(sigma) + 0.5)
+
+
+def _dot_filter_halo(parameters: Dict[str, Any]) -> int:
+    # gaussian_laplace truncates the kernel at 4 sigma
+    scales = [parameters.get(f"dot_scale_{i}", 0) for i in (1, 2, 3)]
+    return max([_gaussian_halo(scale, 4.0) for scale in scales if scale > 0] + [0])
+
+
+def _hessian_halo(sigma: float) -> int:
+    # aicssegmentation's hessian: gaussian smoothing truncated at 3 sigma, then two central differences
+    return _gaussian_halo(sigma, 3.0) + 2
+
+
+def _vesselness_with_minimum(vesselness: Callable, eigenvalues: List[np.ndarray], minimum: Any) -> np.ndarray:
+    """
+    aicssegmentation's vesselness functions clip the (last) eigenvalues at tau times their minimum over the
+    whole image.  Run on a chunk, they are given that minimum as an extra (discarded) element.  The halo
+    eigenvalues, computed without their full neighborhood, can be lower than the minimum of the image and are
+    raised to it (the valid ones are not lower), so the chunk is clipped at the minimum and its result is the
+    whole-image result
+    """
+    shape = eigenvalues[0].shape
+    flat = [np.append(e.ravel(), e.dtype.type(minimum)) for e in eigenvalues]
+    flat[-1] = np.maximum(flat[-1], flat[-1][-1])
+    return vesselness(*flat, tau=1)[:-1].reshape(shape)
+
+
+def _filament_response_3d(img: da.Array, sigma: float) -> da.Array:
+    """
+    filament_response with method "3D": the minimum of the third hessian eigenvalue is reduced first, then
+    the vesselness is computed chunk by chunk
+    """
+    halo = _hessian_halo(sigma)
+    dtype = img.dtype if img.dtype.kind == "f" else np.dtype(np.float64)
+
+    def eigenvalues(block: np.ndarray) -> List[np.ndarray]:
+        return absolute_3d_hessian_eigenvalues(block, sigma=sigma, scale=True, whiteonblack=True)
+
+    eigen_min = _map_overlap(lambda block: eigenvalues(block)[2], [img], halo, dtype).min().compute()
+
+    def response(block: np.ndarray) -> np.ndarray:
+        eigen = eigenvalues(block)
+        return _vesselness_with_minimum(compute_vesselness3D, [eigen[1], eigen[2]], eigen_min)
+
+    return _map_overlap(response, [img], halo, dtype)
+
+
+def _filament_response_slices(img: da.Array, sigma: float) -> da.Array:
+    """
+    filament_response with method "slice_by_slice": every plane is filtered side by side with the maximum
+    intensity projection (see _filament_response_slice), so the planes are extended along X with the projection,
+    the minimum of the second eigenvalue of every extended plane is reduced, then the vesselness is computed
+    chunk by chunk.  The projection half and the 3 last columns of the planes are dropped
+    """
+    halo = _hessian_halo(sigma)
+    n_x = img.shape[-1]
+    mip = img.max(axis=0)
+    extended = da.concatenate([img, da.broadcast_to(mip, img.shape, chunks=img.chunks)], axis=2)
+
+    def eigen2(plane: np.ndarray) -> np.ndarray:
+        return absolute_3d_hessian_eigenvalues(plane, sigma=sigma, scale=True, whiteonblack=True)[1]
+
+    def block_eigen2(block: np.ndarray) -> np.ndarray:
+        return np.stack([eigen2(plane) for plane in block])
+
+    eigen_dtype = img.dtype if img.dtype.kind == "f" else np.dtype(np.float64)
+    eigen_min = _map_overlap(block_eigen2, [extended], halo, eigen_dtype).min(axis=(1, 2)).compute()
+
+    def response(block: np.ndarray) -> np.ndarray:
+        out = np.empty(block.shape, dtype=img.dtype)
+        for zz, plane in enumerate(block):
+            out[zz] = _vesselness_with_minimum(compute_vesselness2D, [eigen2(plane)], eigen_min[zz])
+        return out
+
+    extended_response = _map_overlap(response, [extended], halo, img.dtype)[:, :, :n_x]
+    columns = da.arange(n_x, chunks=extended_response.chunks[2]) < n_x - 3
+    return da.where(columns, extended_response, 0).astype(img.dtype)
+
+
+def _filament_filter_chunked(
+    step: WorkflowStep, images: List[da.Array], parameters: Dict[str, Any]
+) -> Union[da.Array, None]:
+    """
+    filament_filter_3 on 3D images, the responses of the scales are thresholded and combined lazily.  Other
+    images need the whole image (None)
+    """
+    img = images[0]
+    method = parameters.get("method", "slice_by_slice")
+    if img.ndim != 3 or method not in ("3D", "slice_by_slice"):
+        return None
+
+    seg = da.zeros(img.shape, dtype=bool, chunks=img.chunks)
+    for i in (1, 2, 3):
+        scale = parameters.get(f"filament_scale_{i}", 0)
+        if scale > 0:
+            response = _filament_response_3d(img, scale) if method == "3D" else _filament_response_slices(img, scale)
+            seg = seg | (response > parameters.get(f"filament_cutoff_{i}", 0))
+    return seg
+
+
+def _fill_and_filter_chunked(
+    step: WorkflowStep, images: List[da.Array], parameters: Dict[str, Any]
+) -> Union[da.Array, None]:
+    """
+    fill_and_filter_linear_size: a hole (or an object) of a chunk extending past the halo edge has more pixels
+    than the halo is wide.  With a halo as wide as the largest hole filled plus the smallest object kept, the
+    holes and objects touching the chunk (but not the halo edge) are classified as on the whole image, and so
+    are the others: they are too large to be filled or removed, on the whole image too.  A halo as large as
+    the image needs the whole image (None)
+    """
+    power = 3 if parameters.get("method", "slice_by_slice") == "3D" else 2
+    halo = parameters.get("hole_max", 0) ** power + parameters.get("min_size", 0) ** power
+    if halo >= min(images[0].shape[-2:]):
+        return None
+
+    def fill_and_filter(block: np.ndarray) -> np.ndarray:
+        # an empty chunk is returned as is by fill_and_filter_linear_size
+        return np.asarray(step.execute([block], parameters)).astype(bool, copy=False)
+
+    return _map_overlap(fill_and_filter, images, halo, bool)
+
+
+class _DaskBlocks:
+    """
+    A dask array seen by the histogram thresholds (see infer_subc.core.histogram_threshold) as the sequence of
+    its chunks: `blocks[i:j]` computes the values of the chunks i to j - 1, so the histogram is built one chunk
+    at a time.  Histograms don't depend on where the values are
+    """
+
+    def __init__(self, image: da.Array):
+        self._blocks = image.to_delayed().ravel()
+        self.dtype = image.dtype
+        self.shape = (len(self._blocks),)
+
+    def __getitem__(self, index: slice) -> np.ndarray:
+        return np.concatenate([np.ravel(block) for block in dask.compute(*self._blocks[index])])
+
+
+def _label_chunked(mask: da.Array) -> Tuple[da.Array, int]:
+    """
+    1-connected components of a chunked mask.  Every chunk is labeled on its own, the labels touching across
+    chunk faces are merged (connected components of the graph of touching labels), and the chunks are labeled
+    again with the merged labels when they are computed, so the whole label image is never in memory.
+    Objects are numbered in another order than skimage.measure.label would
+
+    Returns
+        (da.Array, int): lazy labels and number of objects
+    """
+    structure = generate_binary_structure(mask.ndim, 1)
+    split_axes = [axis for axis in range(mask.ndim) if mask.numblocks[axis] > 1]
+
+    def label_block(block: np.ndarray) -> np.ndarray:
+        labels = np.empty(block.shape, dtype=np.int64)
+        ndi_label(block, structure, output=labels)
+        return labels
+
+    def block_summary(block: np.ndarray) -> Tuple[int, Dict[int, Tuple[np.ndarray, np.ndarray]]]:
+        labels = label_block(block)
+        faces = {axis: (labels.take(0, axis=axis), labels.take(-1, axis=axis)) for axis in split_axes}
+        return labels.max(), faces
+
+    blocks = mask.to_delayed()
+    summaries = dask.compute(*[dask.delayed(block_summary)(block) for block in blocks.ravel()])
+    counts = np.array([count for count, _ in summaries], dtype=np.int64).reshape(blocks.shape)
+    offsets = (np.cumsum(counts.ravel()) - counts.ravel()).reshape(blocks.shape)
+    faces = np.empty(blocks.shape, dtype=object)
+    for index, (_, block_faces) in zip(np.ndindex(blocks.shape), summaries):
+        faces[index] = block_faces
+
+    # pairs of (global) labels touching across the faces between neighbouring chunks
+    first, second = [np.zeros(1, dtype=np.int64)], [np.zeros(1, dtype=np.int64)]
+    for index in np.ndindex(blocks.shape):
+        for axis in split_axes:
+            if index[axis] + 1 == blocks.shape[axis]:
+                continue
+            neighbour = index[:axis] + (index[axis] + 1,) + index[axis + 1 :]
+            low, high = faces[index][axis][1], faces[neighbour][axis][0]
+            touching = (low > 0) & (high > 0)
+            first.append(low[touching] + offsets[index])
+            second.append(high[touching] + offsets[neighbour])
+
+    n_labels = int(counts.sum()) + 1
+    graph = coo_matrix(
+        (np.ones(sum([len(f) for f in first]), dtype=bool), (np.concatenate(first), np.concatenate(second))),
+        shape=(n_labels, n_labels),
+    )
+    # the background (label 0) is the first node, so it is component 0
+    n_components, merged = connected_components(graph, directed=False)
+
+    def relabel_block(block: np.ndarray, block_id: Tuple[int, ...] = None) -> np.ndarray:
+        labels = label_block(block)
+        labels[labels > 0] += offsets[block_id]
+        return merged[labels]
+
+    labels = da.map_blocks(relabel_block, mask, dtype=merged.dtype, meta=np.empty((0,) * mask.ndim, merged.dtype))
+    return labels, n_components - 1
+
+
+def _local_labels(labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    the labels present in a chunk and the chunk relabeled 0..n (the positions in that list)
+    """
+    present, local = np.unique(labels, return_inverse=True)
+    return present, local.reshape(labels.shape)
+
+
+def _masked_object_thresh_chunked(
+    step: WorkflowStep, images: List[da.Array], parameters: Dict[str, Any]
+) -> Union[da.Array, None]:
+    """
+    masked_object_thresh: the global thresholds come from a histogram reduced chunk by chunk, the objects are
+    labeled chunk by chunk (see _label_chunked), and the local otsu threshold of each object comes from its
+    histogram, reduced over the chunks with the bins skimage would use (256 bins over the object's intensity
+    range).  Integer images need the whole image (None)
+    """
+    img = images[0]
+    if img.dtype.kind != "f":
+        return None
+
+    global_method = parameters["global_method"]
+    cutoff_size = parameters["cutoff_size"]
+    local_adjust = parameters["local_adjust"]
+    extra_criteria = parameters.get("extra_criteria", True)
+
+    methods = [global_method, "otsu"] if extra_criteria else [global_method]
+    global_thresholds = histogram_thresholds(_DaskBlocks(img), methods)
+    labels, n_objects = _label_chunked(img > global_thresholds[global_method])
+
+    # size and intensity range of every object
+    def block_stats(block: np.ndarray, block_labels: np.ndarray) -> Tuple[np.ndarray, ...]:
+        present, local = _local_labels(block_labels)
+        index = np.arange(len(present))
+        sizes = np.bincount(local.ravel(), minlength=len(present))
+        return present, sizes, minimum(block, local, index), maximum(block, local, index)
+
+    sizes = np.zeros(n_objects + 1, dtype=np.int64)
+    mins = np.full(n_objects + 1, np.inf, dtype=img.dtype)
+    maxs = np.full(n_objects + 1, -np.inf, dtype=img.dtype)
+    pairs = zip(img.to_delayed().ravel(), labels.to_delayed().ravel())
+    for present, block_sizes, block_mins, block_maxs in dask.compute(
+        *[dask.delayed(block_stats)(block, block_labels) for block, block_labels in pairs]
+    ):
+        sizes[present] += block_sizes
+        np.minimum.at(mins, present, np.asarray(block_mins, dtype=img.dtype))
+        np.maximum.at(maxs, present, np.asarray(block_maxs, dtype=img.dtype))
+
+    kept = np.flatnonzero(sizes >= cutoff_size)
+    kept = kept[kept > 0]
+    row = np.full(n_objects + 1, -1, dtype=np.int64)
+    row[kept] = np.arange(len(kept))
+
+    # histogram of every kept (non constant) object
+    def block_histograms(block: np.ndarray, block_labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        present, local = _local_labels(block_labels)
+        rows, histograms = list(), list()
+        for i, bbox in enumerate(find_objects(local + 1)):
+            obj = present[i]
+            if bbox is None or row[obj] < 0 or mins[obj] == maxs[obj]:
+                continue
+            values = block[bbox][local[bbox] == i]
+            rows.append(row[obj])
+            histograms.append(np.histogram(values, bins=256, range=(mins[obj], maxs[obj]))[0])
+        return np.array(rows, dtype=np.int64), np.array(histograms, dtype=np.int64).reshape(-1, 256)
+
+    counts = np.zeros((len(kept), 256), dtype=np.int64)
+    pairs = zip(img.to_delayed().ravel(), labels.to_delayed().ravel())
+    for rows, histograms in dask.compute(
+        *[dask.delayed(block_histograms)(block, block_labels) for block, block_labels in pairs]
+    ):
+        np.add.at(counts, rows, histograms)
+
+    # local otsu threshold of every kept object, same criteria as masked_object_thresh (+inf: discarded)
+    local_cutoff = 0.333 * global_thresholds["otsu"] if extra_criteria else None
+    object_thresholds = np.full(n_objects + 1, np.inf)
+    for obj in kept:
+        if mins[obj] == maxs[obj]:
+            # skimage's threshold_otsu returns the value of a constant image
+            local_otsu = mins[obj]
+        else:
+            bin_edges = np.histogram_bin_edges(np.empty(0, dtype=img.dtype), bins=256, range=(mins[obj], maxs[obj]))
+            local_otsu = threshold_from_histogram(counts[row[obj]], (bin_edges[:-1] + bin_edges[1:]) / 2.0, "otsu")
+        if local_cutoff is not None and not local_otsu > local_cutoff:
+            continue
+        object_thresholds[obj] = local_otsu * local_adjust
+
+    def threshold_block(block: np.ndarray, block_labels: np.ndarray) -> np.ndarray:
+        present, local = _local_labels(block_labels)
+        out = np.zeros(block.shape, dtype=bool)
+        for i, bbox in enumerate(find_objects(local + 1)):
+            threshold = object_thresholds[present[i]]
+            if bbox is None or present[i] == 0 or np.isinf(threshold):
+                continue
+            # compared to the same (scalar) threshold as in masked_object_thresh
+            out[bbox] |= np.logical_and(block[bbox] > threshold, local[bbox] == i)
+        return out
+
+    return da.map_blocks(threshold_block, img, labels, dtype=bool, meta=np.empty((0,) * img.ndim, dtype=bool))
+
+
+def _scale_and_smooth_chunked(step: WorkflowStep, images: List[da.Array], parameters: Dict[str, Any]) -> da.Array:
+    """
+    scale_and_smooth: the min-max normalization is a global reduction, then the median and gaussian filters run
+    chunk by chunk
+    """
+    median_size = parameters.get("median_size", 1)
+    gauss_sigma = parameters.get("gauss_sigma", 1.34)
+    slice_by_slice = parameters.get("slice_by_slice", True)
+    scale = parameters.get("scale") if not slice_by_slice else None
+    strech_min, strech_max = dask.compute(images[0].min(), images[0].max())
+
+    dtype = get_float_dtype_for(images[0].dtype)
+
+    def smooth(block: np.ndarray) -> np.ndarray:
+        # same arithmetic as min_max_intensity_normalization
+        img = (block.astype(dtype, copy=False) - strech_min + 1e-8) / (strech_max - strech_min + 1e-8)
+        return median_gaussian_smoothing(img, median_size, gauss_sigma, slice_by_slice, scale, in_place=True)
+
+    # YX filter radius, as the 3D filters may be scaled differently along Y and X
+    ndim = images[0].ndim
+    median_sizes = get_anisotropic_sizes(median_size, scale, ndim) if median_size > 1 else (1,) * ndim
+    sigmas = get_anisotropic_sizes(gauss_sigma, scale, ndim)
+    halo = max(
+        [int(round(median_sizes[axis])) // 2 + _gaussian_halo(sigmas[axis], 3.0) for axis in (ndim - 2, ndim - 1)]
+    )
+    return _map_overlap(smooth, images, halo, dtype)
+
+
+def _apply_threshold_chunked(
+    step: WorkflowStep, images: List[da.Array], parameters: Dict[str, Any]
+) -> Union[da.Array, None]:
+    """
+    apply_threshold with the otsu method: the histogram is reduced chunk by chunk, then the mask is lazy.
+    Other methods need the whole image (None)
+    """
+    img = images[0]
+    if parameters.get("method", "otsu") != "otsu" or img.dtype.kind != "f":
+        return None
+
+    img_min, img_max = dask.compute(img.min(), img.max())
+    if img_min == img_max:
+        threshold = img_min
+    else:
+        # same bins as skimage's histogram of a float image: np.histogram over (min, max)
+        def block_histogram(block: np.ndarray) -> np.ndarray:
+            return np.histogram(block, bins=256, range=(img_min, img_max))[0]
+
+        block_counts = [dask.delayed(block_histogram)(block) for block in img.to_delayed().ravel()]
+        counts = np.sum(dask.compute(*block_counts), axis=0)
+        bin_edges = np.histogram_bin_edges(np.empty(0, dtype=img.dtype), bins=256, range=(img_min, img_max))
+        bin_centers = (bin_edges[:-1] + bin_edges[1:]) / 2.0
+        threshold = threshold_otsu(hist=(counts, bin_centers))
+
+    threshold = threshold * parameters.get("thresh_factor", 1.0)
+    if parameters.get("thresh_min") is not None:
+        threshold = max(threshold, parameters["thresh_min"])
+    if parameters.get("thresh_max") is not None:
+        threshold = min(threshold, parameters["thresh_max"])
+    return img > threshold
+
+
+# chunked implementations by "module.function".  Steps not listed run on the whole image
+CHUNKED_STEPS: Dict[str, ChunkedImplementation] = {
+    "infer_subc.core.img.select_channel_from_raw": _lazy_step,
+    "infer_subc.core.img.select_z_from_raw": _lazy_step,
+    "numpy.logical_or": _lazy_step,
+    "numpy.logical_and": _lazy_step,
+    "infer_subc.core.img.apply_mask": _local_step(lambda p: 0),
+    "infer_subc.core.img.min_max_intensity_normalization": _lazy_step,
+    "infer_subc.core.img.median_filter_slice_by_slice": _local_step(lambda p: p["size"] // 2),
+    "aicssegmentation.core.pre_processing_utils.image_smoothing_gaussian_slice_by_slice": _local_step(
+        lambda p: _gaussian_halo(p["sigma"], p.get("truncate_range", 3.0))
+    ),
+    "infer_subc.core.img.dot_filter_3": _local_step(_dot_filter_halo, dtype=bool),
+    "infer_subc.core.img.filament_filter_3": _filament_filter_chunked,
+    "infer_subc.core.img.fill_and_filter_linear_size": _fill_and_filter_chunked,
+    "infer_subc.core.img.masked_object_thresh": _masked_object_thresh_chunked,
+    "infer_subc.core.img.scale_and_smooth": _scale_and_smooth_chunked,
+    "infer_subc.core.img.apply_threshold": _apply_threshold_chunked,
+}
@@ -0,0 +1,158 @@
+import json
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any, List, Union
+from infer_subc.workflow.workflow_step import WorkflowStep
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+
+@dataclass
+class StepRecord:
+    """
+    Measurements of a single workflow step execution
+    """
+
+    workflow: str
+    step_number: int
+    function: str
+    file: str = None
+    wall_time: float = 0.0  # seconds
+    cpu_time: float = 0.0  # seconds, of the whole process
+    peak_rss_delta: int = None  # bytes the process' peak resident memory grew by during the step
+    input_shapes: List[List[int]] = field(default_factory=list)
+    input_dtypes: List[str] = field(default_factory=list)
+    output_shape: List[int] = None
+    output_dtype: str = None
+    cached: bool = False
+
+    def set_output(self, result: Any, cached: bool = False):
+        self.output_shape, self.output_dtype = _describe(result)
+        self.cached = cached
+
+
+class StepRecorder:
+    """
+    Records a StepRecord for every workflow step executed by the Workflows it is given to.
+
+    Records are kept in memory for `summary()` and, if `jsonl_path` is given, appended to that file as one
+    json object per line as soon as each step is done.
+
+    Notes: cpu time and peak RSS are measured for the whole process, so they also account for the other
+    steps running at the same time when steps are run on a thread pool.  The peak RSS delta is how much a
+    step raised the process' memory high-water mark: a step that stays below an earlier peak records 0.
+    """
+
+    def __init__(self, jsonl_path: Union[str, Path, None] = None):
+        self._jsonl_path = Path(jsonl_path) if jsonl_path is not None else None
+        self._records: List[StepRecord] = list()
+        self.file: Union[str, None] = None  # name of the file being processed, added to the records
+
+    @property
+    def records(self) -> List[StepRecord]:
+        return self._records
+
+    @property
+    def jsonl_path(self) -> Union[Path, None]:
+        return self._jsonl_path
+
+    @contextmanager
+    def measure(self, workflow_name: str, step: WorkflowStep, input_images: List[np.ndarray]):
+        """
+        Measure the code run inside the `with` block as one execution of `step`.
+        The StepRecord is yielded so the step output can be added to it with StepRecord.set_output()
+        """
+        record = StepRecord(
+            workflow=workflow_name,
+            step_number=step.step_number,
+            function=f"{step.function.module}.{step.function.function}",
+            file=self.file,
+        )
+        for image in input_images or []:
+            shape, dtype = _describe(image)
+            record.input_shapes.append(shape)
+            record.input_dtypes.append(dtype)
+
+        start_rss = _get_peak_rss()
+        start_cpu = time.process_time()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.wall_time = time.perf_counter() - start
+            record.cpu_time = time.process_time() - start_cpu
+            if start_rss is not None:
+                record.peak_rss_delta = _get_peak_rss() - start_rss
+            self.add([record])
+
+    def add(self, records: List[StepRecord]):
+        """
+        Add records (e.g. measured in another process) and write them to the jsonl file
+        """
+        self._records.extend(records)
+        if self._jsonl_path is not None and len(records) > 0:
+            with open(self._jsonl_path, "a") as writer:
+                for record in records:
+                    writer.write(f"{json.dumps(asdict(record))}\n")
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Summary table of the recorded steps, see summarize_step_records()
+        """
+        return summarize_step_records(self._records)
+
+
+def summarize_step_records(records: List[StepRecord]) -> pd.DataFrame:
+    """
+    Summarize step records per workflow and step
+
+    Params:
+        records (List[StepRecord]): records to summarize, e.g. StepRecorder.records
+
+    Returns
+        (pd.DataFrame): one row per (workflow, step_number, function) with the number of executions, total and
+                        mean wall time, total cpu time, largest peak RSS delta and number of cache hits. Rows are
+                        sorted by workflow and descending total wall time
+    """
+    columns = ["workflow", "step_number", "function"]
+    if len(records) == 0:
+        return pd.DataFrame(
+            columns=columns + ["count", "wall_time", "mean_wall_time", "cpu_time", "max_peak_rss_delta", "cached"]
+        )
+
+    df = pd.DataFrame([asdict(record) for record in records])
+    summary = df.groupby(columns, as_index=False).agg(
+        count=("wall_time", "size"),
+        wall_time=("wall_time", "sum"),
+        mean_wall_time=("wall_time", "mean"),
+        cpu_time=("cpu_time", "sum"),
+        max_peak_rss_delta=("peak_rss_delta", "max"),
+        cached=("cached", "sum"),
+    )
+    return summary.sort_values(["workflow", "wall_time"], ascending=[True, False], ignore_index=True)
+
+
+def _describe(image: Any):
+    if isinstance(image, np.ndarray):
+        return list(image.shape), str(image.dtype)
+    return None, type(image).__name__
+
+
+def _get_peak_rss() -> Union[int, None]:
+    """
+    Peak resident set size of this process in bytes (None where unavailable)
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
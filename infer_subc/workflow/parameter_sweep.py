@@ -0,0 +1,291 @@
+import inspect
+import itertools
+import logging
+import numpy as np
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Union
+from infer_subc.exceptions import ArgumentNullError
+from infer_subc.core.label_reductions import label_index
+from infer_subc.core.response_cache import response_cache_enabled
+from infer_subc.workflow.workflow import Workflow
+from infer_subc.workflow.workflow_config import WorkflowConfig
+from infer_subc.workflow.workflow_definition import WorkflowDefinition
+from infer_subc.workflow.workflow_planner import WorkflowPlanner
+from infer_subc.workflow.workflow_step import WorkflowStep, WorkflowStepCategory
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class SweepStage:
+    """
+    One stage of an organelle inference function, as a workflow step (see all_functions.json)
+    """
+
+    function: str  # function identifier in all_functions.json
+    category: str
+    parent: List[int]  # stage numbers (1 indexed) of the inputs, 0 is the input image
+    parameters: Dict[str, str] = field(default_factory=dict)  # step parameter name -> inference function argument
+
+
+def _dot_stage(parent: int, method: str = "dot_method") -> SweepStage:
+    return SweepStage(
+        "dot_filter_3",
+        "core",
+        [parent],
+        {
+            "dot_scale_1": "dot_scale_1",
+            "dot_cutoff_1": "dot_cut_1",
+            "dot_scale_2": "dot_scale_2",
+            "dot_cutoff_2": "dot_cut_2",
+            "dot_scale_3": "dot_scale_3",
+            "dot_cutoff_3": "dot_cut_3",
+            "method": method,
+        },
+    )
+
+
+def _filament_stage(parent: int) -> SweepStage:
+    return SweepStage(
+        "filament_filter_3",
+        "core",
+        [parent],
+        {
+            "filament_scale_1": "fil_scale_1",
+            "filament_cutoff_1": "fil_cut_1",
+            "filament_scale_2": "fil_scale_2",
+            "filament_cutoff_2": "fil_cut_2",
+            "filament_scale_3": "fil_scale_3",
+            "filament_cutoff_3": "fil_cut_3",
+            "method": "fil_method",
+        },
+    )
+
+
+def _fill_filter_stage(
+    parent: int, hole_min: str = "min_hole_w", hole_max: str = "max_hole_w", min_size: str = "small_obj_w"
+) -> SweepStage:
+    return SweepStage(
+        "fill_and_filter_linear_size",
+        "postprocessing",
+        [parent],
+        {"hole_min": hole_min, "hole_max": hole_max, "min_size": min_size, "method": "fill_filter_method"},
+    )
+
+
+def _extract_stages(channel: str) -> List[SweepStage]:
+    return [
+        SweepStage("select_channel_from_raw", "extraction", [0], {"chan": channel}),
+        SweepStage("scale_and_smooth", "preprocessing", [1], {"median_size": "median_sz", "gauss_sigma": "gauss_sig"}),
+    ]
+
+
+def _label_stage(parent: int, function: str = "label_uint16") -> SweepStage:
+    return SweepStage(function, "postpostprocessing", [parent])
+
+
+# the stages of the organelle inference functions, by function name.  Each list runs the same steps as the
+#   function itself, so sweep_infer can merge the stages shared by the grid points.  Other inference
+#   functions can be swept by adding their stages here (and their parameters to tests/test_parameter_sweep.py,
+#   which checks every entry against its function)
+SWEEP_STAGES: Dict[str, List[SweepStage]] = {
+    "infer_lyso": _extract_stages("lyso_ch")
+    + [
+        _dot_stage(2),
+        _filament_stage(2),
+        SweepStage("logical_or", "core", [3, 4]),
+        _fill_filter_stage(5),
+        _label_stage(6),
+    ],
+    "infer_mito": _extract_stages("mito_ch")
+    + [
+        _dot_stage(2),
+        _filament_stage(2),
+        SweepStage("logical_or", "core", [3, 4]),
+        _fill_filter_stage(5),
+        _label_stage(6),
+    ],
+    "infer_golgi": _extract_stages("golgi_ch")
+    + [
+        SweepStage(
+            "masked_object_thresh",
+            "core",
+            [2],
+            {"global_method": "mo_method", "cutoff_size": "mo_cutoff_size", "local_adjust": "mo_adjust"},
+        ),
+        SweepStage(
+            "topology_preserving_thinning", "core", [3], {"min_thickness": "min_thickness", "thin": "thin_dist"}
+        ),
+        _dot_stage(2),
+        SweepStage("logical_or", "core", [5, 4]),
+        _fill_filter_stage(6),
+        _label_stage(7),
+    ],
+    "infer_perox": _extract_stages("perox_ch")
+    + [
+        _dot_stage(2),
+        _fill_filter_stage(3, "hole_min_width", "hole_max_width", "small_object_width"),
+        _label_stage(4),
+    ],
+    "infer_LD": _extract_stages("LD_ch")
+    + [
+        SweepStage(
+            "apply_threshold",
+            "core",
+            [2],
+            {
+                "method": "method",
+                "thresh_factor": "thresh_factor",
+                "thresh_min": "thresh_min",
+                "thresh_max": "thresh_max",
+            },
+        ),
+        _fill_filter_stage(3),
+        _label_stage(4),
+    ],
+    "infer_ER": _extract_stages("ER_ch")
+    + [
+        SweepStage(
+            "masked_object_thresh",
+            "core",
+            [2],
+            {"global_method": "MO_thresh_method", "cutoff_size": "MO_cutoff_size", "local_adjust": "MO_thresh_adj"},
+        ),
+        _filament_stage(2),
+        SweepStage("logical_or", "core", [3, 4]),
+        _fill_filter_stage(5),
+        _label_stage(6, "label_bool_as_uint16"),
+    ],
+}
+
+
+def sweep_infer(
+    infer_function: Union[Callable, str],
+    in_img: np.ndarray,
+    base_params: Dict[str, Any],
+    grid: Dict[str, List[Any]],
+    summary: bool = False,
+    parallel: bool = False,
+    max_workers: Union[int, None] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run an organelle inference function (e.g. infer_lyso) for every point of a parameter grid, computing the
+    stages the grid points share only once.
+
+    The function is run as a workflow of its stages (see SWEEP_STAGES), one per grid point, and the workflows
+    are merged by a WorkflowPlanner: e.g. sweeping the dot filter cutoffs extracts and smooths the channel
+    once, and only runs the filters, fill/filter and labeling per point.  The dot and filament filter
+    responses are also reused across cutoffs: the response cache is enabled during the sweep (see
+    infer_subc.core.response_cache).  Intermediate results are released as soon as no grid point needs them
+    anymore.
+
+    Params:
+        infer_function (Callable or str): organelle inference function, or its name (a key of SWEEP_STAGES)
+        in_img (np.ndarray): image containing all the channels (CZYX)
+        base_params (Dict): arguments of the inference function (but `in_img`) common to all grid points
+        grid (Dict[str, List]): values taken by the swept arguments.  Every combination is run
+        summary (bool): if True return the object count and volume (voxels) of each grid point instead of its
+                        labels
+        parallel (bool): run the independent stages (e.g. the tails of the grid points) concurrently on a
+                         thread pool
+        max_workers (int): number of threads when `parallel` is True
+
+    Returns
+        (List[Dict]): one entry per grid point, in grid order (the last argument of `grid` varies fastest):
+                      {"parameters": swept values, "labels": labels} or, with `summary`,
+                      {"parameters": swept values, "count": number of objects, "volume": number of voxels}
+    """
+    if infer_function is None:
+        raise ArgumentNullError("infer_function")
+    if in_img is None:
+        raise ArgumentNullError("in_img")
+
+    name = infer_function if isinstance(infer_function, str) else infer_function.__name__
+    stages = SWEEP_STAGES.get(name)
+    if stages is None:
+        raise ValueError(f"{name} cannot be swept, the stages of {sorted(SWEEP_STAGES.keys())} are known")
+
+    points = make_grid(grid or dict())
+    arguments = {a for stage in stages for a in stage.parameters.values()}
+    unknown = sorted(set(base_params or dict()).union(*points) - arguments)
+    if len(unknown) > 0:
+        raise ValueError(f"{name} has no arguments {unknown}")
+    if not isinstance(infer_function, str):
+        _check_arguments(infer_function, arguments)
+
+    functions = {f.name: f for f in WorkflowConfig().get_all_functions()}
+    definitions = list()
+    for i, point in enumerate(points):
+        values = {**(base_params or dict()), **point}
+        missing = sorted(arguments - set(values.keys()))
+        if len(missing) > 0:
+            raise ValueError(f"no value for the {name} arguments {missing}")
+        definitions.append(_build_definition(f"{name} #{i}", stages, values, functions))
+
+    planner = WorkflowPlanner(definitions)
+    log.info(f"Sweeping {name} over {len(points)} points: {planner.merged_steps} of {planner.total_steps} steps run")
+    workflow = Workflow(
+        planner.workflow_definition, in_img, release_intermediates=True, keep_results=planner.output_steps
+    )
+    with response_cache_enabled():
+        workflow.execute_all(parallel=parallel, max_workers=max_workers)
+
+    results = list()
+    for point, labels in zip(points, planner.get_results(workflow)):
+        if summary:
+            count = len(label_index(labels))
+            results.append({"parameters": point, "count": count, "volume": np.count_nonzero(labels)})
+        else:
+            results.append({"parameters": point, "labels": labels})
+    return results
+
+
+def make_grid(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """
+    All the combinations of the values of a parameter grid
+
+    Params:
+        grid (Dict[str, List]): values of each parameter, e.g. {"dot_cut_1": [0.01, 0.02], "dot_scale_1": [1, 2]}
+
+    Returns
+        (List[Dict]): one dictionary of parameter values per grid point.  The last parameter varies fastest
+    """
+    names = list(grid.keys())
+    for key in names:
+        if isinstance(grid[key], (str, bytes)) or not hasattr(grid[key], "__iter__"):
+            raise ValueError(f"the grid values of {key} must be a list")
+    return [dict(zip(names, values)) for values in itertools.product(*[list(grid[key]) for key in names])]
+
+
+def _check_arguments(infer_function: Callable, arguments: set):
+    """
+    Make sure SWEEP_STAGES uses the arguments the inference function actually has
+    """
+    try:
+        signature = inspect.signature(infer_function)
+    except (TypeError, ValueError):
+        return
+    missing = sorted(arguments - set(signature.parameters.keys()))
+    if len(missing) > 0:
+        raise ValueError(f"the sweep stages of {infer_function.__name__} use unknown arguments {missing}")
+
+
+def _build_definition(
+    name: str, stages: List[SweepStage], values: Dict[str, Any], functions: Dict[str, Any]
+) -> WorkflowDefinition:
+    steps = list()
+    for i, stage in enumerate(stages):
+        if stage.function not in functions:
+            raise ValueError(f"{stage.function} is not defined in all_functions.json")
+        parameters = {step_name: values[argument] for step_name, argument in stage.parameters.items()}
+        steps.append(
+            WorkflowStep(
+                category=WorkflowStepCategory.from_str(stage.category),
+                function=functions[stage.function],
+                step_number=i + 1,
+                parent=list(stage.parent),
+                parameter_values=parameters if len(parameters) > 0 else None,
+            )
+        )
+    return WorkflowDefinition(name, steps, prebuilt=False)
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+from pathlib import Path
+from typing import Any, Dict, List, Union
+from infer_subc import get_module_version, get_float_dtype
+from infer_subc.exceptions import ArgumentNullError
+from infer_subc.utils.filesystem import FileSystemUtilities
+from infer_subc.workflow.workflow_step import WorkflowStep
+
+DEFAULT_CACHE_MAX_BYTES = 20 * 2**30  # 20GB
+
+
+class StepCache:
+    """
+    Content-addressed on-disk cache for workflow step results.
+
+    A step result is stored under a hash of (input image digests, python module/function, parameter values,
+    infer_subc version).  Results are saved as .npy files and loaded back memory-mapped (copy-on-write, so
+    steps which modify their inputs in place never alter the cache).  Once the cache directory grows past
+    `max_bytes` the least recently used results are deleted.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path], max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        if cache_dir is None:
+            raise ArgumentNullError("cache_dir")
+
+        self._cache_dir = Path(cache_dir)
+        self._max_bytes = max_bytes
+
+        if not self._cache_dir.exists():
+            FileSystemUtilities.create_directory(self._cache_dir)
+
+    @property
+    def cache_dir(self) -> Path:
+        return self._cache_dir
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @staticmethod
+    def digest_array(image: np.ndarray) -> str:
+        """
+        Digest of an image's content (dtype, shape and pixel values)
+        """
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(f"{image.dtype.str}{image.shape}".encode())
+        hasher.update(np.ascontiguousarray(image).reshape(-1).view(np.uint8))
+        return hasher.hexdigest()
+
+    @staticmethod
+    def step_key(step: WorkflowStep, input_keys: List[str], parameters: Union[Dict[str, Any], None]) -> str:
+        """
+        Cache key of the result of running `step` with `parameters` on the inputs identified by `input_keys`
+
+        Params:
+            step (WorkflowStep): step to execute
+            input_keys (List[str]): digest (or cache key) of each input image
+            parameters (Dict): parameters passed to the step function
+
+        Returns
+            (str): cache key
+        """
+        payload = {
+            "module": step.function.module,
+            "function": step.function.function,
+            "parameters": parameters,
+            "inputs": input_keys,
+            "version": get_module_version(),
+            "float_dtype": str(get_float_dtype()),
+        }
+        payload = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+    def get(self, key: str) -> Union[np.ndarray, None]:
+        """
+        Get a cached result, memory-mapped from disk
+
+        Returns
+            (np.ndarray): cached result, or None if there is no result cached for `key`
+        """
+        path = self._get_path(key)
+        try:
+            result = np.load(path, mmap_mode="c")
+            # mark as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            # not cached (or evicted by another process in the meantime)
+            return None
+        return result
+
+    def put(self, key: str, result: Any):
+        """
+        Store a step result. Only numeric/boolean np.ndarray results are cached
+        """
+        if not isinstance(result, np.ndarray) or result.dtype.hasobject:
+            return
+
+        # write to a temporary file first so other processes never read a partial result
+        path = self._get_path(key)
+        tmp_path = path.with_name(f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as writer:
+            np.save(writer, result)
+        os.replace(tmp_path, path)
+
+        self._evict()
+
+    def clear(self):
+        """
+        Delete all cached results
+        """
+        for path in self._cache_dir.glob("*.npy"):
+            _unlink(path)
+
+    def _evict(self):
+        """
+        Delete the least recently used results until the cache fits in `max_bytes`
+        """
+        entries = list()
+        for path in self._cache_dir.glob("*.npy"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_bytes = sum([size for _, size, _ in entries])
+        for _, size, path in sorted(entries):
+            if total_bytes <= self._max_bytes:
+                break
+            _unlink(path)
+            total_bytes -= size
+
+    def _get_path(self, key: str) -> Path:
+        return self._cache_dir / f"{key}.npy"
+
+
+def _unlink(path: Path):
+    # Path.unlink(missing_ok=True) needs python 3.8.  Another process may have evicted the file already
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,281 @@
+import os
+import socket
+import threading
+import time
+import uuid
+
+from pathlib import Path
+from typing import Dict, List, Union
+from infer_subc.exceptions import ArgumentNullError
+from infer_subc.utils.filesystem import FileSystemUtilities
+
+DEFAULT_HEARTBEAT_TIMEOUT = 600  # seconds
+
+
+class FileWorkQueue:
+    """
+    Work queue kept as lock files in a directory on a shared filesystem, so that workers on several nodes
+    can cooperate on one batch without any other service.
+
+    A task is claimed by atomically creating `<task>.lock` (O_CREAT | O_EXCL) holding a token unique to the
+    claim, and completed by creating `<task>.done`.  While a worker holds locks, a background thread refreshes
+    their modification time every `heartbeat_timeout / 4` seconds.  A lock that has not been refreshed for
+    `heartbeat_timeout` seconds belongs to a crashed worker and can be claimed again.  A worker whose lock was
+    broken anyway (e.g. it was stalled for longer than the timeout) loses the task: owns() turns False, its
+    heartbeat stops refreshing the lock and complete() does not mark the task as done.
+
+    Each worker also keeps its own log in the queue directory, marked as finished once the worker wrote it all
+    (finish_worker()); merge_worker_logs() concatenates them.
+    """
+
+    def __init__(
+        self,
+        queue_dir: Union[str, Path],
+        worker_id: Union[str, None] = None,
+        heartbeat_timeout: float = DEFAULT_HEARTBEAT_TIMEOUT,
+    ):
+        if queue_dir is None:
+            raise ArgumentNullError("queue_dir")
+
+        self._queue_dir = Path(queue_dir)
+        self._worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self._heartbeat_timeout = heartbeat_timeout
+        self._held: Dict[str, str] = dict()  # task -> token of the claim
+        self._lock = threading.Lock()
+        self._heartbeat_thread: Union[threading.Thread, None] = None
+
+        if not self._queue_dir.exists():
+            FileSystemUtilities.create_directory(self._queue_dir)
+
+    @property
+    def queue_dir(self) -> Path:
+        return self._queue_dir
+
+    @property
+    def worker_id(self) -> str:
+        return self._worker_id
+
+    @property
+    def poll_interval(self) -> float:
+        """
+        Seconds to wait before checking again on tasks held by other workers
+        """
+        return self._heartbeat_timeout / 4
+
+    @property
+    def worker_log_path(self) -> Path:
+        """
+        Log file of this worker
+        """
+        return self._queue_dir / f"log_{self._worker_id}.txt"
+
+    def claim(self, task: str) -> bool:
+        """
+        Try to claim a task
+
+        Params:
+            task (str): task name (must be usable as a file name)
+
+        Returns
+            (bool): True if this worker now owns the task, False if it is done or owned by another live worker
+        """
+        if self.is_done(task):
+            return False
+
+        lock_path = self._get_lock_path(task)
+        token = f"{self._worker_id} {uuid.uuid4().hex}"
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._break_stale_lock(lock_path):
+                    return False
+                continue
+
+            with os.fdopen(fd, "w") as writer:
+                writer.write(f"{token}\n")
+            break
+
+        with self._lock:
+            self._held[task] = token
+
+        # the task may have been completed by the worker whose lock was just broken
+        if self.is_done(task):
+            self.release(task)
+            return False
+
+        self._start_heartbeat()
+        return True
+
+    def owns(self, task: str) -> bool:
+        """
+        True if this worker claimed the task and still holds its lock (it was not broken by another worker)
+        """
+        with self._lock:
+            token = self._held.get(task)
+        return token is not None and self._read_lock(self._get_lock_path(task)) == token
+
+    def complete(self, task: str) -> bool:
+        """
+        Mark a claimed task as done and release its lock
+
+        Returns
+            (bool): True if the task was marked as done, False if this worker lost it to another worker
+        """
+        if not self.owns(task):
+            self.release(task)
+            return False
+        self._get_done_path(task).touch()
+        self.release(task)
+        return True
+
+    def release(self, task: str):
+        """
+        Release a claimed task without completing it, so that another worker can claim it.  The lock is only
+        removed if it is still the one of this worker's claim
+        """
+        with self._lock:
+            token = self._held.pop(task, None)
+        lock_path = self._get_lock_path(task)
+        if token is not None and self._read_lock(lock_path) == token:
+            _unlink(lock_path)
+
+    def reopen(self, task: str):
+        """
+        Remove the done marker of a task, e.g. because its outputs were deleted, so that it can be claimed again
+        """
+        _unlink(self._get_done_path(task))
+
+    def is_done(self, task: str) -> bool:
+        return self._get_done_path(task).exists()
+
+    def all_done(self, tasks: List[str]) -> bool:
+        return all([self.is_done(task) for task in tasks])
+
+    def finish_worker(self):
+        """
+        Mark the log of this worker as complete (nothing more will be written to it)
+        """
+        self._get_finished_path(self.worker_log_path).touch()
+
+    def all_workers_finished(self) -> bool:
+        """
+        True if every worker that started a log marked it as complete
+        """
+        return all([self._get_finished_path(log_path).exists() for log_path in self._queue_dir.glob("log_*.txt")])
+
+    def merge_worker_logs(self, output_path: Union[str, Path]):
+        """
+        Concatenate the logs of all workers into `output_path` (replaced atomically)
+        """
+        output_path = Path(output_path)
+        tmp_path = output_path.with_name(f"{output_path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w") as writer:
+            for log_path in sorted(self._queue_dir.glob("log_*.txt")):
+                writer.write(f"===== worker {log_path.stem[4:]} =====\n")
+                writer.write(log_path.read_text())
+                writer.write("\n")
+        os.replace(tmp_path, output_path)
+
+    def _break_stale_lock(self, lock_path: Path) -> bool:
+        """
+        Remove `lock_path` if its owner stopped sending heartbeats
+
+        Returns
+            (bool): True if the lock is gone and can be claimed again
+        """
+        try:
+            owner = self._read_lock(lock_path)
+            if time.time() - lock_path.stat().st_mtime < self._heartbeat_timeout:
+                return False
+        except FileNotFoundError:
+            return True
+
+        stale_path = lock_path.with_name(f"{lock_path.name}.{uuid.uuid4().hex}.stale")
+        try:
+            os.rename(lock_path, stale_path)
+        except FileNotFoundError:
+            return True
+
+        # another worker may have broken the same stale lock and claimed the task between the stat and the
+        #   rename, in which case the lock just renamed is its fresh lock and is put back
+        try:
+            fresh = (
+                self._read_lock(stale_path) != owner
+                or time.time() - stale_path.stat().st_mtime < self._heartbeat_timeout
+            )
+        except FileNotFoundError:
+            return False
+        if fresh:
+            try:
+                os.link(stale_path, lock_path)
+            except FileExistsError:
+                # yet another worker claimed the task meanwhile: the owner of the fresh lock sees it lost the task
+                pass
+            _unlink(stale_path)
+            return False
+        _unlink(stale_path)
+        return True
+
+    def _start_heartbeat(self):
+        if self._heartbeat_thread is not None and self._heartbeat_thread.is_alive():
+            return
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat, name="work-queue-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self._heartbeat_timeout / 4)
+            with self._lock:
+                held = list(self._held.items())
+            for task, token in held:
+                lock_path = self._get_lock_path(task)
+                try:
+                    if self._read_lock(lock_path) != token:
+                        raise FileNotFoundError(lock_path)
+                    os.utime(lock_path)
+                except FileNotFoundError:
+                    # the lock was broken or claimed by another worker: the task is lost (see owns())
+                    with self._lock:
+                        if self._held.get(task) == token:
+                            del self._held[task]
+
+    @staticmethod
+    def _read_lock(lock_path: Path) -> Union[str, None]:
+        """
+        Token of the claim holding a lock, None if there is no lock
+        """
+        try:
+            return lock_path.read_text().strip()
+        except FileNotFoundError:
+            return None
+
+    def _get_lock_path(self, task: str) -> Path:
+        return self._queue_dir / f"{task}.lock"
+
+    def _get_done_path(self, task: str) -> Path:
+        return self._queue_dir / f"{task}.done"
+
+    @staticmethod
+    def _get_finished_path(log_path: Path) -> Path:
+        return log_path.with_suffix(".finished")
+
+    def __getstate__(self):
+        # threads and locks can't be pickled: worker processes start their own heartbeat
+        state = self.__dict__.copy()
+        state["_held"] = dict()
+        state["_lock"] = None
+        state["_heartbeat_thread"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def _unlink(path: Path):
+    # Path.unlink(missing_ok=True) needs python 3.8
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
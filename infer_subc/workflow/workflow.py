@@ -1,10 +1,13 @@
 import numpy as np
 import logging
 
-from typing import Any, Dict, List
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, List, Tuple, Union
 from infer_subc.exceptions import ArgumentNullError
 from infer_subc.workflow.workflow_step import WorkflowStep
 from infer_subc.workflow.workflow_definition import WorkflowDefinition
+from infer_subc.workflow.step_cache import StepCache
+from infer_subc.workflow.instrumentation import StepRecorder
 from napari.layers import Image
 
 log = logging.getLogger(__name__)
@@ -15,17 +18,41 @@ class Workflow:
     Represents an executable aics-segmentation workflow
     This class provides the functionality to run a workflow using an image input
     according to the steps defined in its WorkflowDefinition.
+
+    With `release_intermediates` the workflow runs in a memory-lean mode: the number of consumers of every
+    step result is worked out from the `parent` graph, and each result is dropped as soon as its last
+    consumer has run.  The result of the final step and of the steps listed in `keep_results` (0 indexed)
+    are always retained.
+
+    If a StepCache is given, every step result is looked up in (and then stored to) the on-disk cache
+    before the step function is called, so re-running after changing only the last steps is cheap.
+    If a StepRecorder is given, the time, memory and input/output shapes of every step are recorded with it.
     """
 
-    def __init__(self, workflow_definition: WorkflowDefinition, input_image: np.ndarray):
+    def __init__(
+        self,
+        workflow_definition: WorkflowDefinition,
+        input_image: np.ndarray,
+        release_intermediates: bool = False,
+        keep_results: Union[List[int], None] = None,
+        cache: Union[StepCache, None] = None,
+        recorder: Union[StepRecorder, None] = None,
+    ):
         if workflow_definition is None:
             raise ArgumentNullError("workflow_definition")
         if input_image is None:
             raise ArgumentNullError("input_image")
-        self._definition: WorkflowDefinition = workflow_definition
+        self._definition: WorkflowDefinition = workflow_definition.compile()
         self._starting_image: np.ndarray = input_image
         self._next_step: int = 0  # Next step to execute
         self._results: List = list()  # Store most recent step results
+        self._release_intermediates = release_intermediates
+        self._keep_results = set(keep_results or []) | {len(workflow_definition.steps) - 1}
+        self._consumers_left: List[int] = self._count_consumers()
+        self._cache = cache
+        self._recorder = recorder
+        self._starting_image_key: Union[str, None] = None
+        self._result_keys: Dict[int, str] = dict()  # cache key of each step result
 
     @property
     def workflow_definition(self) -> WorkflowDefinition:
@@ -37,6 +64,8 @@ class Workflow:
         """
         self._next_step = 0
         self._results = list()
+        self._consumers_left = self._count_consumers()
+        self._result_keys = dict()
 
     def get_next_step(self) -> WorkflowStep:
         """
@@ -82,13 +111,11 @@ class Workflow:
             # printing message for now
             log.info("No steps left to run")
         else:
-            image = list()
-            for i in step.parent:
-                res = self.get_result(i - 1)  # parents are 1 indexed
-                image.append(res)
+            image = self._get_step_inputs(self._next_step)
 
-        result: np.ndarray = self.get_next_step().execute(image, parameters or step.parameter_values)
+        result: np.ndarray = self._run_step(self._next_step, image, parameters or step.parameter_values)
         self._results.append(result)
+        self._release_unused_results(self._next_step)
 
         # Only increment after running step
         self._next_step += 1
@@ -136,23 +163,177 @@ class Workflow:
         else:
             return self.get_result(self._next_step - 1)
 
-    def execute_all(self) -> np.ndarray:
+    def execute_all(self, parallel: bool = False, max_workers: Union[int, None] = None) -> np.ndarray:
         """
         Execute all steps in the Workflow
         Note: default parameters will be used to execute the steps. To execute a step
               with user-provided parameters, use execute_next()
 
         Params:
-            none: None
+            parallel (bool): if True, schedule the steps from their `parent` graph and run every step whose
+                             parents are done concurrently on a thread pool (independent branches overlap).
+                             If False (default) the steps are run one at a time in step order.
+            max_workers (int): number of threads used when `parallel` is True (default: ThreadPoolExecutor default)
 
         Returns
             (np.ndarray): Result of the final WorkflowStep.
         """
         self.reset()
+        if parallel:
+            self._execute_all_parallel(max_workers)
         while not self.is_done():
             self.execute_next()
         return self.get_most_recent_result()
 
+    def _execute_all_parallel(self, max_workers: Union[int, None] = None):
+        """
+        Run all steps on a thread pool as soon as their parents have been executed
+        """
+        steps = self._definition.steps
+        self._results = [None] * len(steps)
+        if self._cache is not None:
+            # digest the starting image once, before the steps using it are submitted together
+            self._get_starting_image_key()
+
+        # steps (0 indexed) each step is still waiting for.  The first step always runs on the starting image
+        waiting_for = {i: {p - 1 for p in step.parent if p > 0} for i, step in enumerate(steps)}
+        waiting_for[0] = set()
+        running = dict()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while waiting_for or running:
+                ready = [i for i, parents in waiting_for.items() if len(parents) == 0]
+                for i in ready:
+                    del waiting_for[i]
+                    log.info(f"Executing step #{steps[i].step_number}")
+                    future = executor.submit(
+                        self._run_step, i, self._get_step_inputs(i), steps[i].parameter_values
+                    )
+                    running[future] = i
+
+                if len(running) == 0:
+                    raise ValueError(f"Steps {sorted(waiting_for)} (0 indexed) have parents that can never be executed")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    self._results[i] = future.result()
+                    self._release_unused_results(i)
+                    for parents in waiting_for.values():
+                        parents.discard(i)
+
+        self._next_step = len(steps)
+
+    def _count_consumers(self) -> List[int]:
+        """
+        Count how many later steps use the result of each step (0 indexed) as input
+        """
+        consumers = [0] * len(self._definition.steps)
+        # the first step always runs on the starting image, whatever its parent
+        for step in self._definition.steps[1:]:
+            for p in step.parent:
+                if p > 0:
+                    consumers[p - 1] += 1
+        return consumers
+
+    def _release_unused_results(self, step_index: int):
+        """
+        In memory-lean mode, drop the results nothing is going to read anymore once step `step_index` has run:
+        its parents' results if this step was their last consumer, and its own result if it has no consumer.
+        """
+        if not self._release_intermediates:
+            return
+
+        parents = [p - 1 for p in self._definition.steps[step_index].parent if p > 0] if step_index > 0 else []
+        for i in parents + [step_index]:
+            if i != step_index:
+                self._consumers_left[i] -= 1
+            if self._consumers_left[i] <= 0 and i not in self._keep_results:
+                self._results[i] = None
+
+    def _run_step(
+        self,
+        step_index: int,
+        image: List[np.ndarray],
+        parameters: Dict[str, Any],
+        input_keys: Union[List[str], None] = None,
+    ) -> np.ndarray:
+        """
+        Run a step (0 indexed), recording it with the step recorder if there is one
+        """
+        if self._recorder is None:
+            return self._execute_step_cached(step_index, image, parameters, input_keys)[0]
+
+        with self._recorder.measure(self._definition.name, self._definition.steps[step_index], image) as record:
+            result, cached = self._execute_step_cached(step_index, image, parameters, input_keys)
+            record.set_output(result, cached)
+        return result
+
+    def _execute_step_cached(
+        self,
+        step_index: int,
+        image: List[np.ndarray],
+        parameters: Dict[str, Any],
+        input_keys: Union[List[str], None] = None,
+    ) -> Tuple[np.ndarray, bool]:
+        """
+        Execute a step (0 indexed), looking its result up in the step cache first if there is one
+
+        Returns
+            (np.ndarray, bool): step result, and whether it was read from the cache
+        """
+        step = self._definition.steps[step_index]
+        if self._cache is None:
+            return step.execute(image, parameters), False
+
+        if input_keys is None:
+            input_keys = self._get_input_keys(step_index)
+        key = self._cache.step_key(step, input_keys, parameters)
+
+        result = self._cache.get(key)
+        cached = result is not None
+        if cached:
+            log.info(f"Using cached result for step #{step.step_number}")
+        else:
+            result = step.execute(image, parameters)
+            self._cache.put(key, result)
+
+        self._result_keys[step_index] = key
+        return result, cached
+
+    def _get_starting_image_key(self) -> str:
+        if self._starting_image_key is None:
+            self._starting_image_key = StepCache.digest_array(self._starting_image)
+        return self._starting_image_key
+
+    def _get_input_keys(self, step_index: int) -> List[str]:
+        """
+        Get the cache keys of the input images of a step (0 indexed).  Parent results are identified by their own
+        cache key, so only the starting image ever needs to be digested
+        """
+        if step_index == 0:
+            return [self._get_starting_image_key()]
+
+        input_keys = list()
+        for p in self._definition.steps[step_index].parent:
+            if p == 0:
+                input_keys.append(self._get_starting_image_key())
+            elif p - 1 in self._result_keys:
+                input_keys.append(self._result_keys[p - 1])
+            else:
+                input_keys.append(StepCache.digest_array(self.get_result(p - 1)))
+        return input_keys
+
+    def _get_step_inputs(self, step_index: int) -> List[np.ndarray]:
+        """
+        Get the input images of a step (0 indexed) from the results of its parents
+        """
+        if step_index == 0:
+            # First image, so use the starting image for the next workflow step
+            return [self._starting_image]
+        # parents are 1 indexed
+        return [self.get_result(i - 1) for i in self._definition.steps[step_index].parent]
+
     def execute_step(self, i: int, parameters: Dict[str, Any], selected_image: List[Image]) -> np.ndarray:
         """
 
@@ -166,7 +347,10 @@ class Workflow:
         step_to_run = self._definition.steps[i]
 
         image = [i.data for i in selected_image]
-        result: np.ndarray = step_to_run.execute(image, parameters or step_to_run.parameter_values)
+        input_keys = [StepCache.digest_array(im) for im in image] if self._cache is not None else None
+        result: np.ndarray = self._run_step(
+            i, image, parameters or step_to_run.parameter_values, input_keys=input_keys
+        )
 
         if len(self._results) <= i:
             # this is the first time running this step
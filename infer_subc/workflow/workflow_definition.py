@@ -65,6 +65,19 @@ class WorkflowDefinition:
         self.prebuilt = prebuilt
         self.from_file = True
 
+    def compile(self) -> "WorkflowDefinition":
+        """
+        Compile every step (see WorkflowStep.compile): resolve the step functions, decide how their inputs are
+        passed and validate their parameters, so that errors in the definition are raised before anything runs.
+
+        Returns
+            (WorkflowDefinition): this definition, with all its steps compiled
+        """
+        for step in self.steps:
+            step.compile()
+        return self
+
+
 # TODO: modify the below to work with text instead of pictures.
 @dataclass
 class PrebuiltWorkflowDefinition(WorkflowDefinition):
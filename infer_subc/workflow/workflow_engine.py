@@ -1,9 +1,11 @@
 import numpy as np
 
-from typing import List, Union
+from typing import List, Tuple, Union
 from infer_subc.exceptions import ArgumentNullError
 from infer_subc.workflow.workflow import Workflow
 from infer_subc.workflow.batch_workflow import BatchWorkflow
+from infer_subc.workflow.step_cache import DEFAULT_CACHE_MAX_BYTES
+from infer_subc.workflow.work_queue import DEFAULT_HEARTBEAT_TIMEOUT
 from infer_subc.workflow.workflow_definition import WorkflowDefinition
 from infer_subc.workflow.workflow_config import WorkflowConfig
 from pathlib import Path
@@ -60,6 +62,7 @@ class WorkflowEngine:
         output_dir: str,
         segmentation_name: str,
         channel_index: int = -1,
+        max_workers: int = 1,
     ):
         """
         Get an executable BatchWorkflow object
@@ -69,6 +72,7 @@ class WorkflowEngine:
             input_dir (str|Path): Directory containing input files for the batch processing
             output_dir (str|Path): Output directory for the batch processing
             channel_index (int): Index of the channel to process in each image (usually a structure channel)
+            max_workers (int): Number of worker processes used to process files in parallel (1 = serial)
         """
         if workflow_name is None:
             raise ArgumentNullError("workflow_name")
@@ -81,7 +85,7 @@ class WorkflowEngine:
 
         definition = self._get_workflow_definition(workflow_name)
 
-        return BatchWorkflow(definition, input_dir, output_dir, segmentation_name, channel_index)
+        return BatchWorkflow(definition, input_dir, output_dir, segmentation_name, channel_index, max_workers)
 
     def get_executable_workflow_from_config_file(
         self, file_path: Union[str, Path], input_image: np.ndarray
@@ -109,6 +113,7 @@ class WorkflowEngine:
         output_dir: Union[str, Path],
         segmentation_name: str,
         channel_index: int = -1,
+        max_workers: int = 1,
     ):
         """
         Get an executable batch workflow object from a configuration file
@@ -118,6 +123,7 @@ class WorkflowEngine:
             input_dir (str|Path): Directory containing input files for the batch processing
             output_dir (str|Path): Output directory for the batch processing
             channel_index (int): Index of the channel to process in each image (usually a structure channel)
+            max_workers (int): Number of worker processes used to process files in parallel (1 = serial)
         """
         if file_path is None:
             raise ArgumentNullError("file_path")
@@ -129,7 +135,7 @@ class WorkflowEngine:
             raise ArgumentNullError("output_dir")
 
         definition = self._workflow_config.get_workflow_definition_from_config_file(Path(file_path))
-        return BatchWorkflow(definition, input_dir, output_dir, segmentation_name, channel_index)
+        return BatchWorkflow(definition, input_dir, output_dir, segmentation_name, channel_index, max_workers)
 
     # JAH: add segmentation_name ... do i need it?
     def get_executable_batch_workflows_from_config_file(
@@ -139,6 +145,18 @@ class WorkflowEngine:
         output_dir: Union[str, Path],
         segmentation_names: List[str],
         channel_index: int = -1,
+        max_workers: int = 1,
+        merge_steps: bool = False,
+        cache_dir: Union[str, Path, None] = None,
+        cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+        instrument: bool = False,
+        resume: bool = False,
+        pipelined: bool = False,
+        distributed: bool = False,
+        heartbeat_timeout: float = DEFAULT_HEARTBEAT_TIMEOUT,
+        chunk_size: Union[Tuple[int, int], None] = None,
+        float_dtype: Union[np.dtype, None] = None,
+        output_format: str = "tiff",
     ):
         """
         Get an executable batch workflow object from a configuration file
@@ -148,6 +166,18 @@ class WorkflowEngine:
             input_dir (str|Path): Directory containing input files for the batch processing
             output_dir (str|Path): Output directory for the batch processing
             channel_index (int): Index of the channel to process in each image (usually a structure channel)
+            max_workers (int): Number of worker processes used to process files in parallel (1 = serial)
+            merge_steps (bool): Run the steps shared by several workflows only once per file
+            cache_dir (str|Path): Directory of an on-disk cache of step results (None = no cache)
+            cache_max_bytes (int): Size limit of the step cache, least recently used results are evicted beyond it
+            instrument (bool): Record the time and memory used by every step (JSONL file next to the log)
+            resume (bool): Keep a manifest in output_dir and skip the files X workflows whose output is up to date
+            pipelined (bool): Read the next file and write the outputs in background threads (serial runs)
+            distributed (bool): Share the files with the other BatchWorkflows running on the same output_dir
+            heartbeat_timeout (float): Seconds after which a file claimed by a silent distributed worker is reclaimed
+            chunk_size (Tuple[int, int]): Read the files lazily and run the workflows on YX chunks of this size
+            float_dtype (np.dtype): Float precision of the intermediate images, e.g. np.float32 to halve memory
+            output_format (str): "tiff" (one file per image and segmentation) or "zarr" (one segmentation store)
         """
         if file_path is None:
             raise ArgumentNullError("file_path")
@@ -159,7 +189,25 @@ class WorkflowEngine:
             raise ArgumentNullError("output_dir")
 
         definitions = [self._workflow_config.get_workflow_definition_from_config_file(Path(fn)) for fn in file_path]
-        return BatchWorkflow(definitions, input_dir, output_dir, segmentation_names, channel_index)
+        return BatchWorkflow(
+            definitions,
+            input_dir,
+            output_dir,
+            segmentation_names,
+            channel_index,
+            max_workers,
+            merge_steps,
+            cache_dir=cache_dir,
+            cache_max_bytes=cache_max_bytes,
+            instrument=instrument,
+            resume=resume,
+            pipelined=pipelined,
+            distributed=distributed,
+            heartbeat_timeout=heartbeat_timeout,
+            chunk_size=chunk_size,
+            float_dtype=float_dtype,
+            output_format=output_format,
+        )
 
         # return [
         #     self.get_executable_batch_workflow_from_config_file(fp, input_dir, output_dir, nm, channel_index)
@@ -0,0 +1,109 @@
+import json
+import numpy as np
+
+from typing import Dict, List, Tuple
+from infer_subc.exceptions import ArgumentNullError
+from infer_subc.workflow.workflow import Workflow
+from infer_subc.workflow.workflow_definition import WorkflowDefinition
+from infer_subc.workflow.workflow_step import WorkflowStep
+
+StepKey = Tuple[str, str, str, Tuple[int, ...]]
+
+
+class WorkflowPlanner:
+    """
+    Merges the steps of several WorkflowDefinitions that run on the same image into a single workflow DAG.
+
+    Steps with identical function, parameters and parents are only kept once, and their result feeds every
+    consumer.  e.g. the `select_channel_from_raw` -> `scale_and_smooth` prefix shared by two organelle
+    workflows, or the whole common beginning of the masks workflows A and B.
+    The merged steps are returned as a regular WorkflowDefinition, so they can be executed by a Workflow.
+    """
+
+    def __init__(self, workflow_definitions: List[WorkflowDefinition]):
+        if workflow_definitions is None:
+            raise ArgumentNullError("workflow_definitions")
+
+        self._workflow_definitions = workflow_definitions
+        self._definition, self._output_steps = self._merge(workflow_definitions)
+
+    @property
+    def workflow_definition(self) -> WorkflowDefinition:
+        """
+        WorkflowDefinition containing the merged steps of all workflows
+        """
+        return self._definition
+
+    @property
+    def output_steps(self) -> List[int]:
+        """
+        Index (0 indexed) of the merged step holding the final result of each workflow definition
+        """
+        return self._output_steps
+
+    @property
+    def total_steps(self) -> int:
+        """
+        Number of steps of all the workflow definitions before merging
+        """
+        return sum([len(wfd.steps) for wfd in self._workflow_definitions])
+
+    @property
+    def merged_steps(self) -> int:
+        """
+        Number of steps left to execute after merging
+        """
+        return len(self._definition.steps)
+
+    def get_results(self, workflow: Workflow) -> List[np.ndarray]:
+        """
+        Get the final result of each of the original workflow definitions
+
+        Params:
+            workflow (Workflow): executed Workflow built from `workflow_definition`
+
+        Returns
+            (List[np.ndarray]): one result per workflow definition, in the order they were given
+        """
+        return [workflow.get_result(i) for i in self._output_steps]
+
+    def _merge(self, workflow_definitions: List[WorkflowDefinition]) -> Tuple[WorkflowDefinition, List[int]]:
+        """
+        Build the merged definition.  Steps are visited workflow by workflow in step order, so the parents of
+        every merged step are always merged before it.
+        """
+        steps: List[WorkflowStep] = list()
+        known_steps: Dict[StepKey, int] = dict()
+        output_steps: List[int] = list()
+
+        for wfd in workflow_definitions:
+            # step number in this workflow -> step number in the merged workflow. 0 is the input image
+            step_map = {0: 0}
+            for step in wfd.steps:
+                parent = [step_map[p] for p in step.parent]
+                key = self._step_key(step, parent)
+
+                if key not in known_steps:
+                    step_number = len(steps) + 1
+                    steps.append(
+                        WorkflowStep(
+                            category=step.category,
+                            function=step.function,
+                            step_number=step_number,
+                            parent=parent,
+                            parameter_values=step.parameter_values,
+                        )
+                    )
+                    known_steps[key] = step_number
+
+                step_map[step.step_number] = known_steps[key]
+
+            output_steps.append(step_map[wfd.steps[-1].step_number] - 1)
+
+        name = " + ".join([wfd.name for wfd in workflow_definitions])
+        return WorkflowDefinition(name, steps, prebuilt=False), output_steps
+
+    @staticmethod
+    def _step_key(step: WorkflowStep, parent: List[int]) -> StepKey:
+        parameters = json.dumps(step.parameter_values, sort_keys=True, default=str)
+        return (step.function.module, step.function.function, parameters, tuple(parent))
@@ -1,9 +1,12 @@
 import importlib
+import inspect
+import typing
 import numpy as np
 
+from collections.abc import Sequence
 from dataclasses import dataclass
 from enum import Enum
-from typing import Dict, List, Any
+from typing import Callable, Dict, List, Any
 from infer_subc.workflow.segmenter_function import SegmenterFunction
 
 
@@ -50,6 +53,99 @@ class WorkflowStep:
     def name(self):
         return self.function.display_name
 
+    @property
+    def is_compiled(self) -> bool:
+        return getattr(self, "_py_function", None) is not None
+
+    def compile(self):
+        """
+        Resolve the python function of this step once and decide ahead of time how the input images are passed to
+        it: unpacked as positional arguments (most functions), or as a single list (e.g. `merge_segmentation`).
+        The step's parameter_values are validated against the function configuration (all_functions.json) and
+        the function's signature, so that a bad configuration fails before any step is executed.
+
+        Compiling an already compiled step does nothing.
+        """
+        if self.is_compiled:
+            return
+
+        if self.parameter_values is not None and not self._check_parameters(self.parameter_values):
+            unknown = sorted(set(self.parameter_values.keys()) - set((self.function.parameters or {}).keys()))
+            raise ValueError(
+                f"Step #{self.step_number} ({self.function.name}): parameters {unknown} are not defined "
+                "for this function in all_functions.json. Note: parameter names are case sensitive"
+            )
+
+        try:
+            py_module = importlib.import_module(self.function.module)
+            py_function = getattr(py_module, self.function.function)
+        except (ImportError, AttributeError) as ex:
+            raise ValueError(
+                f"Step #{self.step_number} ({self.function.name}): "
+                f"could not find {self.function.module}.{self.function.function}"
+            ) from ex
+
+        self._unpack_images = self._get_calling_convention(py_function)
+        self._py_function: Callable = py_function
+
+    def _get_calling_convention(self, py_function: Callable) -> bool:
+        """
+        Check the signature of py_function against this step's inputs and parameters.
+
+        Returns
+            (bool): True if the input images must be unpacked as positional arguments,
+                    False if they must be passed as a single list
+        """
+        try:
+            signature = inspect.signature(py_function)
+        except (TypeError, ValueError):
+            # builtins / numpy ufuncs without a signature take their inputs as positional arguments
+            return True
+
+        parameter_names = set((self.parameter_values or {}).keys())
+        kinds = [p.kind for p in signature.parameters.values()]
+        if inspect.Parameter.VAR_KEYWORD not in kinds:
+            unknown = sorted(parameter_names - set(signature.parameters.keys()))
+            if len(unknown) > 0:
+                raise ValueError(
+                    f"Step #{self.step_number} ({self.function.name}): "
+                    f"{self.function.function}() has no parameters {unknown}"
+                )
+
+        if inspect.Parameter.VAR_POSITIONAL in kinds:
+            return True
+
+        # positional slots left for the input images once the parameters are passed by keyword
+        slots = [
+            p
+            for p in signature.parameters.values()
+            if p.kind in (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)
+            and p.name not in parameter_names
+        ]
+        if len(slots) > 0 and self._is_list_annotation(slots[0].annotation):
+            return False
+
+        # the first step always runs on the single starting image
+        input_count = 1 if self.step_number == 1 else len(self.parent)
+        if input_count > len(slots):
+            return False
+
+        missing = [p.name for p in slots[input_count:] if p.default is inspect.Parameter.empty]
+        if len(missing) > 0:
+            raise ValueError(
+                f"Step #{self.step_number} ({self.function.name}): "
+                f"no input or parameter value for {self.function.function}() arguments {missing}"
+            )
+
+        return True
+
+    @staticmethod
+    def _is_list_annotation(annotation: Any) -> bool:
+        if annotation in (list, tuple, typing.List, typing.Tuple, typing.Sequence):
+            return True
+        # typing.get_origin() needs python 3.8
+        return getattr(annotation, "__origin__", None) in (list, tuple, Sequence)
+
     def execute(self, input_images: List[np.ndarray], parameters: Dict[str, Any] = None) -> np.ndarray:
         """
         Execute this workflow step on the given input image and return the result.
@@ -74,24 +170,18 @@ class WorkflowStep:
                 "Note: parameter names are case sensitive"
             )
 
-        py_module = importlib.import_module(self.function.module)
-        py_function = getattr(py_module, self.function.function)
+        self.compile()
 
-        try:
-            # Most functions require unpacking the images
-            if parameters is not None:
-                return py_function(*input_images, **parameters)
+        # Most functions require unpacking the images, some want them as a list
+        args = input_images if self._unpack_images else [input_images]
+        if parameters is not None:
+            return self._py_function(*args, **parameters)
 
-            return py_function(*input_images)
-        except TypeError:
-            # Some functions want it as a list
-            if parameters is not None:
-                return py_function(input_images, **parameters)
-            return py_function(input_images)
+        return self._py_function(*args)
 
     def _check_parameters(self, parameters: Dict[str, Any]) -> bool:
         for key in parameters.keys():
-            if key not in self.function.parameters.keys():
+            if key not in (self.function.parameters or {}).keys():
                 return False
 
         return True
@@ -12,3 +12,28 @@ def go_to_tmpdir(request):
     # Chdir only for the duration of the test.
     with tmpdir.as_cwd():
         yield
+
+
+# topology_preserving_thinning (golgi) computes medial axes, which break ties at random unless seeded: seed
+#   them so that two runs of a workflow give the same segmentation
+@pytest.fixture(autouse=True)
+def seeded_medial_axis(monkeypatch):
+    import aicssegmentation.core.utils
+    import inspect
+    from functools import partial
+    from skimage.morphology import medial_axis
+
+    seed = "rng" if "rng" in inspect.signature(medial_axis).parameters else "random_state"  # skimage < 0.21
+    monkeypatch.setattr(aicssegmentation.core.utils, "medial_axis", partial(medial_axis, **{seed: 0}))
+
+
+# run a test with the package-wide float precision set to float32 (see infer_subc.set_float_dtype)
+@pytest.fixture
+def float32_mode():
+    import numpy as np
+    from infer_subc import get_float_dtype, set_float_dtype
+
+    previous = get_float_dtype()
+    set_float_dtype(np.float32)
+    yield
+    set_float_dtype(previous)
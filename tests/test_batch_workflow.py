@@ -0,0 +1,191 @@
+import os
+import numpy as np
+import pytest
+import tifffile
+
+from pathlib import Path
+from typing import Dict
+
+from infer_subc.utils.directories import Directories
+from infer_subc.workflow.batch_workflow import BatchWorkflow
+from infer_subc.workflow.workflow_config import WorkflowConfig
+
+CONFIGS = ["conf_0.2.lyso", "conf_0.3.mito"]
+SEGMENTATION_NAMES = ["lyso", "mito"]
+N_IMAGES = 3  # plus one unreadable file, whose pairs all fail
+
+
+def _write_image(path: Path, seed: int):
+    rng = np.random.default_rng(seed)
+    tifffile.imwrite(path, (rng.random((6, 8, 64, 64)) * 1000).astype(np.uint16), metadata={"axes": "ZCYX"})
+
+
+@pytest.fixture
+def input_dir(tmp_path) -> Path:
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    for i in range(N_IMAGES):
+        _write_image(input_dir / f"img{i}.ome.tiff", i)
+    (input_dir / "bad.ome.tiff").write_bytes(b"not a tiff")
+    return input_dir
+
+
+def _definitions():
+    config = WorkflowConfig()
+    return [
+        config.get_workflow_definition_from_config_file(Directories.get_structure_config_dir() / f"{name}.json")
+        for name in CONFIGS
+    ]
+
+
+def _run(input_dir: Path, output_dir: Path, definitions=None, **kwargs) -> BatchWorkflow:
+    batch = BatchWorkflow(definitions or _definitions(), input_dir, output_dir, SEGMENTATION_NAMES, **kwargs)
+    batch.execute_all()
+    return batch
+
+
+def _outputs(output_dir: Path) -> Dict[str, np.ndarray]:
+    return {path.name: tifffile.imread(path) for path in sorted(output_dir.glob("*.tiff"))}
+
+
+def _log(output_dir: Path) -> str:
+    return next(output_dir.glob("log_*.txt")).read_text()
+
+
+def _assert_same_outputs(output_dir: Path, expected_dir: Path):
+    outputs, expected = _outputs(output_dir), _outputs(expected_dir)
+    assert sorted(outputs) == sorted(expected)
+    for name in expected:
+        np.testing.assert_array_equal(outputs[name], expected[name], err_msg=name)
+
+
+def _assert_counts(batch: BatchWorkflow, processed: int, failed: int, skipped: int = 0):
+    assert (batch.processed_files, batch.failed_files, batch.skipped_files) == (processed, failed, skipped)
+
+
+# parallel (process pool) runs
+def test_parallel_matches_serial(input_dir, tmp_path):
+    serial = _run(input_dir, tmp_path / "serial")
+    parallel = _run(input_dir, tmp_path / "parallel", max_workers=2)
+
+    total = (N_IMAGES + 1) * len(CONFIGS)
+    _assert_counts(serial, total, len(CONFIGS))
+    _assert_counts(parallel, total, len(CONFIGS))
+    assert len(_outputs(tmp_path / "serial")) == N_IMAGES * len(CONFIGS)
+    _assert_same_outputs(tmp_path / "parallel", tmp_path / "serial")
+
+    for output_dir in (tmp_path / "serial", tmp_path / "parallel"):
+        log = _log(output_dir)
+        assert log.count("SUCCESS:") == N_IMAGES * len(CONFIGS)
+        assert log.count("FAILED:") == len(CONFIGS)
+    assert _log(tmp_path / "parallel").count("processing:::") == N_IMAGES + 1
+
+
+# resume mode (manifest)
+def test_resume_skips_up_to_date_pairs(input_dir, tmp_path):
+    output_dir = tmp_path / "output"
+    first = _run(input_dir, output_dir, resume=True)
+    _assert_counts(first, 8, 2)
+    outputs = _outputs(output_dir)
+
+    # only the failed pairs run again
+    second = _run(input_dir, output_dir, resume=True)
+    _assert_counts(second, 8, 2, skipped=6)
+    assert sorted(_outputs(output_dir)) == sorted(outputs)
+
+    # touched without being changed: still up to date
+    os.utime(input_dir / "img0.ome.tiff")
+    _assert_counts(_run(input_dir, output_dir, resume=True, max_workers=2), 8, 2, skipped=6)
+
+
+def test_resume_reruns_changed_input(input_dir, tmp_path):
+    output_dir = tmp_path / "output"
+    _run(input_dir, output_dir, resume=True)
+    before = _outputs(output_dir)
+
+    _write_image(input_dir / "img1.ome.tiff", 10)
+    _assert_counts(_run(input_dir, output_dir, resume=True), 8, 2, skipped=4)
+    after = _outputs(output_dir)
+    np.testing.assert_array_equal(after["img0.ome-lyso.tiff"], before["img0.ome-lyso.tiff"])
+    assert not np.array_equal(after["img1.ome-lyso.tiff"], before["img1.ome-lyso.tiff"])
+
+
+def test_resume_reruns_changed_workflow(input_dir, tmp_path):
+    output_dir = tmp_path / "output"
+    _run(input_dir, output_dir, resume=True)
+
+    definitions = _definitions()
+    smoothing = next(step for step in definitions[0].steps if step.function.name == "scale_and_smooth")
+    smoothing.parameter_values["gauss_sigma"] += 0.5
+    # only the lyso pairs (changed workflow) run again
+    _assert_counts(_run(input_dir, output_dir, definitions, resume=True), 8, 2, skipped=3)
+
+
+def test_resume_reruns_missing_output(input_dir, tmp_path):
+    output_dir = tmp_path / "output"
+    _run(input_dir, output_dir, resume=True)
+    expected = _outputs(output_dir)
+
+    (output_dir / "img2.ome-mito.tiff").unlink()
+    _assert_counts(_run(input_dir, output_dir, resume=True), 8, 2, skipped=5)
+    assert sorted(_outputs(output_dir)) == sorted(expected)
+    np.testing.assert_array_equal(tifffile.imread(output_dir / "img2.ome-mito.tiff"), expected["img2.ome-mito.tiff"])
+
+
+# pipelined mode (read ahead, background writes)
+def test_pipelined_matches_serial(input_dir, tmp_path):
+    serial = _run(input_dir, tmp_path / "serial")
+    pipelined = _run(input_dir, tmp_path / "pipelined", pipelined=True)
+
+    _assert_counts(pipelined, serial.processed_files, serial.failed_files)
+    _assert_same_outputs(tmp_path / "pipelined", tmp_path / "serial")
+    assert _log(tmp_path / "pipelined").count("SUCCESS:") == N_IMAGES * len(CONFIGS)
+
+
+def test_pipelined_write_failure_is_counted(input_dir, tmp_path, monkeypatch):
+    write_output = BatchWorkflow._write_output
+
+    def failing_write(self, output_path, *args):
+        if output_path.name == "img1.ome-mito.tiff":
+            raise OSError("disk full")
+        return write_output(self, output_path, *args)
+
+    monkeypatch.setattr(BatchWorkflow, "_write_output", failing_write)
+    output_dir = tmp_path / "output"
+    batch = _run(input_dir, output_dir, pipelined=True, resume=True)
+
+    _assert_counts(batch, 8, 3)
+    assert "img1.ome-mito.tiff" not in _outputs(output_dir)
+    assert len(_outputs(output_dir)) == N_IMAGES * len(CONFIGS) - 1
+    assert "FAILED: " in _log(output_dir) and "disk full" in _log(output_dir)
+
+    # the failed write is not in the manifest: it runs again
+    monkeypatch.setattr(BatchWorkflow, "_write_output", write_output)
+    _assert_counts(_run(input_dir, output_dir, pipelined=True, resume=True), 8, 2, skipped=5)
+    assert (output_dir / "img1.ome-mito.tiff").exists()
+
+
+# zarr output (SegmentationStore)
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_zarr_output_matches_tiff(max_workers, input_dir, tmp_path):
+    pytest.importorskip("zarr")
+    from infer_subc.core.zarr_store import SegmentationStore, is_zarr_available
+
+    if not is_zarr_available():
+        pytest.skip("zarr 2 is not installed")
+    tiff = _run(input_dir, tmp_path / "tiff")
+    batch = _run(input_dir, tmp_path / "zarr", max_workers=max_workers, output_format="zarr")
+
+    _assert_counts(batch, tiff.processed_files, tiff.failed_files)
+    assert len(_outputs(tmp_path / "zarr")) == 0
+    store = SegmentationStore(tmp_path / "zarr" / "segmentations.zarr", mode="r")
+    assert store.images() == [f"img{i}.ome" for i in range(N_IMAGES)]
+    for name, expected in _outputs(tmp_path / "tiff").items():
+        image_name, segmentation_name = name[: -len(".tiff")].split("-")
+        np.testing.assert_array_equal(store.read(image_name, segmentation_name), expected, err_msg=name)
+        assert store.attrs(image_name, segmentation_name)["provenance"]["source"] == f"{image_name}.tiff"
+
+
+def test_zarr_output_without_resume(input_dir, tmp_path):
+    with pytest.raises(ValueError):
+        _run(input_dir, tmp_path / "output", resume=True, output_format="zarr")
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from scipy.ndimage import gaussian_filter
+
+from infer_subc.utils.directories import Directories
+from infer_subc.workflow.chunked_workflow import ChunkedWorkflow
+from infer_subc.workflow.workflow import Workflow
+from infer_subc.workflow.workflow_config import WorkflowConfig
+
+# ChunkedWorkflow must segment exactly like Workflow, whatever the chunks cut through (filaments, holes, objects)
+
+CONFIGS = [
+    "conf_0.1.masks",
+    "conf_0.2.lyso",
+    "conf_0.3.mito",
+    "conf_0.4.golgi",
+    "conf_0.5.perox",
+    "conf_0.6.ER",
+    "conf_0.7.LD",
+]
+
+
+@pytest.fixture(scope="module")
+def image() -> np.ndarray:
+    # CZYX: blurred noise with bright dots and filaments crossing the chunk edges in every direction
+    rng = np.random.default_rng(3)
+    shape = (10, 6, 120, 140)
+    img = gaussian_filter(rng.random(shape), (0, 0, 2, 2)) * 3000 + rng.random(shape) * 300
+    yy, xx = np.mgrid[0:120, 0:140]
+    for c in range(shape[0]):
+        for _ in range(6):
+            y0, x0, angle = rng.uniform(0, 120), rng.uniform(0, 140), rng.uniform(0, np.pi)
+            distance = np.abs((yy - y0) * np.cos(angle) - (xx - x0) * np.sin(angle))
+            img[c, 1:5] += 4000 * np.exp(-(distance**2) / 2.0)
+        for _ in range(15):
+            z, y, x = rng.integers(1, 5), rng.integers(0, 120), rng.integers(0, 140)
+            img[c, z, max(y - 2, 0) : y + 3, max(x - 2, 0) : x + 3] += 5000
+    return gaussian_filter(img, (0, 0.5, 1, 1)).astype(np.uint16)
+
+
+@pytest.mark.parametrize("chunk_size", [(64, 64), (32, 32), (40, 48)])
+@pytest.mark.parametrize("config", CONFIGS)
+def test_chunked_workflow_matches_workflow(config, chunk_size, image):
+    definition = WorkflowConfig().get_workflow_definition_from_config_file(
+        Directories.get_structure_config_dir() / f"{config}.json"
+    )
+    expected = Workflow(definition, image).execute_all()
+    result = ChunkedWorkflow(definition, image, chunk_size=chunk_size, release_intermediates=True).execute_all()
+    np.testing.assert_array_equal(np.asarray(result), np.asarray(expected))
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from scipy.ndimage import gaussian_filter
+
+from infer_subc import get_float_dtype, set_float_dtype
+from infer_subc.core.img import (
+    log_transform,
+    min_max_intensity_normalization,
+    scale_and_smooth,
+    stretch,
+    vesselness_slice_by_slice,
+    weighted_aggregate,
+)
+from infer_subc.utils.directories import Directories
+from infer_subc.workflow.workflow import Workflow
+from infer_subc.workflow.workflow_config import WorkflowConfig
+
+# float32 mode (set_float_dtype(np.float32)) must stay within the tolerances documented in set_float_dtype:
+#   intensities agree with float64 to ~1e-5 (relative), and segmentations differ at isolated voxels only
+
+RTOL = 1e-5
+MAX_DIFFERENT_VOXELS = 1e-4  # fraction of the voxels
+
+CONFIGS = ["conf_0.2.lyso", "conf_0.3.mito", "conf_0.5.perox", "conf_0.6.ER", "conf_0.7.LD"]
+
+
+@pytest.fixture(scope="module")
+def image() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    img = gaussian_filter(rng.random((10, 6, 80, 90)), (0, 0, 1.5, 1.5)) * 5000 + rng.random((10, 6, 80, 90)) * 500
+    return img.astype(np.uint16)
+
+
+def _both_modes(function, *args, **kwargs):
+    double = function(*args, **kwargs)
+    set_float_dtype(np.float32)
+    try:
+        single = function(*args, **kwargs)
+    finally:
+        set_float_dtype(np.float64)
+    return double, single
+
+
+def test_default_is_float64():
+    assert get_float_dtype() == np.float64
+
+
+def test_float32_mode_fixture(float32_mode):
+    assert get_float_dtype() == np.float32
+
+
+@pytest.mark.parametrize("dtype", [np.float16, np.int64, "float128" if hasattr(np, "float128") else "complex64"])
+def test_unsupported_dtype(dtype):
+    with pytest.raises(ValueError):
+        set_float_dtype(dtype)
+    assert get_float_dtype() == np.float64
+
+
+@pytest.mark.parametrize(
+    "function, args",
+    [
+        (min_max_intensity_normalization, ()),
+        (lambda img: log_transform(img)[0], ()),
+        (stretch, ()),
+        (weighted_aggregate, (1, 2, 0, 3, 0, 0, 0, 1, 1, 0)),
+        (scale_and_smooth, (3, 1.34)),
+        (scale_and_smooth, (3, 1.34, False, (0.4, 0.1, 0.1))),
+    ],
+)
+def test_helpers_within_tolerance(function, args, image):
+    img = image if function is weighted_aggregate else image[2]
+    double, single = _both_modes(function, img, *args)
+    assert double.dtype == np.float64
+    assert single.dtype == np.float32
+    np.testing.assert_allclose(single, double, rtol=RTOL, atol=RTOL * np.abs(double).max())
+
+
+def test_float32_inputs_keep_their_type(image):
+    img = image[2].astype(np.float32)
+    assert min_max_intensity_normalization(img).dtype == np.float32
+
+
+def test_vesselness_within_tolerance(image):
+    img = scale_and_smooth(image[2], 3, 1.34)
+    double, single = _both_modes(vesselness_slice_by_slice, img, sigma=1.5, cutoff=-1, tau=0.75)
+    assert single.dtype == np.float32
+    # the internal cutoff of the vesselness filter can flip at isolated voxels
+    close = np.isclose(single, double, rtol=RTOL, atol=RTOL * double.max())
+    assert np.mean(~close) <= MAX_DIFFERENT_VOXELS
+
+
+@pytest.mark.parametrize("config", CONFIGS)
+def test_workflows_within_tolerance(config, image):
+    definition = WorkflowConfig().get_workflow_definition_from_config_file(
+        Directories.get_structure_config_dir() / f"{config}.json"
+    )
+    double, single = _both_modes(lambda: Workflow(definition, image).execute_all())
+    assert single.dtype == double.dtype
+    assert np.mean(single != double) <= MAX_DIFFERENT_VOXELS
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from scipy.ndimage import gaussian_filter
+from skimage.filters import threshold_li, threshold_multiotsu, threshold_otsu, threshold_triangle
+
+from infer_subc.core.histogram_threshold import histogram_threshold, histogram_thresholds
+from infer_subc.core.img import inverse_log_transform, log_transform, threshold_li_log
+
+# histogram_threshold builds one histogram chunk by chunk: its thresholds must be those of skimage (and numpy for
+#   the median) on the whole image
+
+DTYPES = [np.uint8, np.uint16, np.int32, np.float32, np.float64]
+
+
+def _image(seed: int, dtype) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    img = gaussian_filter(rng.random((9, 50, 60)), 2) * 2 + rng.random((9, 50, 60)) * 0.3
+    img[3, 10:20, 10:30] += 1.5  # a bright object
+    img = (img - img.min()) / (img.max() - img.min())
+    if np.dtype(dtype).kind == "f":
+        return (img * 100 - 20).astype(dtype)
+    return (img * (200 if dtype == np.uint8 else 4000)).astype(dtype)
+
+
+@pytest.mark.parametrize("z_chunk", [1, 4, 20])
+@pytest.mark.parametrize("dtype", DTYPES)
+@pytest.mark.parametrize("seed", [0, 1])
+def test_matches_skimage_and_numpy(seed, dtype, z_chunk):
+    img = _image(seed, dtype)
+    assert histogram_threshold(img, "otsu", z_chunk=z_chunk) == threshold_otsu(img)
+    assert histogram_threshold(img, "triangle", z_chunk=z_chunk) == threshold_triangle(img)
+    np.testing.assert_array_equal(histogram_threshold(img, "multiotsu", z_chunk=z_chunk), threshold_multiotsu(img))
+    assert histogram_threshold(img, "median", z_chunk=z_chunk) == np.median(img)
+
+    thresholds = histogram_thresholds(img, ["tri", "med", "ave_tri_med"], z_chunk=z_chunk)
+    assert thresholds["ave_tri_med"] == (threshold_triangle(img) + np.median(img)) / 2
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.int32])
+def test_li_is_exact_on_integers(dtype):
+    img = _image(2, dtype)
+    assert histogram_threshold(img, "li", z_chunk=4) == pytest.approx(threshold_li(img), rel=1e-12)
+
+
+def test_li_on_floats_is_accurate_to_the_bin():
+    img = _image(2, np.float64)
+    bin_width = (img.max() - img.min()) / 256
+    assert abs(histogram_threshold(img, "li") - threshold_li(img)) < bin_width
+
+
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_log_scale_matches_log_transformed_image(dtype):
+    img = _image(3, dtype)
+    if np.dtype(dtype).kind == "f":
+        img = img - img.min() + 1
+    log_img, log_params = log_transform(img)
+
+    thresholds = histogram_thresholds(img, ["otsu", "triangle", "median"], log_scale=True, z_chunk=4)
+    expected = {"otsu": threshold_otsu(log_img), "triangle": threshold_triangle(log_img), "median": np.median(log_img)}
+    for method, threshold in expected.items():
+        assert thresholds[method] == pytest.approx(inverse_log_transform(threshold, log_params), rel=1e-12), method
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.int32])
+@pytest.mark.parametrize("seed", [3, 4])
+def test_li_log_is_exact_on_integers(seed, dtype):
+    img = _image(seed, dtype)
+    img[0, 0, :5] = 0  # under the noise floor of the log transform
+    log_img, log_params = log_transform(img)
+    expected = inverse_log_transform(threshold_li(log_img), log_params)
+
+    assert histogram_threshold(img, "li", log_scale=True, z_chunk=4) == pytest.approx(expected, rel=1e-12)
+    assert threshold_li_log(img) == pytest.approx(expected, rel=1e-12)
+    np.testing.assert_array_equal(img > threshold_li_log(img), img > expected)
+
+
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_constant_image(dtype):
+    img = np.full((3, 10, 10), 7, dtype=dtype)
+    for method in ("otsu", "triangle", "median", "li"):
+        assert histogram_threshold(img, method) == 7
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        histogram_threshold(_image(0, np.uint16), "unknown")
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from scipy.ndimage import gaussian_filter
+from aicssegmentation.core.MO_threshold import MO
+from aicssegmentation.core.utils import hole_filling, size_filter
+
+from infer_subc.core.img import fill_and_filter_linear_size, masked_object_thresh
+
+# masked_object_thresh and fill_and_filter_linear_size are reimplementations of aicssegmentation functions
+#   (MO; hole_filling then size_filter) which must give the exact same segmentations
+
+
+def _smooth_image(seed: int, shape=(6, 96, 112), sigma=(0.8, 2.0, 2.0), dtype=np.float64) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    img = gaussian_filter(rng.random(shape), sigma)
+    return ((img - img.min()) / (img.max() - img.min())).astype(dtype)
+
+
+def _mask(seed: int, percentile: float) -> np.ndarray:
+    # speckled mask: objects and holes of all sizes
+    img = _smooth_image(seed, sigma=(0.5, 1.0, 1.0))
+    return img > np.percentile(img, percentile)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+@pytest.mark.parametrize("global_method", ["triangle", "median", "ave_tri_med"])
+@pytest.mark.parametrize("cutoff_size", [0, 50, 400])
+@pytest.mark.parametrize("local_adjust", [0.5, 0.9, 1.2])
+@pytest.mark.parametrize("extra_criteria", [True, False])
+def test_masked_object_thresh_matches_MO(seed, dtype, global_method, cutoff_size, local_adjust, extra_criteria):
+    img = _smooth_image(seed, dtype=dtype)
+    expected = MO(
+        img,
+        global_thresh_method=global_method,
+        object_minArea=cutoff_size,
+        extra_criteria=extra_criteria,
+        local_adjust=local_adjust,
+        return_object=False,
+        dilate=False,
+    )
+    result = masked_object_thresh(img, global_method, cutoff_size, local_adjust, extra_criteria=extra_criteria)
+    assert result.dtype == bool
+    np.testing.assert_array_equal(result, expected > 0)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("percentile", [40, 70])
+@pytest.mark.parametrize("method", ["3D", "slice_by_slice"])
+@pytest.mark.parametrize("connectivity", [1, 2, 3])
+@pytest.mark.parametrize("hole_min, hole_max, min_size", [(0, 0, 2), (0, 2, 2), (1, 3, 0), (2, 4, 3)])
+def test_fill_and_filter_linear_size_matches_aicssegmentation(
+    seed, percentile, method, connectivity, hole_min, hole_max, min_size
+):
+    bw = _mask(seed, percentile)
+    power = 3 if method == "3D" else 2
+    expected = bw
+    if hole_max > 0:
+        expected = hole_filling(expected, hole_min=hole_min**power, hole_max=hole_max**power, fill_2d=method != "3D")
+    expected = size_filter(expected, min_size=min_size**power, method=method, connectivity=connectivity)
+
+    result = fill_and_filter_linear_size(bw, hole_min, hole_max, min_size, method=method, connectivity=connectivity)
+    np.testing.assert_array_equal(result > 0, expected > 0)
+
+
+def test_fill_and_filter_linear_size_empty_image():
+    bw = np.zeros((3, 20, 20), dtype=bool)
+    result = fill_and_filter_linear_size(bw, 0, 4, 2, method="slice_by_slice")
+    assert not result.any()
@@ -0,0 +1,137 @@
+import numpy as np
+import pytest
+
+from scipy.ndimage import find_objects
+
+from infer_subc.core.img import get_max_label
+from infer_subc.core.label_reductions import (
+    label_bbox,
+    label_count,
+    label_index,
+    label_max,
+    label_mean,
+    label_statistics,
+    label_sum,
+)
+
+# the one-pass reductions must give the same values as the per-label loops they replace
+
+
+def _labels(seed: int, values, shape=(5, 40, 50), dtype=np.uint16) -> np.ndarray:
+    # blocky labels with the given (possibly non-contiguous) values, and background
+    rng = np.random.default_rng(seed)
+    blocks = rng.choice(np.asarray([0, *values]), size=(shape[0], shape[1] // 5, shape[2] // 5))
+    return np.kron(blocks, np.ones((1, 5, 5), dtype=int)).astype(dtype)
+
+
+def _image(seed: int, shape=(5, 40, 50), dtype=np.float64) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    if np.dtype(dtype).kind == "f":
+        return (rng.standard_normal(shape) * 100).astype(dtype)  # negative values too
+    return rng.integers(0, np.iinfo(dtype).max, size=shape, dtype=dtype)
+
+
+def _loop(image: np.ndarray, labels: np.ndarray, index) -> dict:
+    masks = [labels == label for label in index]
+    return {
+        "count": np.array([mask.sum() for mask in masks], dtype=np.intp),
+        "sum": np.array([image[mask].sum(dtype=np.float64) for mask in masks]),
+        "mean": np.array([image[mask].mean(dtype=np.float64) if mask.any() else 0.0 for mask in masks]),
+        "max": np.array([image[mask].max() if mask.any() else 0 for mask in masks], dtype=image.dtype),
+    }
+
+
+@pytest.mark.parametrize(
+    "values, labels_dtype",
+    [
+        ([1, 2, 3, 4], np.uint16),
+        ([3, 7, 250, 1000], np.uint16),  # non-contiguous
+        ([2, 9, 40], np.uint8),
+        ([5, 70000], np.int32),
+    ],
+)
+@pytest.mark.parametrize("image_dtype", [np.float64, np.float32, np.uint16, np.uint8])
+def test_reductions_match_label_loop(values, labels_dtype, image_dtype):
+    labels = _labels(0, values, dtype=labels_dtype)
+    image = _image(1, dtype=image_dtype)
+    index = np.unique(labels)[1:]
+    expected = _loop(image, labels, index)
+
+    np.testing.assert_array_equal(label_index(labels), index)
+    np.testing.assert_array_equal(label_count(labels), expected["count"])
+    np.testing.assert_allclose(label_sum(image, labels), expected["sum"], rtol=1e-12)
+    np.testing.assert_allclose(label_mean(image, labels), expected["mean"], rtol=1e-12)
+    maxima = label_max(image, labels)
+    assert maxima.dtype == image.dtype
+    np.testing.assert_array_equal(maxima, expected["max"])
+
+    statistics = label_statistics(image, labels)
+    np.testing.assert_array_equal(statistics["count"], expected["count"])
+    np.testing.assert_allclose(statistics["sum"], expected["sum"], rtol=1e-12)
+    np.testing.assert_allclose(statistics["mean"], expected["mean"], rtol=1e-12)
+    np.testing.assert_array_equal(statistics["max"], expected["max"])
+
+
+def test_explicit_index():
+    labels = _labels(2, [3, 7, 250])
+    image = _image(3)
+    # any order, repeated labels, absent labels (100, and 2000 beyond the largest label) and the background
+    index = [250, 3, 100, 3, 2000, 0]
+    expected = _loop(image, labels, index)
+
+    np.testing.assert_array_equal(label_count(labels, index), expected["count"])
+    np.testing.assert_allclose(label_sum(image, labels, index), expected["sum"], rtol=1e-12)
+    np.testing.assert_allclose(label_mean(image, labels, index), expected["mean"], rtol=1e-12)
+    np.testing.assert_array_equal(label_max(image, labels, index), expected["max"])
+
+    objects = find_objects(labels)
+    assert label_bbox(labels, index) == [objects[249], objects[2], None, objects[2], None, None]
+    assert label_bbox(labels) == [objects[i - 1] for i in (3, 7, 250)]
+
+
+@pytest.mark.parametrize("shape", [(4, 10, 10), (0, 10, 10)])
+def test_empty_labels(shape):
+    labels = np.zeros(shape, dtype=np.uint16)
+    image = np.ones(shape, dtype=np.float32)
+
+    assert len(label_index(labels)) == 0
+    for result in label_statistics(image, labels).values():
+        assert len(result) == 0
+    assert label_bbox(labels) == []
+    # labels asked for explicitly but absent
+    np.testing.assert_array_equal(label_count(labels, [1, 4]), [0, 0])
+    np.testing.assert_array_equal(label_mean(image, labels, [1, 4]), [0, 0])
+    np.testing.assert_array_equal(label_max(image, labels, [1, 4]), [0, 0])
+
+
+def test_bool_labels_and_image():
+    mask = _labels(4, [1]).astype(bool)
+    image = _labels(5, [1]).astype(bool)
+    np.testing.assert_array_equal(label_index(mask), [1])
+    np.testing.assert_array_equal(label_count(mask), [mask.sum()])
+    np.testing.assert_array_equal(label_sum(image, mask), [np.sum(image & mask)])
+    np.testing.assert_array_equal(label_max(image, mask), [np.any(image & mask)])
+
+
+def test_invalid_arguments():
+    labels = _labels(0, [1, 2])
+    with pytest.raises(ValueError):
+        label_count(labels.astype(np.float32))
+    with pytest.raises(ValueError):
+        label_sum(np.ones((2, 2)), labels)
+    with pytest.raises(ValueError):
+        label_statistics(None, labels, statistics=("count", "sum"))
+    with pytest.raises(ValueError):
+        label_statistics(_image(0), labels, statistics=("median",))
+
+
+@pytest.mark.parametrize("values", [[1, 2, 3], [4, 90, 300]])
+def test_get_max_label_matches_label_loop(values):
+    labels = _labels(6, values)
+    image = _image(7, dtype=np.uint16)
+    all_labels = np.unique(labels)[1:]
+    expected = all_labels[np.argmax([image[labels == label].sum() for label in all_labels])]
+
+    keep_label = get_max_label(image, labels)
+    assert keep_label == expected
+    assert keep_label.dtype == labels.dtype
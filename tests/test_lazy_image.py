@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from aicsimageio.types import PhysicalPixelSizes
+from aicsimageio.writers import OmeTiffWriter
+
+from infer_subc.core.file_io import LazyImage, get_raw_meta_data, read_ome_image
+from infer_subc.core.img import select_channel_from_raw
+from infer_subc.core.zslice import find_optimal_Z
+
+# a LazyImage must read the same pixels and meta data as read_ome_image
+
+
+@pytest.fixture(scope="module")
+def image_path(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 4000, size=(4, 5, 32, 40), dtype=np.uint16)
+    path = tmp_path_factory.mktemp("raw") / "cells.ome.tiff"
+    OmeTiffWriter.save(
+        data,
+        path,
+        dim_order="CZYX",
+        channel_names=["nuclei", "lyso", "mito", "golgi"],
+        physical_pixel_sizes=PhysicalPixelSizes(0.4, 0.08, 0.08),
+    )
+    return path
+
+
+@pytest.fixture(scope="module")
+def expected(image_path):
+    return read_ome_image(image_path)
+
+
+def test_header(image_path, expected):
+    data, meta = expected
+    image = LazyImage(image_path)
+    assert image.shape == data.shape
+    assert image.ndim == data.ndim
+    assert image.dtype == data.dtype
+    assert image.dims == "CZYX"
+    assert len(image) == data.shape[0]
+    assert image.channel_names == ["nuclei", "lyso", "mito", "golgi"]
+    np.testing.assert_allclose(image.scale, meta["scale"])
+    np.testing.assert_allclose(image.scale, (0.4, 0.08, 0.08))
+
+
+@pytest.mark.parametrize(
+    "key",
+    [2, (1, 3), (slice(None), 2), ([0, 2],), (3, slice(1, 4), slice(5, 20), slice(None, None, 2)), (-1, -1)],
+)
+def test_indexing(key, image_path, expected):
+    data = expected[0]
+    result = LazyImage(image_path)[key]
+    assert isinstance(result, np.ndarray)
+    np.testing.assert_array_equal(result, data[key])
+
+
+def test_get_channels(image_path, expected):
+    data = expected[0]
+    image = LazyImage(image_path)
+    np.testing.assert_array_equal(image.get_channels(1), data[1])
+    np.testing.assert_array_equal(image.get_channels([3, 0]), data[[3, 0]])
+    np.testing.assert_array_equal(image.get_channels((0, 2), z_range=(1, 3)), data[[0, 2], 1:3])
+    np.testing.assert_array_equal(np.asarray(image), data)
+    np.testing.assert_array_equal(image.to_dask().compute(), data)
+
+
+def test_meta(image_path, expected):
+    meta = expected[1]
+    lazy_meta = LazyImage(image_path).meta
+    for key in ("name", "channel_axis", "scale", "file_name"):
+        assert lazy_meta[key] == meta[key], key
+    # the raw meta data is parsed on demand
+    assert "raw_image_metadata" not in lazy_meta["metadata"]
+    assert lazy_meta["metadata"]["aicsimage"].dims.order == meta["metadata"]["aicsimage"].dims.order
+    raw_meta, ome_types = get_raw_meta_data(lazy_meta)
+    expected_raw_meta, expected_ome_types = get_raw_meta_data(meta)
+    assert raw_meta == expected_raw_meta
+    assert ome_types == expected_ome_types
+    assert lazy_meta["metadata"].get("ome_types") is lazy_meta["metadata"]["ome_types"]
+    assert lazy_meta["metadata"].get("unknown") is None
+    with pytest.raises(KeyError):
+        lazy_meta["metadata"]["unknown"]
+
+
+def test_used_in_place_of_the_array(image_path, expected):
+    data = expected[0]
+    image = LazyImage(image_path)
+    np.testing.assert_array_equal(select_channel_from_raw(image, 2), data[2])
+    assert find_optimal_Z(image, 0, (1, 2), method="stream") == find_optimal_Z(data, 0, (1, 2), method="stream")
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from scipy.ndimage import gaussian_filter, median_filter
+from aicssegmentation.core.seg_dot import dot_2d_slice_by_slice_wrapper
+from aicssegmentation.core.vessel import filament_2d_wrapper, vesselnessSliceBySlice
+
+from infer_subc.core.img import (
+    dot_filter_3,
+    filament_filter_3,
+    fill_and_filter_linear_size,
+    get_slice_max_workers,
+    map_slices,
+    median_filter_slice_by_slice,
+    scale_and_smooth,
+    set_slice_max_workers,
+    size_filter_linear_size,
+    vesselness_slice_by_slice,
+)
+
+# the slice-by-slice functions must give the same results on a thread pool as serially (and as the
+#   scipy loops and aicssegmentation wrappers they replace)
+
+
+@pytest.fixture(scope="module")
+def image() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    img = gaussian_filter(rng.random((7, 70, 80)), (0, 1.5, 1.5))
+    return (img - img.min()) / (img.max() - img.min())
+
+
+@pytest.fixture
+def slice_max_workers():
+    previous = get_slice_max_workers()
+    yield
+    set_slice_max_workers(previous)
+
+
+SLICE_FUNCTIONS = {
+    "median": lambda img, w: median_filter_slice_by_slice(img, 3, max_workers=w),
+    "vesselness": lambda img, w: vesselness_slice_by_slice(img, sigma=1.5, cutoff=-1, tau=0.75, max_workers=w),
+    "scale_and_smooth": lambda img, w: scale_and_smooth(img, 3, 1.34, max_workers=w),
+    "dots": lambda img, w: dot_filter_3(img, 1, 0.02, 2, 0.01, 0, 0, "slice_by_slice", max_workers=w),
+    "filaments": lambda img, w: filament_filter_3(img, 1, 0.05, 2, 0.05, 0, 0, "slice_by_slice", max_workers=w),
+    "fill_filter": lambda img, w: fill_and_filter_linear_size(img > 0.5, 1, 4, 3, max_workers=w),
+    "size_filter": lambda img, w: size_filter_linear_size(img > 0.5, 3, connectivity=2, max_workers=w),
+}
+
+
+@pytest.mark.parametrize("max_workers", [2, 4, 16])
+@pytest.mark.parametrize("name", sorted(SLICE_FUNCTIONS))
+def test_threads_match_serial(name, max_workers, image):
+    function = SLICE_FUNCTIONS[name]
+    expected = function(image, 1)
+    result = function(image, max_workers)
+    assert result.dtype == expected.dtype
+    np.testing.assert_array_equal(result, expected)
+
+
+@pytest.mark.parametrize("name", sorted(SLICE_FUNCTIONS))
+def test_package_setting_matches_serial(name, image, slice_max_workers):
+    function = SLICE_FUNCTIONS[name]
+    expected = function(image, 1)
+    set_slice_max_workers(3)
+    np.testing.assert_array_equal(function(image, None), expected)
+
+
+def test_invalid_setting(slice_max_workers):
+    for max_workers in (0, None):
+        with pytest.raises(ValueError):
+            set_slice_max_workers(max_workers)
+    assert get_slice_max_workers() == 1
+
+
+def test_same_as_replaced_loops(image):
+    np.testing.assert_array_equal(
+        median_filter_slice_by_slice(image, 3, max_workers=3),
+        np.stack([median_filter(plane, size=3) for plane in image]),
+    )
+    np.testing.assert_array_equal(
+        # vesselnessSliceBySlice ignores its tau argument and uses 1
+        vesselness_slice_by_slice(image, sigma=1.5, cutoff=-1, tau=1, max_workers=3),
+        vesselnessSliceBySlice(image, sigmas=[1.5], tau=1, whiteonblack=True),
+    )
+    np.testing.assert_array_equal(
+        dot_filter_3(image, 1, 0.02, 2, 0.01, 0, 0, "slice_by_slice", max_workers=3),
+        dot_2d_slice_by_slice_wrapper(image, [[1, 0.02], [2, 0.01]]),
+    )
+    np.testing.assert_array_equal(
+        filament_filter_3(image, 1, 0.05, 2, 0.05, 0, 0, "slice_by_slice", max_workers=3),
+        filament_2d_wrapper(image, [[1, 0.05], [2, 0.05]]),
+    )
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_map_slices(max_workers, use_processes, image):
+    expected = np.stack([gaussian_filter(plane, 2.0) for plane in image]).astype(np.float32)
+    out = np.zeros(image.shape, dtype=np.float32)
+    result = map_slices(gaussian_filter, image, 2.0, out=out, max_workers=max_workers, use_processes=use_processes)
+    assert result is out
+    np.testing.assert_array_equal(result, expected)
+
+    # keyword arguments, and a new output of the given dtype
+    result = map_slices(median_filter, image, dtype=np.float32, max_workers=max_workers, size=3)
+    assert result.dtype == np.float32
+    expected = np.stack([median_filter(plane, size=3) for plane in image]).astype(np.float32)
+    np.testing.assert_array_equal(result, expected)
@@ -0,0 +1,133 @@
+import logging
+import numpy as np
+import pytest
+
+from scipy.ndimage import gaussian_filter
+
+from infer_subc.organelles import infer_ER, infer_golgi, infer_LD, infer_lyso, infer_mito, infer_perox
+from infer_subc.workflow.parameter_sweep import SWEEP_STAGES, make_grid, sweep_infer
+
+# SWEEP_STAGES re-expresses every infer_* function as a workflow: each entry must segment exactly like the function
+
+_DOTS = dict(dot_scale_1=1, dot_cut_1=0.02, dot_scale_2=2, dot_cut_2=0.03, dot_scale_3=0, dot_cut_3=0, dot_method="3D")
+_FILAMENTS = dict(
+    fil_scale_1=1, fil_cut_1=0.05, fil_scale_2=0, fil_cut_2=0, fil_scale_3=0, fil_cut_3=0, fil_method="slice_by_slice"
+)
+_FILL_FILTER = dict(min_hole_w=0, max_hole_w=4, small_obj_w=2, fill_filter_method="3D")
+_SMOOTHING = dict(median_sz=3, gauss_sig=1.34)
+
+INFER_PARAMS = {
+    infer_lyso: dict(lyso_ch=1, **_SMOOTHING, **_DOTS, **_FILAMENTS, **_FILL_FILTER),
+    infer_mito: dict(mito_ch=2, **_SMOOTHING, **_DOTS, **_FILAMENTS, **_FILL_FILTER),
+    infer_golgi: dict(
+        golgi_ch=3,
+        **_SMOOTHING,
+        mo_method="tri",
+        mo_adjust=0.9,
+        mo_cutoff_size=100,
+        min_thickness=1,
+        thin_dist=1,
+        **_DOTS,
+        **_FILL_FILTER,
+    ),
+    infer_perox: dict(
+        perox_ch=0,
+        **_SMOOTHING,
+        **_DOTS,
+        hole_min_width=0,
+        hole_max_width=4,
+        small_object_width=2,
+        fill_filter_method="slice_by_slice",
+    ),
+    infer_LD: dict(
+        LD_ch=0, **_SMOOTHING, method="otsu", thresh_factor=1.0, thresh_min=0.1, thresh_max=1.0, **_FILL_FILTER
+    ),
+    infer_ER: dict(
+        ER_ch=1,
+        **_SMOOTHING,
+        MO_thresh_method="tri",
+        MO_cutoff_size=100,
+        MO_thresh_adj=0.9,
+        **_FILAMENTS,
+        **_FILL_FILTER,
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def image() -> np.ndarray:
+    rng = np.random.default_rng(1)
+    img = gaussian_filter(rng.random((4, 8, 120, 130)), (0, 0, 2, 2)) * 5000 + rng.random((4, 8, 120, 130)) * 500
+    return img.astype(np.uint16)
+
+
+def test_every_sweep_entry_is_tested():
+    assert sorted(SWEEP_STAGES.keys()) == sorted(f.__name__ for f in INFER_PARAMS)
+
+
+@pytest.mark.parametrize("infer_function", list(INFER_PARAMS), ids=lambda f: f.__name__)
+def test_sweep_stages_match_infer_function(infer_function, image):
+    params = INFER_PARAMS[infer_function]
+    result = sweep_infer(infer_function, image, params, {})
+    assert len(result) == 1
+    np.testing.assert_array_equal(result[0]["labels"], infer_function(image, **params))
+
+
+GRID = {"dot_cut_1": [0.01, 0.03], "small_obj_w": [1, 3]}
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_grid_points_match_infer_function(parallel, image):
+    params = INFER_PARAMS[infer_lyso]
+    results = sweep_infer(infer_lyso, image, params, GRID, parallel=parallel)
+
+    # grid order: the last argument varies fastest
+    assert [result["parameters"] for result in results] == make_grid(GRID)
+    assert make_grid(GRID) == [
+        {"dot_cut_1": 0.01, "small_obj_w": 1},
+        {"dot_cut_1": 0.01, "small_obj_w": 3},
+        {"dot_cut_1": 0.03, "small_obj_w": 1},
+        {"dot_cut_1": 0.03, "small_obj_w": 3},
+    ]
+    for result in results:
+        expected = infer_lyso(image, **{**params, **result["parameters"]})
+        np.testing.assert_array_equal(result["labels"], expected, err_msg=str(result["parameters"]))
+    assert len({result["labels"].tobytes() for result in results}) == len(results)
+
+
+def test_shared_stages_are_run_once(image, caplog):
+    with caplog.at_level(logging.INFO):
+        sweep_infer("infer_lyso", image, INFER_PARAMS[infer_lyso], GRID)
+    # 4 points x 7 stages: extraction, smoothing and filament filter run once, the dot filter and its union
+    #   with the filaments once per dot cutoff, and the fill/filter and labeling once per point
+    assert "4 points: 15 of 28 steps run" in caplog.text
+
+
+def test_summary(image):
+    params = INFER_PARAMS[infer_lyso]
+    labels = sweep_infer(infer_lyso, image, params, GRID)
+    summaries = sweep_infer(infer_lyso, image, params, GRID, summary=True)
+
+    for result, summary in zip(labels, summaries):
+        assert summary["parameters"] == result["parameters"]
+        assert summary["count"] == len(np.unique(result["labels"][result["labels"] > 0]))
+        assert summary["volume"] == np.count_nonzero(result["labels"])
+        assert "labels" not in summary
+
+
+@pytest.mark.parametrize(
+    "params, grid",
+    [
+        ({**INFER_PARAMS[infer_lyso], "unknown": 1}, {}),  # unknown argument
+        ({k: v for k, v in INFER_PARAMS[infer_lyso].items() if k != "dot_cut_1"}, {}),  # missing argument
+        (INFER_PARAMS[infer_lyso], {"dot_cut_1": 0.01}),  # grid values are not a list
+    ],
+)
+def test_invalid_sweeps(params, grid, image):
+    with pytest.raises(ValueError):
+        sweep_infer(infer_lyso, image, params, grid)
+
+
+def test_unknown_function(image):
+    with pytest.raises(ValueError):
+        sweep_infer(np.sum, image, {}, {})
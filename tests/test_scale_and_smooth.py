@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from scipy.ndimage import gaussian_filter, median_filter
+from aicssegmentation.core.pre_processing_utils import image_smoothing_gaussian_slice_by_slice
+
+from infer_subc.core.img import get_anisotropic_sizes, min_max_intensity_normalization, scale_and_smooth
+from infer_subc.utils.directories import Directories
+from infer_subc.workflow.chunked_workflow import ChunkedWorkflow
+from infer_subc.workflow.workflow import Workflow
+from infer_subc.workflow.workflow_config import WorkflowConfig
+
+SCALE = (0.3, 0.1, 0.1)  # Z, Y, X pixel sizes: Z pixels 3 times as deep as they are wide
+
+
+@pytest.fixture(scope="module")
+def image() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    img = gaussian_filter(rng.random((10, 60, 70)), (0.5, 1.5, 1.5)) * 5000 + rng.random((10, 60, 70)) * 500
+    return img.astype(np.uint16)
+
+
+@pytest.mark.parametrize(
+    "size, scale, expected",
+    [
+        (3, SCALE, (1.0, 3.0, 3.0)),
+        (1.5, (0.4, 0.2, 0.1), (0.375, 0.75, 1.5)),
+        (2, (0.1, 0.1, 0.1), (2.0, 2.0, 2.0)),
+        # isotropic without a usable scale
+        (2, None, (2.0, 2.0, 2.0)),
+        (2, (0.1, 0.1), (2.0, 2.0, 2.0)),
+        (2, (0.0, 0.1, 0.1), (2.0, 2.0, 2.0)),
+    ],
+)
+def test_get_anisotropic_sizes(size, scale, expected):
+    np.testing.assert_allclose(get_anisotropic_sizes(size, scale), expected)
+
+
+@pytest.mark.parametrize("median_size", [0, 3, 5])
+@pytest.mark.parametrize("gauss_sigma", [1.34, 3.0])
+def test_3d_matches_scaled_filters(median_size, gauss_sigma, image):
+    original = image.copy()
+    result = scale_and_smooth(image, median_size, gauss_sigma, slice_by_slice=False, scale=SCALE)
+    np.testing.assert_array_equal(image, original)
+
+    expected = min_max_intensity_normalization(image)
+    if median_size > 1:
+        expected = median_filter(expected, size=[max(1, round(median_size / 3)), median_size, median_size])
+    sigmas = [gauss_sigma / 3, gauss_sigma, gauss_sigma]
+    expected = gaussian_filter(expected, sigma=sigmas, mode="nearest", truncate=3.0)
+    assert result.dtype == expected.dtype
+    np.testing.assert_allclose(result, expected, rtol=1e-12, atol=1e-12)
+
+
+def test_3d_isotropic_without_scale(image):
+    isotropic = scale_and_smooth(image, 3, 1.34, slice_by_slice=False, scale=(0.1, 0.1, 0.1))
+    np.testing.assert_array_equal(scale_and_smooth(image, 3, 1.34, slice_by_slice=False), isotropic)
+    expected = gaussian_filter(
+        median_filter(min_max_intensity_normalization(image), size=3), sigma=1.34, mode="nearest", truncate=3.0
+    )
+    np.testing.assert_allclose(isotropic, expected, rtol=1e-12, atol=1e-12)
+
+
+def test_3d_smooths_same_physical_width():
+    # a point smoothed in 3D spreads over the same physical distance along Z as along X
+    img = np.zeros((31, 41, 41), dtype=np.uint16)
+    img[15, 20, 20] = 1000
+    result = scale_and_smooth(img, 0, 4.5, slice_by_slice=False, scale=SCALE)
+    z, x = result[:, 20, 20], result[15, 20, :]
+    variance_z = np.sum(z * (np.arange(31) - 15) ** 2) / z.sum()
+    variance_x = np.sum(x * (np.arange(41) - 20) ** 2) / x.sum()
+    np.testing.assert_allclose(variance_z * SCALE[0] ** 2, variance_x * SCALE[2] ** 2, rtol=0.05)
+
+
+def test_slice_by_slice_ignores_scale(image):
+    result = scale_and_smooth(image, 3, 1.34, slice_by_slice=True, scale=SCALE)
+    np.testing.assert_array_equal(result, scale_and_smooth(image, 3, 1.34))
+    expected = min_max_intensity_normalization(image)
+    expected = np.stack([median_filter(plane, size=3) for plane in expected])
+    np.testing.assert_allclose(
+        result, image_smoothing_gaussian_slice_by_slice(expected, sigma=1.34), rtol=1e-12, atol=1e-12
+    )
+    assert not np.allclose(result, scale_and_smooth(image, 3, 1.34, slice_by_slice=False, scale=SCALE))
+
+
+@pytest.mark.parametrize("scale", [SCALE, None])
+def test_3d_workflow_step(scale, image):
+    # the 3D mode chosen in a workflow definition (see the scale_and_smooth entry of all_functions.json)
+    definition = WorkflowConfig().get_workflow_definition_from_config_file(
+        Directories.get_structure_config_dir() / "conf_0.2.lyso.json"
+    )
+    smoothing = next(step for step in definition.steps if step.function.name == "scale_and_smooth")
+    smoothing.parameter_values["slice_by_slice"] = False
+    if scale is not None:
+        smoothing.parameter_values["scale"] = list(scale)
+    channels = np.stack([image] * 6)
+
+    workflow = Workflow(definition, channels)
+    expected = workflow.execute_all()
+    smoothed = workflow.get_result(smoothing.step_number - 1)
+    np.testing.assert_array_equal(
+        smoothed,
+        scale_and_smooth(
+            image,
+            smoothing.parameter_values["median_size"],
+            smoothing.parameter_values["gauss_sigma"],
+            slice_by_slice=False,
+            scale=scale,
+        ),
+    )
+    result = ChunkedWorkflow(definition, channels, chunk_size=(32, 40)).execute_all()
+    np.testing.assert_array_equal(np.asarray(result), np.asarray(expected))
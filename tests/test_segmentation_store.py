@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("zarr")
+
+from infer_subc.core.file_io import export_inferred_organelle, import_inferred_organelle, read_tiff_image
+from infer_subc.core.zarr_store import SegmentationStore, is_zarr_available, is_zarr_path
+from infer_subc.utils.batch import find_segmentation_tiff_files
+
+if not is_zarr_available():
+    pytest.skip("zarr 2 is not installed", allow_module_level=True)
+
+SCALE = (0.4, 0.08, 0.08)
+NAMES = ["lyso", "mito", "cell"]
+
+
+@pytest.fixture
+def raw_path(tmp_path):
+    path = tmp_path / "raw" / "cells-1.czi"
+    path.parent.mkdir()
+    path.write_bytes(b"")  # only its name is used
+    return path
+
+
+@pytest.fixture
+def segmentations():
+    rng = np.random.default_rng(0)
+    return {
+        "lyso": rng.integers(0, 300, size=(5, 40, 50)).astype(np.uint16),  # labels
+        "mito": rng.random((5, 40, 50)) > 0.7,  # mask
+        "cell": (rng.random((5, 40, 50)) > 0.5).astype(np.uint8),  # uint8 mask
+    }
+
+
+def _export_all(segmentations, raw_path, out_path):
+    meta = {"file_name": str(raw_path), "scale": SCALE}
+    return {name: export_inferred_organelle(data, name, meta, out_path) for name, data in segmentations.items()}
+
+
+def test_round_trip_same_as_tiff(segmentations, raw_path, tmp_path):
+    meta = {"file_name": str(raw_path), "scale": SCALE}
+    tiff_dir, store_path = tmp_path / "tiff", tmp_path / "segmentations.zarr"
+    _export_all(segmentations, raw_path, tiff_dir)
+    _export_all(segmentations, raw_path, store_path)
+    assert is_zarr_path(store_path) and not is_zarr_path(tiff_dir)
+
+    for name, data in segmentations.items():
+        from_tiff = import_inferred_organelle(name, meta, tiff_dir, ".tiff")
+        from_store = import_inferred_organelle(name, meta, store_path, ".tiff")
+        assert from_store.dtype == from_tiff.dtype
+        np.testing.assert_array_equal(from_store, from_tiff, err_msg=name)
+        np.testing.assert_array_equal(from_store > 0, data > 0, err_msg=name)
+    np.testing.assert_array_equal(import_inferred_organelle("lyso", meta, store_path, ".tiff"), segmentations["lyso"])
+
+    with pytest.raises(FileNotFoundError):
+        import_inferred_organelle("golgi", meta, store_path, ".tiff")
+
+
+def test_find_segmentation_files(segmentations, raw_path, tmp_path):
+    tiff_dir, store_path = tmp_path / "tiff", tmp_path / "segmentations.zarr"
+    _export_all(segmentations, raw_path, tiff_dir)
+    exported = _export_all(segmentations, raw_path, store_path)
+
+    names = NAMES + ["golgi"]
+    tiff_files = find_segmentation_tiff_files(raw_path, names, tiff_dir, suffix="-")
+    store_files = find_segmentation_tiff_files(raw_path, names, store_path)
+    assert store_files["raw"] == raw_path
+    assert store_files["golgi"] is None
+    for name in NAMES:
+        assert str(store_files[name]) == exported[name]
+        np.testing.assert_array_equal(read_tiff_image(store_files[name]), read_tiff_image(tiff_files[name]))
+
+
+def test_store(segmentations, tmp_path):
+    store = SegmentationStore(tmp_path / "store.zarr", chunk_yx=(16, 32))
+    store.write("cells-1", "lyso", segmentations["lyso"], scale=SCALE, provenance={"source": "cells-1.czi"})
+    store.write("cells-2", "lyso", segmentations["lyso"][:2])
+    store.write("cells-2", "cell", segmentations["cell"])
+
+    assert store.images() == ["cells-1", "cells-2"]
+    assert store.names("cells-2") == ["cell", "lyso"]
+    assert store.names("cells-3") == []
+    assert store.contains("cells-1", "lyso") and not store.contains("cells-1", "cell")
+    assert store.get_array("cells-1", "lyso").chunks == (1, 16, 32)
+
+    # regions are read from the chunks covering them
+    np.testing.assert_array_equal(store.read("cells-1", "lyso"), segmentations["lyso"])
+    region = (slice(1, 3), slice(10, 30), 7)
+    np.testing.assert_array_equal(store.read("cells-1", "lyso", region), segmentations["lyso"][region])
+
+    attrs = store.attrs("cells-1", "lyso")
+    np.testing.assert_allclose(attrs["scale"], SCALE)
+    assert attrs["provenance"]["source"] == "cells-1.czi"
+    assert "infer_subc_version" in attrs["provenance"] and "created" in attrs["provenance"]
+    assert store.attrs("cells-2", "lyso")["scale"] is None
+
+    # overwritten
+    store.write("cells-2", "lyso", segmentations["lyso"])
+    np.testing.assert_array_equal(store.read("cells-2", "lyso"), segmentations["lyso"])
+
+
+def test_read_only(segmentations, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        SegmentationStore(tmp_path / "missing.zarr", mode="r")
+    SegmentationStore(tmp_path / "store.zarr").write("cells-1", "lyso", segmentations["lyso"])
+
+    store = SegmentationStore(tmp_path / "store.zarr", mode="r")
+    np.testing.assert_array_equal(store.read("cells-1", "lyso"), segmentations["lyso"])
+    with pytest.raises(ValueError):
+        store.write("cells-1", "mito", segmentations["mito"])
+    with pytest.raises(FileNotFoundError):
+        store.read("cells-1", "mito")
+    with pytest.raises(ValueError):
+        SegmentationStore(tmp_path / "store.zarr", mode="w")
@@ -0,0 +1,113 @@
+import os
+import numpy as np
+import pytest
+
+from infer_subc.utils.directories import Directories
+from infer_subc.workflow import step_cache
+from infer_subc.workflow.step_cache import StepCache
+from infer_subc.workflow.workflow import Workflow
+from infer_subc.workflow.workflow_config import WorkflowConfig
+
+
+@pytest.fixture
+def definition():
+    return WorkflowConfig().get_workflow_definition_from_config_file(
+        Directories.get_structure_config_dir() / "conf_0.2.lyso.json"
+    )
+
+
+@pytest.fixture
+def cache(tmp_path) -> StepCache:
+    return StepCache(tmp_path / "cache")
+
+
+def _image(seed: int = 0) -> np.ndarray:
+    return (np.random.default_rng(seed).random((8, 4, 40, 50)) * 1000).astype(np.uint16)
+
+
+def test_hit_and_miss(cache):
+    assert cache.get("missing") is None
+
+    result = np.arange(24, dtype=np.float32).reshape(2, 3, 4)
+    cache.put("key", result)
+    cached = cache.get("key")
+    assert cached.dtype == result.dtype
+    np.testing.assert_array_equal(cached, result)
+
+    # only numeric arrays are cached
+    cache.put("objects", np.array([object()]))
+    cache.put("not an array", [1, 2])
+    assert cache.get("objects") is None and cache.get("not an array") is None
+
+
+def test_cached_results_are_copy_on_write(cache):
+    cache.put("key", np.zeros((3, 4), dtype=np.uint16))
+    cached = cache.get("key")
+    assert isinstance(cached, np.memmap)
+
+    cached[0, 0] = 7  # e.g. a step modifying its input in place
+    assert cache.get("key")[0, 0] == 0
+
+
+def test_step_key_sensitivity(definition, monkeypatch, float32_mode):
+    step = definition.steps[1]
+    inputs = [StepCache.digest_array(_image())]
+    parameters = dict(step.parameter_values)
+    key = StepCache.step_key(step, inputs, parameters)
+
+    assert StepCache.step_key(step, inputs, dict(parameters)) == key
+    assert StepCache.step_key(step, [StepCache.digest_array(_image(1))], parameters) != key
+    assert StepCache.step_key(step, inputs, {**parameters, "median_size": parameters["median_size"] + 1}) != key
+    assert StepCache.step_key(definition.steps[2], inputs, parameters) != key
+
+    # float precision (float32_mode) and package version
+    from infer_subc import set_float_dtype
+
+    set_float_dtype(np.float64)
+    assert StepCache.step_key(step, inputs, parameters) != key
+    set_float_dtype(np.float32)
+    monkeypatch.setattr(step_cache, "get_module_version", lambda: "0.0.0-other")
+    assert StepCache.step_key(step, inputs, parameters) != key
+
+
+def test_digest_array_depends_on_dtype_and_shape():
+    image = np.zeros((4, 6), dtype=np.uint16)
+    digests = {
+        StepCache.digest_array(image),
+        StepCache.digest_array(image.astype(np.int16)),
+        StepCache.digest_array(image.reshape(6, 4)),
+    }
+    assert len(digests) == 3
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    result = np.zeros(1000, dtype=np.uint8)
+    cache = StepCache(tmp_path / "cache", max_bytes=3 * 1200)  # 3 results (with their .npy header)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, result)
+        os.utime(cache.cache_dir / f"{key}.npy", (1000 + i, 1000 + i))
+
+    assert cache.get("a") is not None  # now the most recently used
+    cache.put("d", result)
+    assert [key for key in "abcd" if cache.get(key) is not None] == ["a", "c", "d"]
+
+    cache.clear()
+    assert list(cache.cache_dir.glob("*.npy")) == []
+
+
+def test_workflow_reuses_cached_steps(definition, cache, monkeypatch):
+    image = _image()
+    expected = Workflow(definition, image).execute_all()
+    first = Workflow(definition, image, cache=cache).execute_all()
+    n_results = len(list(cache.cache_dir.glob("*.npy")))
+    assert n_results > 0
+
+    workflow = Workflow(definition, image, cache=cache)
+    # every step result is read from the cache: the steps are never executed
+    for step in definition.steps:
+        monkeypatch.setattr(step, "execute", None)
+    second = workflow.execute_all()
+
+    np.testing.assert_array_equal(first, expected)
+    np.testing.assert_array_equal(second, expected)
+    assert len(list(cache.cache_dir.glob("*.npy"))) == n_results
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from scipy.ndimage import gaussian_filter
+
+from infer_subc.utils.directories import Directories
+from infer_subc.workflow.workflow import Workflow
+from infer_subc.workflow.workflow_config import WorkflowConfig
+
+CONFIGS = [
+    "conf_0.1.masks",
+    "conf_0.1.masks_A",
+    "conf_0.2.lyso",
+    "conf_0.3.mito",
+    "conf_0.4.golgi",
+    "conf_0.5.perox",
+    "conf_0.6.ER",
+    "conf_0.7.LD",
+]
+
+
+def _definition(name: str):
+    return WorkflowConfig().get_workflow_definition_from_config_file(
+        Directories.get_structure_config_dir() / f"{name}.json"
+    )
+
+
+@pytest.fixture(scope="module")
+def image() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    img = gaussian_filter(rng.random((10, 6, 80, 90)), (0, 0, 1.5, 1.5)) * 5000 + rng.random((10, 6, 80, 90)) * 500
+    return img.astype(np.uint16)
+
+
+@pytest.mark.parametrize("max_workers", [None, 2])
+@pytest.mark.parametrize("config", CONFIGS)
+def test_parallel_matches_serial(config, max_workers, image):
+    definition = _definition(config)
+    serial = Workflow(definition, image)
+    expected = serial.execute_all()
+
+    workflow = Workflow(definition, image)
+    result = workflow.execute_all(parallel=True, max_workers=max_workers)
+    np.testing.assert_array_equal(result, expected)
+    assert workflow.is_done()
+    for i in range(len(definition.steps)):
+        np.testing.assert_array_equal(workflow.get_result(i), serial.get_result(i), err_msg=f"step {i}")
+
+
+def _consumers(definition):
+    # steps (0 indexed) reading the result of each step
+    consumers = {i: set() for i in range(len(definition.steps))}
+    for i, step in enumerate(definition.steps[1:], start=1):
+        for parent in step.parent:
+            if parent > 0:
+                consumers[parent - 1].add(i)
+    return consumers
+
+
+@pytest.mark.parametrize("keep_results", [None, [1], [0, 3]])
+@pytest.mark.parametrize("config", ["conf_0.2.lyso", "conf_0.4.golgi", "conf_0.1.masks_A"])
+def test_release_intermediates_frees_only_dead_results(config, keep_results, image):
+    definition = _definition(config)
+    expected = Workflow(definition, image)
+    expected.execute_all()
+    consumers = _consumers(definition)
+    kept = set(keep_results or []) | {len(definition.steps) - 1}
+
+    workflow = Workflow(definition, image, release_intermediates=True, keep_results=keep_results)
+    executed = 0
+    while not workflow.is_done():
+        workflow.execute_next()
+        executed += 1
+        for i in range(executed):
+            # a result is released as soon as (and only once) every step reading it has run
+            dead = i not in kept and all(consumer < executed for consumer in consumers[i])
+            assert (workflow.get_result(i) is None) == dead, f"step {i} after {executed} steps"
+
+    for i in kept:
+        np.testing.assert_array_equal(workflow.get_result(i), expected.get_result(i))
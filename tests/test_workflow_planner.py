@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from scipy.ndimage import gaussian_filter
+
+from infer_subc.utils.directories import Directories
+from infer_subc.workflow.workflow import Workflow
+from infer_subc.workflow.workflow_config import WorkflowConfig
+from infer_subc.workflow.workflow_planner import WorkflowPlanner
+
+
+def _definition(name: str):
+    return WorkflowConfig().get_workflow_definition_from_config_file(
+        Directories.get_structure_config_dir() / f"{name}.json"
+    )
+
+
+def _lyso_variant():
+    # same channel extraction, smoothing and filament filter as conf_0.2.lyso, lower dot cutoffs
+    definition = _definition("conf_0.2.lyso")
+    dots = next(step for step in definition.steps if step.function.name == "dot_filter_3")
+    dots.parameter_values = {
+        name: value / 4 if name.startswith("dot_cutoff") else value for name, value in dots.parameter_values.items()
+    }
+    return definition
+
+
+@pytest.fixture(scope="module")
+def image() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    img = gaussian_filter(rng.random((8, 6, 80, 90)), (0, 0, 1.5, 1.5)) * 5000 + rng.random((8, 6, 80, 90)) * 500
+    return img.astype(np.uint16)
+
+
+def test_shared_steps_are_merged():
+    lyso, variant, perox = _definition("conf_0.2.lyso"), _lyso_variant(), _definition("conf_0.5.perox")
+    planner = WorkflowPlanner([lyso, variant, perox])
+
+    assert planner.total_steps == len(lyso.steps) + len(variant.steps) + len(perox.steps)
+    # select_channel_from_raw, scale_and_smooth and filament_filter_3 are shared by the two lyso workflows
+    assert planner.merged_steps == planner.total_steps - 3
+    # identical workflows are a single one
+    assert WorkflowPlanner([lyso, _definition("conf_0.2.lyso")]).merged_steps == len(lyso.steps)
+
+    for step in planner.workflow_definition.steps:
+        assert all(parent < step.step_number for parent in step.parent)
+
+
+@pytest.mark.parametrize("order", [(0, 1, 2), (2, 1, 0), (1, 0, 2)])
+def test_results_follow_definition_order(order, image):
+    definitions = [_definition("conf_0.2.lyso"), _lyso_variant(), _definition("conf_0.5.perox")]
+    definitions = [definitions[i] for i in order]
+    expected = [Workflow(definition, image).execute_all() for definition in definitions]
+
+    planner = WorkflowPlanner(definitions)
+    workflow = Workflow(
+        planner.workflow_definition, image, release_intermediates=True, keep_results=planner.output_steps
+    )
+    workflow.execute_all()
+    results = planner.get_results(workflow)
+
+    assert len(results) == len(definitions)
+    assert not np.array_equal(expected[order.index(0)], expected[order.index(1)])
+    for result, expected_result in zip(results, expected):
+        np.testing.assert_array_equal(result, expected_result)
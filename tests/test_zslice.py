@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+import dask.array as da
+from scipy.ndimage import gaussian_filter, laplace
+
+from infer_subc.core.img import threshold_li_log
+from infer_subc.core.zslice import Z_METRICS, find_optimal_Z, get_optimal_Z_image, z_plane_metrics
+
+NUC_CH = 0
+CH_TO_AGG = (1, 2)
+SIGNAL_Z = 5  # brightest plane of the aggregated channels
+FOCUS_Z = 2  # sharpest plane of the aggregated channels
+
+
+@pytest.fixture(scope="module")
+def image() -> np.ndarray:
+    # CZYX: nuclei in every plane, and a texture which is sharpest at FOCUS_Z and brightest at SIGNAL_Z
+    rng = np.random.default_rng(0)
+    n_z, shape = 9, (64, 72)
+    img = np.zeros((3, n_z) + shape)
+    yy, xx = np.mgrid[0 : shape[0], 0 : shape[1]]
+    for y0, x0 in ((16, 20), (45, 50)):
+        img[NUC_CH] += 3000 * (((yy - y0) ** 2 + (xx - x0) ** 2) < 80)
+    img[NUC_CH] += rng.random((n_z,) + shape) * 200
+    for ch in CH_TO_AGG:
+        texture = rng.random(shape)
+        for z in range(n_z):
+            brightness = 1 + np.exp(-((z - SIGNAL_Z) ** 2) / 4.0)
+            img[ch, z] = 1000 * brightness * gaussian_filter(texture, 0.3 + 0.8 * abs(z - FOCUS_Z)) + 100
+    return img.astype(np.uint16)
+
+
+def _lazy(image: np.ndarray) -> da.Array:
+    return da.from_array(image, chunks=(1, 1) + image.shape[2:])
+
+
+def _expected_metrics(image: np.ndarray, downsample: int, masked: bool = True) -> dict:
+    # the same metrics computed on the whole (downsampled) stack at once
+    image = image[:, :, ::downsample, ::downsample]
+    aggregated = image[list(CH_TO_AGG)].astype(np.double).sum(axis=0)
+    nuclei = image[NUC_CH]
+    lowest, highest = float(nuclei.min()), float(nuclei.max())
+    threshold = min(max(threshold_li_log(nuclei) * 0.9, lowest + 0.1 * (highest - lowest)), highest)
+    outside = nuclei <= threshold if masked else np.ones(nuclei.shape, dtype=bool)
+    return {
+        "signal": (aggregated * outside).sum(axis=(1, 2)),
+        "laplacian": np.array([laplace(plane).var() for plane in aggregated]),
+        "brenner": np.array(
+            [
+                np.square(plane[2:] - plane[:-2]).sum() + np.square(plane[:, 2:] - plane[:, :-2]).sum()
+                for plane in aggregated
+            ]
+        ),
+    }
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+@pytest.mark.parametrize("downsample", [1, 2, 3])
+def test_z_plane_metrics(lazy, downsample, image):
+    expected = _expected_metrics(image, downsample)
+    metrics = z_plane_metrics(_lazy(image) if lazy else image, NUC_CH, CH_TO_AGG, downsample=downsample)
+    assert sorted(metrics) == sorted(Z_METRICS)
+    for name in Z_METRICS:
+        np.testing.assert_allclose(metrics[name], expected[name], rtol=1e-10, err_msg=name)
+
+
+def test_z_plane_metrics_unmasked(image):
+    expected = _expected_metrics(image, 1, masked=False)
+    metrics = z_plane_metrics(image, None, CH_TO_AGG, metrics=("signal",))
+    assert list(metrics) == ["signal"]
+    np.testing.assert_allclose(metrics["signal"], expected["signal"], rtol=1e-10)
+    # the nuclei are masked out otherwise
+    assert np.all(z_plane_metrics(image, NUC_CH, CH_TO_AGG, metrics=("signal",))["signal"] < metrics["signal"])
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+@pytest.mark.parametrize("metric, expected_z", [("signal", SIGNAL_Z), ("laplacian", FOCUS_Z), ("brenner", FOCUS_Z)])
+def test_find_optimal_Z_stream(lazy, metric, expected_z, image):
+    img = _lazy(image) if lazy else image
+    assert find_optimal_Z(img, NUC_CH, CH_TO_AGG, method="stream", metric=metric) == expected_z
+    assert find_optimal_Z(img, NUC_CH, CH_TO_AGG, method="stream", metric=metric, downsample=2) == expected_z
+
+
+def test_get_optimal_Z_image_stream(image):
+    result = get_optimal_Z_image(_lazy(image), NUC_CH, CH_TO_AGG, method="stream")
+    assert isinstance(result, np.ndarray)
+    np.testing.assert_array_equal(result, image[:, [SIGNAL_Z]])
+
+
+def test_invalid_arguments(image):
+    with pytest.raises(ValueError):
+        find_optimal_Z(image, NUC_CH, CH_TO_AGG, method="unknown")
+    with pytest.raises(ValueError):
+        find_optimal_Z(image, NUC_CH, CH_TO_AGG, method="stream", metric="unknown")
+    with pytest.raises(ValueError):
+        z_plane_metrics(image, NUC_CH, CH_TO_AGG, metrics=("signal", "unknown"))
+    with pytest.raises(ValueError):
+        z_plane_metrics(image, NUC_CH, CH_TO_AGG, downsample=0)